@@ -0,0 +1,230 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from flask import request, jsonify, g
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'True').lower() == 'true'
+
+# Token bucket per client and route: sustained requests per second and burst size
+RATE_LIMIT_PER_SECOND = float(os.getenv('RATE_LIMIT_PER_SECOND', 10))
+RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', 30))
+# Bulk reads (full list pages, exports) get a tighter bucket of their own
+RATE_LIMIT_BULK_PER_SECOND = float(os.getenv('RATE_LIMIT_BULK_PER_SECOND', 2))
+RATE_LIMIT_BULK_BURST = float(os.getenv('RATE_LIMIT_BULK_BURST', 10))
+# Check-ins all come from the front-desk kiosk, which scans a whole class in a few minutes
+RATE_LIMIT_CHECKIN_PER_SECOND = float(os.getenv('RATE_LIMIT_CHECKIN_PER_SECOND', 50))
+RATE_LIMIT_CHECKIN_BURST = float(os.getenv('RATE_LIMIT_CHECKIN_BURST', 200))
+# "memory" keeps buckets per worker process; "sqlite" shares them between the
+# workers on one machine through a small local database file
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory').lower()
+RATE_LIMIT_SQLITE_PATH = os.getenv('RATE_LIMIT_SQLITE_PATH', '/tmp/gym-rate-limits.sqlite3')
+
+# Global cap on requests being processed by this worker. The last
+# INFLIGHT_RESERVED_FOR_PRIORITY slots can only be taken by writes and point
+# reads, so a flood of list requests cannot starve check-ins.
+MAX_INFLIGHT_REQUESTS = int(os.getenv('MAX_INFLIGHT_REQUESTS', 16))
+INFLIGHT_RESERVED_FOR_PRIORITY = int(os.getenv('INFLIGHT_RESERVED_FOR_PRIORITY', 4))
+SHED_RETRY_AFTER_SECONDS = int(os.getenv('SHED_RETRY_AFTER_SECONDS', 1))
+
+# Proxies in front of the app that append to X-Forwarded-For (Render has one).
+# Clients can send any X-Forwarded-For they like, so only the hops these
+# proxies added are trusted; 0 keys on the socket address.
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 1))
+
+# Endpoints never subject to admission control. The event stream holds its
+# connection open for minutes and is capped by EVENTS_MAX_SUBSCRIBERS instead.
+EXEMPT_ENDPOINTS = {'health_check', 'liveness', 'readiness', 'metrics_endpoint', 'static', 'member_events_stream'}
+# Endpoints that return many members at once
+BULK_READ_ENDPOINTS = {'get_members', 'export_members', 'member_changes'}
+# Endpoints that change many members at once; they share the bulk bucket and low priority
+BULK_WRITE_ENDPOINTS = {'bulk_update_members', 'renew_members', 'import_members'}
+# Endpoints with the check-in bucket
+CHECKIN_ENDPOINTS = {'record_checkin'}
+
+
+class MemoryBucketStore:
+    """Token buckets held in this process"""
+
+    # Buckets untouched for this long are full again and can be forgotten
+    IDLE_SECONDS = 300
+    MAX_BUCKETS = 10000
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now):
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, retry_after = False, (1 - tokens) / rate
+            if len(self._buckets) > self.MAX_BUCKETS:
+                self._prune(now)
+            return allowed, retry_after
+
+    def _prune(self, now):
+        cutoff = now - self.IDLE_SECONDS
+        for key in [key for key, (_, updated) in self._buckets.items() if updated < cutoff]:
+            del self._buckets[key]
+
+
+class SqliteBucketStore:
+    """Token buckets shared by every worker on the host through a SQLite file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS buckets '
+            '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Autocommit mode; transactions are opened explicitly below
+            connection = sqlite3.connect(self.path, timeout=0.05, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, rate, burst, now):
+        connection = self._connection()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            connection.execute(
+                'INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                (key, tokens, now)
+            )
+            connection.execute('COMMIT')
+        except sqlite3.Error as e:
+            # Fail open: a contended or broken limiter must never take the API down
+            logger.warning(f"Rate limit store unavailable, admitting request: {e}")
+            try:
+                connection.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+            return True, 0.0
+        return allowed, (0.0 if allowed else (1 - tokens) / rate)
+
+
+class InflightLimiter:
+    """Non-blocking counter of in-flight requests with slots reserved for priority work"""
+
+    def __init__(self, max_inflight, reserved_for_priority):
+        self.max_inflight = max_inflight
+        self.low_priority_limit = max(1, max_inflight - reserved_for_priority)
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    def try_enter(self, high_priority):
+        limit = self.max_inflight if high_priority else self.low_priority_limit
+        with self._lock:
+            if self.inflight >= limit:
+                return False
+            self.inflight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.inflight -= 1
+
+
+class AdmissionController:
+    def __init__(self, store, inflight):
+        self.store = store
+        self.inflight = inflight
+        self.rate_limited = 0
+        self.shed = 0
+
+    @staticmethod
+    def client_key(trusted_hops=None):
+        # The address our own proxy saw the connection come from, not the client-supplied first hop
+        trusted_hops = TRUSTED_PROXY_HOPS if trusted_hops is None else trusted_hops
+        hops = [hop.strip() for hop in request.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+        if trusted_hops and len(hops) >= trusted_hops:
+            return hops[-trusted_hops]
+        return request.remote_addr or 'unknown'
+
+    @staticmethod
+    def is_bulk():
+        if request.endpoint in BULK_WRITE_ENDPOINTS:
+            return True
+        return request.method == 'GET' and request.endpoint in BULK_READ_ENDPOINTS
+
+    @classmethod
+    def is_high_priority(cls):
+        return not cls.is_bulk()
+
+    def admit(self):
+        """before_request hook: rate limit, then shed load if the worker is saturated"""
+        if request.method == 'OPTIONS' or request.endpoint is None or request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+
+        if self.is_bulk():
+            rate, burst = RATE_LIMIT_BULK_PER_SECOND, RATE_LIMIT_BULK_BURST
+        elif request.endpoint in CHECKIN_ENDPOINTS:
+            rate, burst = RATE_LIMIT_CHECKIN_PER_SECOND, RATE_LIMIT_CHECKIN_BURST
+        else:
+            rate, burst = RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST
+        key = f"{self.client_key()}|{request.method}|{request.endpoint}"
+        allowed, retry_after = self.store.take(key, rate, burst, time.time())
+        if not allowed:
+            self.rate_limited += 1
+            response = jsonify({'error': 'Too many requests. Please slow down and retry shortly.'})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+            return response
+
+        if not self.inflight.try_enter(self.is_high_priority()):
+            self.shed += 1
+            response = jsonify({'error': 'Server is busy. Please retry shortly.'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(SHED_RETRY_AFTER_SECONDS)
+            return response
+        g.admitted = True
+        return None
+
+    def release(self, exc=None):
+        """teardown_request hook: free the in-flight slot taken by admit()"""
+        if g.pop('admitted', False):
+            self.inflight.leave()
+
+    def stats(self):
+        return {
+            'inflight': self.inflight.inflight,
+            'max_inflight': self.inflight.max_inflight,
+            'rate_limited': self.rate_limited,
+            'shed': self.shed,
+        }
+
+
+def init_admission(app):
+    if RATE_LIMIT_BACKEND == 'sqlite':
+        store = SqliteBucketStore(RATE_LIMIT_SQLITE_PATH)
+    else:
+        store = MemoryBucketStore()
+    controller = AdmissionController(
+        store, InflightLimiter(MAX_INFLIGHT_REQUESTS, INFLIGHT_RESERVED_FOR_PRIORITY)
+    )
+    if ADMISSION_ENABLED:
+        app.before_request(controller.admit)
+        app.teardown_request(controller.release)
+    return controller
@@ -1,17 +1,60 @@
-from flask import Flask, request, jsonify, make_response
-from flask_cors import CORS
-from pymongo import MongoClient, ASCENDING
-from bson import ObjectId
+from flask import Flask, request, jsonify, Response, g
+from pymongo import MongoClient
 from bson.errors import InvalidId
 import os
+import atexit
+import datetime
 from dotenv import load_dotenv
 import time
-import traceback
 import logging
+import csv
+import itertools
+import io
+import json
 from functools import wraps
+from log_config import setup_logging, init_request_logging
+from compression import init_compression
+from cors_policy import CorsPolicy, init_cors
+from admission import init_admission
+from consistency import (
+    CAUSAL_TOKEN_HEADER, READ_MAX_STALENESS_SECONDS, READ_ROUTING_ENABLED, SECONDARY_READ_ENDPOINTS, init_consistency,
+)
+from resilience import (
+    BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS, STALE_CACHE_ENTRIES,
+    DATABASE_UNAVAILABLE_ERRORS, CircuitBreaker, CircuitOpenError,
+    database_unavailable, init_resilience,
+)
+from repository import (
+    EXPIRING_SOON_DAYS, MEMBER_STATUSES, InMemoryMemberRepository, MemberIdsExhausted, MongoMemberRepository,
+    backfill_normalized_mobiles, local_today, member_summary, normalize_mobile,
+)
+from indexes import (
+    archive_for, ensure_archive_indexes, ensure_member_indexes, ensure_tombstone_indexes, leases_for, tombstones_for,
+)
+from pymongo.errors import DuplicateKeyError
+from member_schema import IMPORT_CHUNK_SIZE, IMPORT_MAX_MEMBERS, MemberValidationError, ensure_member_validator, member_validator
+from sync import (
+    SYNC_MAX_PAGE_SIZE, SYNC_PAGE_SIZE, ExpiredSyncToken, backfill_versions, decode_token,
+    encode_version, next_token,
+)
+from bson import Timestamp
+from health import DependencyProber
+from events import init_member_events, stream_events
+from search import SEARCH_MAX_RESULTS, SEARCH_RESULTS, MemberSearchIndex, SearchIndexSync
+from metrics import MetricsRegistry
+from pool import WORKER_CLASS, PoolMonitor, pool_settings, request_concurrency
+from bulk import BulkOperation, BulkRequestError, BulkTarget, run_bulk_update
+from jobs import JOBS_ENABLED, LocalLeaseStore, MongoLeaseStore, Scheduler, member_jobs
+from tenants import (
+    DEFAULT_TENANT, TENANT_HEADER, Tenant, TenantRegistry, current, init_tenants, tenant_names, tenant_namespace,
+)
+from checkins import (
+    CHECKIN_HISTORY_LIMIT, CHECKINS_LOG_PATH, CHECKINS_MAX_RANGE_DAYS, LOCAL_TZ, CheckinBacklogFull, CheckinLog,
+    CheckinRecorder, LocalCheckinStore, MongoCheckinStore, checkin_to_dict, init_checkin_collections, new_checkin,
+)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure structured logging; records are formatted and written by a background thread
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -20,46 +63,63 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 
+# Request IDs (X-Request-ID) for correlating log lines; registered first so every hook can use them
+init_request_logging(app)
+
+# Compress JSON/CSV responses above COMPRESSION_MIN_SIZE (gzip, or brotli when installed)
+init_compression(app)
+
 # Get FRONTEND_URL from environment variables first
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:5173')
 
-# Configure CORS with comprehensive settings
-cors_config = {
-    "origins": [
-        FRONTEND_URL,
-        'http://localhost:5173',
-        'http://localhost:5174',
-        'https://*.netlify.app',
-        'https://*.vercel.app',
-        'https://gym-git-main-dhirus-projects-0e28fcdd.vercel.app',
-        'https://gym-backend-kixz.onrender.com',
-        'https://efcgym.vercel.app'  # Add your new Vercel domain
-    ],
-    "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    "allow_headers": [
-        "Content-Type",
-        "Authorization",
-        "Access-Control-Allow-Origin",
-        "Access-Control-Allow-Credentials"
-    ],
-    "supports_credentials": True,
-    "max_age": 3600
-}
-
-# Configure CORS using flask-cors as a fallback
-CORS(app, **cors_config)
+# Allowed origins; wildcard entries match any subdomain. CORS_EXTRA_ORIGINS adds
+# more (comma-separated) without a code change.
+CORS_ORIGINS = [
+    FRONTEND_URL,
+    'http://localhost:5173',
+    'http://localhost:5174',
+    'https://*.netlify.app',
+    'https://*.vercel.app',
+    'https://gym-git-main-dhirus-projects-0e28fcdd.vercel.app',
+    'https://gym-backend-kixz.onrender.com',
+    'https://efcgym.vercel.app'
+] + [origin.strip() for origin in os.getenv('CORS_EXTRA_ORIGINS', '').split(',') if origin.strip()]
 
-# Add a middleware to log request processing time
-@app.before_request
-def start_timer():
-    request.start_time = time.time()
+# Compile the CORS policy once; every response then costs a single dict lookup
+cors_policy = init_cors(app, CorsPolicy(
+    CORS_ORIGINS,
+    methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization", TENANT_HEADER, CAUSAL_TOKEN_HEADER],
+    expose_headers=[CAUSAL_TOKEN_HEADER],
+    max_age=int(os.getenv('CORS_MAX_AGE', 86400)),
+    supports_credentials=True,
+    allow_unlisted=os.getenv('CORS_ALLOW_UNLISTED', 'False').lower() == 'true'
+))
+
+# Per-client rate limiting and load shedding (registered after CORS so preflights skip it)
+admission = init_admission(app)
+
+# Per-request MongoDB time budget and stale-read response headers
+init_resilience(app)
+
+# Lists, reports and exports read from secondaries; causal tokens give writers read-your-writes
+init_consistency(app)
+
+# Successful reads on these routes are frequent enough that only a sample is logged
+SAMPLED_LOG_ENDPOINTS = {'get_members', 'get_member', 'member_changes', 'search_members', 'member_by_mobile', 'member_by_mid', 'liveness', 'readiness'}
 
+# Add a middleware to log request processing time
 @app.after_request
 def log_request(response):
-    # This will run after the first after_request, adding timing info
-    if hasattr(request, 'start_time'):
-        duration = time.time() - request.start_time
-        logger.info(f"{request.method} {request.path} - {response.status_code} - {duration:.3f}s")
+    if 'request_started' in g:
+        duration_ms = (time.monotonic() - g.request_started) * 1000
+        logger.info('request', extra={
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 2),
+            'sample': response.status_code < 400 and request.endpoint in SAMPLED_LOG_ENDPOINTS
+        })
     return response
 
 # MongoDB connection
@@ -67,19 +127,26 @@ MONGODB_URI = os.getenv('MONGODB_URI')
 DB_NAME = os.getenv('DB_NAME')
 COLLECTION_NAME = os.getenv('COLLECTION_NAME')
 
+client = None
 db = None
 members_collection = None
 
 # In-memory storage as fallback when MongoDB is not available
 in_memory_storage = []
 
-# Initialize MongoDB client with connection pooling
+# Per-worker metrics served at /metrics
+metrics = MetricsRegistry()
+
+# Checked-out connections, wait queue and creation rate of this worker's pool
+pool_monitor = PoolMonitor(metrics)
+
+# Initialize MongoDB client with a pool sized for this worker; every branch shares it
 try:
     if MONGODB_URI:
         client = MongoClient(
             MONGODB_URI,
-            maxPoolSize=50,
-            minPoolSize=10,
+            **pool_settings(),
+            event_listeners=[pool_monitor],
             serverSelectionTimeoutMS=10000,  # Increased to 10 seconds
             socketTimeoutMS=10000,           # Increased to 10 seconds
             connectTimeoutMS=10000,          # Increased to 10 seconds
@@ -92,28 +159,134 @@ try:
         
         db = client[DB_NAME]
         members_collection = db[COLLECTION_NAME]
-        
-        # Create indexes for better query performance
-        try:
-            members_collection.create_index([("mId", ASCENDING)], unique=True)
-            members_collection.create_index([("mobile", ASCENDING)])
-            members_collection.create_index([("name", ASCENDING)])
-            members_collection.create_index([("expiryDate", ASCENDING)])
-            logger.info("Database indexes created successfully")
-        except Exception as e:
-            logger.error(f"Error creating indexes: {e}")
     else:
         logger.warning("MONGODB_URI not found in environment variables - using in-memory storage")
 except Exception as e:
+    client = None
     logger.error(f"MongoDB connection failed: {e}")
     logger.warning("Using in-memory storage as fallback")
 
+def prepare_collection(collection):
+    """Create a branch's indexes and validator and backfill fields older members lack"""
+    try:
+        ensure_member_indexes(collection)
+        ensure_tombstone_indexes(tombstones_for(collection))
+        ensure_archive_indexes(archive_for(collection))
+        logger.info(f"Database indexes created successfully for {collection.name}")
+        try:
+            ensure_member_validator(collection)
+        except Exception as e:
+            # Writes are still validated by the app; only direct writes go unchecked
+            logger.warning(f"Could not install the member schema validator: {e}")
+        stamped = backfill_versions(collection)
+        if stamped:
+            logger.info(f"Stamped updatedAt on {stamped} members without a version")
+        normalized = backfill_normalized_mobiles(collection)
+        if normalized:
+            logger.info(f"Normalized the mobile number of {normalized} members")
+    except Exception as e:
+        logger.error(f"Error creating indexes: {e}")
+
+# Trips on consecutive MongoDB timeouts so a slow Atlas fails fast instead of holding every worker
+mongo_breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+
+def checkin_log_path(tenant):
+    if tenant == DEFAULT_TENANT:
+        return CHECKINS_LOG_PATH
+    root, extension = os.path.splitext(CHECKINS_LOG_PATH)
+    return f"{root}.{tenant}{extension}"
+
+def open_tenant(name):
+    """Set up one branch: its collections, repository, event bus, search index and check-in recorder"""
+    collection = None
+    if client is not None:
+        database_name, collection_name = tenant_namespace(name, DB_NAME, COLLECTION_NAME)
+        collection = client[database_name][collection_name]
+        prepare_collection(collection)
+
+    # Member change events for /api/members/events: relayed from a change stream when
+    # MongoDB supports one, otherwise published by the repository on each write
+    events, publish_writes = init_member_events(collection)
+    write_events = events if publish_writes else None
+
+    # All member reads and writes go through the repository; each branch has its own stale cache
+    if collection is not None:
+        repository = MongoMemberRepository(collection, mongo_breaker, STALE_CACHE_ENTRIES,
+                                           events=write_events, tombstones=tombstones_for(collection))
+    else:
+        storage = in_memory_storage if name == DEFAULT_TENANT else []
+        repository = InMemoryMemberRepository(storage, events=write_events)
+
+    # In-process n-gram index behind /api/members/search, fed by the event bus and delta sync
+    search = MemberSearchIndex()
+    search_sync = SearchIndexSync(search, repository, member_summary, events).start()
+
+    # Check-ins are group-committed to a time-series collection by a writer thread. The
+    # append-only log takes batches while MongoDB is unreachable, or all of them without it.
+    checkin_log = CheckinLog(checkin_log_path(name))
+    checkin_store = None
+    if collection is not None:
+        try:
+            checkin_store = MongoCheckinStore(*init_checkin_collections(collection.database, collection.name),
+                                              breaker=mongo_breaker)
+        except Exception as e:
+            logger.error(f"Error setting up check-in collections: {e}")
+    if checkin_store is not None:
+        recorder = CheckinRecorder(checkin_store, fallback=checkin_log).start()
+    else:
+        recorder = CheckinRecorder(LocalCheckinStore(checkin_log)).start()
+    atexit.register(recorder.stop)
+    return Tenant(name, collection, repository, events, search, search_sync, recorder)
+
+# Gym branches served by this process; requests pick one with the X-Branch header
+tenants = TenantRegistry()
+for tenant_name in tenant_names():
+    tenants.add(open_tenant(tenant_name))
+init_tenants(app, tenants, metrics)
+
+# Route handlers use these names; each resolves to the request's branch
+members_repository = current('repository')
+member_events = current('events')
+member_search = current('search')
+search_sync = current('search_sync')
+checkin_recorder = current('checkins')
+
+# Background jobs run in every worker; a lease in MongoDB lets only one of them run each job
+job_leases = MongoLeaseStore(leases_for(members_collection)) if members_collection is not None else LocalLeaseStore()
+job_scheduler = Scheduler(job_leases, metrics)
+for tenant in tenants:
+    for job in member_jobs(tenant.repository, LOCAL_TZ, None if tenant.name == DEFAULT_TENANT else tenant.name):
+        job_scheduler.add(job)
+if JOBS_ENABLED:
+    job_scheduler.start()
+    atexit.register(job_scheduler.stop)
+
+# Background MongoDB pings feed /readyz so health checks never wait on the database
+mongo_prober = DependencyProber(client).start() if client is not None else None
+
+# Errors that mean the database is unavailable rather than that the request was wrong
+DATABASE_ERRORS = (CircuitOpenError,) + DATABASE_UNAVAILABLE_ERRORS
+
 # Helper function to convert ObjectId to string
 def member_to_dict(member):
+    # Copy so the in-memory store's documents keep their native types
+    member = dict(member)
     if '_id' in member:
         member['_id'] = str(member['_id'])
+    if isinstance(member.get('updatedAt'), Timestamp):
+        member['updatedAt'] = encode_version(member['updatedAt'])
     return member
 
+def archived_member_to_dict(member):
+    return dict(member_to_dict(member), archived=True)
+
+def invalid_member(error):
+    return jsonify({'error': str(error), 'fields': error.errors}), 400
+
+def include_archived():
+    """?include_archived=true: also look in the archive of long-expired members"""
+    return request.args.get('include_archived', '').lower() == 'true'
+
 # Enhanced health check endpoint
 @app.route('/', methods=['GET'])
 def health_check():
@@ -122,24 +295,29 @@ def health_check():
         'mongodb': {
             'connected': members_collection is not None,
             'database': DB_NAME,
-            'collection': COLLECTION_NAME
+            'collection': COLLECTION_NAME,
+            'branch_collection': g.tenant.namespace,
         },
         'environment': {
             'frontend_url': FRONTEND_URL,
             'port': os.environ.get('PORT', 5000)
         },
         'cors': {
-            'allowed_origins': [
-                FRONTEND_URL,
-                'http://localhost:5173',
-                'http://localhost:5174',
-                'https://*.netlify.app',
-                'https://*.vercel.app',
-                'https://gym-git-main-dhirus-projects-0e28fcdd.vercel.app',
-                'https://gym-backend-kixz.onrender.com',
-                'https://efcgym.vercel.app'  # Add your new Vercel domain
-            ]
-        }
+            'allowed_origins': cors_policy.origins
+        },
+        'admission': admission.stats(),
+        'circuit_breaker': mongo_breaker.stats(),
+        'read_routing': {
+            'enabled': READ_ROUTING_ENABLED,
+            'max_staleness_seconds': READ_MAX_STALENESS_SECONDS,
+            'secondary_endpoints': sorted(SECONDARY_READ_ENDPOINTS),
+        },
+        'branch': g.tenant.name,
+        'branches': tenants.names(),
+        'events': member_events.stats(),
+        'search': search_sync.stats(),
+        'checkins': checkin_recorder.stats(),
+        'jobs': {'enabled': JOBS_ENABLED, 'running': sorted(job_scheduler.running)}
     }
     
     if members_collection is None:
@@ -148,55 +326,295 @@ def health_check():
     
     return jsonify(status)
 
+# Liveness: the process is up and serving requests (no I/O)
+@app.route('/healthz', methods=['GET'])
+def liveness():
+    return jsonify({'status': 'ok'})
+
+# Readiness: served from the background prober's last results, never from a live ping
+READINESS_FAIL_ON_DEGRADED = os.getenv('READINESS_FAIL_ON_DEGRADED', 'False').lower() == 'true'
+
+@app.route('/readyz', methods=['GET'])
+def readiness():
+    reasons = []
+    status = {'storage_type': members_repository.storage_type}
+    if mongo_prober is None:
+        reasons.append('using in-memory storage')
+    else:
+        status['mongodb'] = mongo_prober.snapshot()
+        status['circuit_breaker'] = mongo_breaker.stats()
+        if not mongo_prober.healthy:
+            reasons.append('mongodb ping failing')
+        if mongo_breaker.state != mongo_breaker.CLOSED:
+            reasons.append(f'circuit breaker {mongo_breaker.state}')
+
+    status['status'] = 'degraded' if reasons else 'ok'
+    status['reasons'] = reasons
+    response = jsonify(status)
+    if reasons and READINESS_FAIL_ON_DEGRADED:
+        response.status_code = 503
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    return response
+
+# Prometheus scrape target: this worker's metrics (no I/O)
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Background job schedule, leases and last runs
+@app.route('/api/admin/jobs', methods=['GET'])
+def job_status():
+    return jsonify(dict(job_scheduler.stats(), enabled=JOBS_ENABLED))
+
+# MongoDB pool size and how much of it this worker uses
+@app.route('/api/admin/pool', methods=['GET'])
+def pool_status():
+    return jsonify({
+        'worker_class': WORKER_CLASS,
+        'request_concurrency': request_concurrency(),
+        'settings': pool_settings(),
+        'pools': pool_monitor.stats(),
+    })
+
 # Get all members with caching headers
 @app.route('/api/members', methods=['GET'])
 def get_members():
-    # Use in-memory storage if MongoDB is not available
-    if members_collection is None:
-        response = jsonify([member_to_dict(member) for member in in_memory_storage])
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        return response
-        
+    status = request.args.get('status')
+    if status is not None and status not in MEMBER_STATUSES:
+        return jsonify({'error': f"status must be one of {', '.join(MEMBER_STATUSES)}"}), 400
     try:
         # Add pagination support with smaller default page size
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 25))  # Reduced to 25 members per page
         skip = (page - 1) * per_page
         
-        # Add sorting by _id for consistent pagination
-        members = list(members_collection.find().sort('_id', 1).skip(skip).limit(per_page))
+        # status is the field the nightly expiry sweep keeps current
+        members = members_repository.list_members(skip, per_page, status)
         response = jsonify([member_to_dict(member) for member in members])
         response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
         response.headers['Pragma'] = 'no-cache'
         response.headers['Expires'] = '0'
         return response
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
     except Exception as e:
-        logger.error(f"Error fetching members: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error fetching members: {e}")
         return jsonify({'error': f'Failed to fetch members: {str(e)}'}), 500
 
+# Columns used by the CSV export (same order as the frontend's exportToCSV)
+EXPORT_CSV_FIELDS = [
+    ('Name', 'name'), ('Member ID', 'mId'), ('Mobile', 'mobile'),
+    ('Training Type', 'trainingType'), ('Address', 'address'), ('ID Proof', 'idProof'),
+    ('Batch', 'batch'), ('Plan Type', 'planType'), ('Purchase Date', 'purchaseDate'),
+    ('Expiry Date', 'expiryDate'), ('Total Amount', 'totalAmount'),
+    ('Amount Paid', 'amountPaid'), ('Due Amount', 'dueAmount'),
+    ('Payment Details', 'paymentDetails')
+]
+
+def _export_json(members):
+    yield '['
+    first = True
+    for member in members:
+        yield ('' if first else ',') + json.dumps(member_to_dict(member), default=str)
+        first = False
+    yield ']'
+
+def _export_csv(members):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in EXPORT_CSV_FIELDS])
+    for member in members:
+        writer.writerow([member.get(field, '') for _, field in EXPORT_CSV_FIELDS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+# Export every member as a streamed JSON array or CSV file
+@app.route('/api/members/export', methods=['GET'])
+def export_members():
+    export_format = request.args.get('format', 'json').lower()
+    if export_format not in ('json', 'csv'):
+        return jsonify({'error': 'Unsupported export format. Use json or csv'}), 400
+
+    try:
+        # Stream straight from the cursor instead of materialising the whole roster
+        members = members_repository.iter_members()
+        if include_archived():
+            members = itertools.chain(members, members_repository.iter_archived())
+
+        if export_format == 'csv':
+            response = Response(_export_csv(members), mimetype='text/csv')
+            response.headers['Content-Disposition'] = 'attachment; filename=members.csv'
+        else:
+            response = Response(_export_json(members), mimetype='application/json')
+        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+        return response
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.exception(f"Error exporting members: {e}")
+        return jsonify({'error': f'Failed to export members: {str(e)}'}), 500
+
+def reports_pending():
+    """503 for report endpoints until the member-reports job has run once"""
+    response = jsonify({'error': 'Member reports are still being computed. Please retry shortly.'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+# Dashboard counts, precomputed by the member-reports job
+@app.route('/api/members/stats', methods=['GET'])
+def member_stats():
+    try:
+        report = members_repository.get_report()
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    if report is None:
+        return reports_pending()
+    return jsonify(dict(report['stats'], asOf=report['asOf'], generatedAt=report['generatedAt']))
+
+# Members whose plan ends within EXPIRING_SOON_DAYS, soonest first, precomputed
+@app.route('/api/members/expiring', methods=['GET'])
+def expiring_members():
+    try:
+        report = members_repository.get_report()
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    if report is None:
+        return reports_pending()
+    return jsonify({
+        'asOf': report['asOf'],
+        'generatedAt': report['generatedAt'],
+        'withinDays': EXPIRING_SOON_DAYS,
+        'total': report['expiringTotal'],
+        'members': report['expiring'],
+    })
+
+# Ranked typeahead and typo-tolerant search over name, mId, mobile and address
+@app.route('/api/members/search', methods=['GET'])
+def search_members():
+    query = request.args.get('q', '').strip()
+    try:
+        limit = int(request.args.get('limit', SEARCH_RESULTS))
+        if not 1 <= limit <= SEARCH_MAX_RESULTS:
+            raise ValueError(limit)
+    except ValueError:
+        return jsonify({'error': f'limit must be between 1 and {SEARCH_MAX_RESULTS}'}), 400
+    if not query:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+    if not member_search.ready:
+        response = jsonify({'error': 'Search index is still loading. Please retry shortly.'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    results = member_search.search(query, limit)
+    return jsonify({
+        'query': query,
+        'results': [dict(summary, score=score) for summary, score in results]
+    })
+
+# Member lookup and existence check by the gym's own member ID (path: IDs may contain a slash)
+@app.route('/api/members/by-mid/<path:mid>', methods=['GET', 'HEAD'])
+def member_by_mid(mid):
+    mid = mid.strip()
+    try:
+        if request.method == 'HEAD':
+            # Status only: 200 if the mId is taken, 404 if it is free
+            return ('', 200) if members_repository.mid_exists(mid) else ('', 404)
+        member = members_repository.get_member_by_mid(mid)
+        if member is None and include_archived():
+            member = members_repository.get_archived_member_by_mid(mid)
+            if member is not None:
+                return jsonify(archived_member_to_dict(member))
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.exception(f"Error looking up member ID {mid}: {e}")
+        return jsonify({'error': f'Failed to look up member ID: {str(e)}'}), 500
+    if member is None:
+        return jsonify({'error': 'Member not found'}), 404
+    return jsonify(member_to_dict(member))
+
+# Check-in lookup: members registered with a phone number, however it was typed
+@app.route('/api/members/by-mobile/<mobile>', methods=['GET'])
+def member_by_mobile(mobile):
+    normalized = normalize_mobile(mobile)
+    if not normalized:
+        return jsonify({'error': 'Mobile number must contain digits'}), 400
+    try:
+        members = members_repository.find_by_mobile(normalized)
+        if include_archived():
+            members += [dict(summary, archived=True)
+                        for summary in members_repository.find_archived_by_mobile(normalized)]
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.exception(f"Error looking up mobile number: {e}")
+        return jsonify({'error': f'Failed to look up mobile number: {str(e)}'}), 500
+    if not members:
+        return jsonify({'error': 'No member with this mobile number'}), 404
+    return jsonify({'mobile': normalized, 'members': members})
+
+# Members created, updated or deleted since a sync token
+@app.route('/api/members/changes', methods=['GET'])
+def member_changes():
+    try:
+        since = decode_token(request.args.get('since'))
+        limit = int(request.args.get('limit', SYNC_PAGE_SIZE))
+        if not 1 <= limit <= SYNC_MAX_PAGE_SIZE:
+            raise ValueError(limit)
+    except ExpiredSyncToken:
+        # Deletes older than the tombstone TTL are gone; only a full reload is safe
+        return jsonify({'error': 'Sync token expired. Reload all members with since=0.', 'reset': True}), 410
+    except ValueError:
+        return jsonify({'error': f'Invalid since token or limit (1-{SYNC_MAX_PAGE_SIZE})'}), 400
+
+    try:
+        members, deleted, last_version, has_more = members_repository.changes_since(since, limit)
+        response = jsonify({
+            'members': [member_to_dict(member) for member in members],
+            'deleted': deleted,
+            'next': next_token(since, last_version, has_more),
+            'has_more': has_more
+        })
+        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+        return response
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.exception(f"Error fetching member changes: {e}")
+        return jsonify({'error': f'Failed to fetch member changes: {str(e)}'}), 500
+
+# Server-Sent Events stream of member creates, updates and deletes
+@app.route('/api/members/events', methods=['GET'])
+def member_events_stream():
+    # The stream outlives the request context, so it holds the branch's bus itself
+    bus = g.tenant.events
+    if not bus.try_subscribe():
+        response = jsonify({'error': 'Too many open event streams. Please retry shortly.'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+
+    # EventSource sends Last-Event-ID on reconnect; the query parameter covers the first connect
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    response = Response(stream_events(bus, last_event_id), mimetype='text/event-stream')
+    # Released even if the client disconnects before the stream starts
+    response.call_on_close(bus.unsubscribe)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop Render's and nginx's proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # Get a specific member by ID
 @app.route('/api/members/<member_id>', methods=['GET'])
 def get_member(member_id):
-    # Use in-memory storage if MongoDB is not available
-    if members_collection is None:
-        # Find member in in-memory storage
-        member = next((m for m in in_memory_storage if str(m.get('_id', m.get('id', ''))) == member_id), None)
-        if member:
-            response = jsonify(member_to_dict(member))
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-            return response
-        else:
-            return jsonify({'error': 'Member not found'}), 404
-    
     try:
-        # Validate ObjectId format
-        ObjectId(member_id)
-        member = members_collection.find_one({'_id': ObjectId(member_id)})
+        member = members_repository.get_member(member_id)
+        if member is None and include_archived():
+            member = members_repository.get_archived_member(member_id)
+            if member is not None:
+                return jsonify(archived_member_to_dict(member))
         if member:
             response = jsonify(member_to_dict(member))
             response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
@@ -207,125 +625,48 @@ def get_member(member_id):
             return jsonify({'error': 'Member not found'}), 404
     except InvalidId:
         return jsonify({'error': 'Invalid member ID format'}), 400
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
     except Exception as e:
-        logger.error(f"Error fetching member {member_id}: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error fetching member {member_id}: {e}")
         return jsonify({'error': f'Failed to fetch member: {str(e)}'}), 500
 
 # Create a new member
 @app.route('/api/members', methods=['POST'])
 def create_member():
-    # Use in-memory storage if MongoDB is not available
-    if members_collection is None:
-        try:
-            # Check if request has JSON data
-            if not request.is_json:
-                return jsonify({'error': 'Request must be JSON'}), 400
-                
-            member_data = request.json
-            logger.info(f"Creating member with data: {member_data}")
-            
-            # Validate required fields
-            required_fields = ['name', 'mId', 'mobile', 'trainingType', 'address', 
-                              'idProof', 'batch', 'planType', 'purchaseDate', 
-                              'expiryDate', 'totalAmount', 'amountPaid', 'dueAmount', 
-                              'paymentDetails']
-            
-            missing_fields = [field for field in required_fields if field not in member_data]
-            if missing_fields:
-                return jsonify({'error': f'Missing required fields: {missing_fields}'}), 400
-                
-            # Generate a simple ID for in-memory storage
-            import uuid
-            member_id = str(uuid.uuid4())
-            member_data['_id'] = member_id
-            member_data['id'] = member_id  # For consistency with frontend
-            
-            # Validate numeric fields
-            try:
-                member_data['totalAmount'] = float(member_data['totalAmount'])
-                member_data['amountPaid'] = float(member_data['amountPaid'])
-                member_data['dueAmount'] = float(member_data['dueAmount'])
-            except (ValueError, TypeError) as e:
-                return jsonify({'error': f'Invalid numeric values: {str(e)}'}), 400
-                
-            # Validate date fields
-            try:
-                # This will raise ValueError if dates are invalid
-                from datetime import datetime
-                datetime.strptime(member_data['purchaseDate'], '%Y-%m-%d')
-                datetime.strptime(member_data['expiryDate'], '%Y-%m-%d')
-            except ValueError as e:
-                return jsonify({'error': f'Invalid date format. Use YYYY-MM-DD: {str(e)}'}), 400
-                
-            # Add to in-memory storage
-            in_memory_storage.append(member_data)
-            
-            # Log the operation
-            logger.info(f"Created member: {member_data.get('name', 'Unknown')}")
-            
-            response = jsonify(member_to_dict(member_data))
-            response.status_code = 201
-            return response
-        except Exception as e:
-            logger.error(f"Error creating member: {e}")
-            logger.error(traceback.format_exc())
-            return jsonify({'error': f'Failed to create member: {str(e)}'}), 500
-    
     try:
         # Check if request has JSON data
         if not request.is_json:
             return jsonify({'error': 'Request must be JSON'}), 400
             
         member_data = request.json
-        logger.info(f"Creating member with data: {member_data}")
-        
-        # Validate required fields
-        required_fields = ['name', 'mId', 'mobile', 'trainingType', 'address', 
-                          'idProof', 'batch', 'planType', 'purchaseDate', 
-                          'expiryDate', 'totalAmount', 'amountPaid', 'dueAmount', 
-                          'paymentDetails']
+        logger.debug('Creating member', extra={'member': member_data})
+
+        # ?assignId=true: leave mId blank and get the next one from the allocator
+        if (request.args.get('assignId', '').lower() == 'true' and isinstance(member_data, dict)
+                and not str(member_data.get('mId') or '').strip()):
+            member_data['mId'] = members_repository.next_member_id()
         
-        missing_fields = [field for field in required_fields if field not in member_data]
-        if missing_fields:
-            return jsonify({'error': f'Missing required fields: {missing_fields}'}), 400
+        # Required fields, numbers and YYYY-MM-DD dates, checked in one pass
+        member_data = member_validator.validate(member_data)
             
-        # Remove _id if present (it will be auto-generated)
-        if '_id' in member_data:
-            del member_data['_id']
-            
-        # Validate numeric fields
-        try:
-            member_data['totalAmount'] = float(member_data['totalAmount'])
-            member_data['amountPaid'] = float(member_data['amountPaid'])
-            member_data['dueAmount'] = float(member_data['dueAmount'])
-        except (ValueError, TypeError) as e:
-            return jsonify({'error': f'Invalid numeric values: {str(e)}'}), 400
-            
-        # Validate date fields
-        try:
-            # This will raise ValueError if dates are invalid
-            from datetime import datetime
-            datetime.strptime(member_data['purchaseDate'], '%Y-%m-%d')
-            datetime.strptime(member_data['expiryDate'], '%Y-%m-%d')
-        except ValueError as e:
-            return jsonify({'error': f'Invalid date format. Use YYYY-MM-DD: {str(e)}'}), 400
-            
-        # Insert the member into the database
-        result = members_collection.insert_one(member_data)
-        
-        # Add the generated _id to the response
-        member_data['_id'] = str(result.inserted_id)
+        # Insert the member (the repository assigns the _id)
+        member_data = members_repository.insert_member(member_data)
         
         # Log the operation
-        logger.info(f"Created member: {member_data.get('name', 'Unknown')}")
+        logger.info('Created member', extra={'member_id': str(member_data['_id']), 'mId': member_data.get('mId')})
         
         response = jsonify(member_to_dict(member_data))
         response.status_code = 201
         return response
+    except MemberValidationError as e:
+        return invalid_member(e)
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    except MemberIdsExhausted as e:
+        return jsonify({'error': f'Could not find a free member ID after {e}. Please enter one manually.'}), 409
     except Exception as e:
-        logger.error(f"Error creating member: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error creating member: {e}")
         
         # Handle specific MongoDB errors
         error_message = str(e)
@@ -347,127 +688,40 @@ def create_member():
         
         return jsonify({'error': f'Failed to create member: {str(e)}'}), 500
 
+# Reserve the next free member ID; concurrent callers always get different IDs
+@app.route('/api/member-ids/next', methods=['POST'])
+def reserve_member_id():
+    try:
+        return jsonify({'mId': members_repository.next_member_id()}), 201
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    except MemberIdsExhausted as e:
+        return jsonify({'error': f'Could not find a free member ID after {e}. Please enter one manually.'}), 409
+    except Exception as e:
+        logger.exception(f"Error reserving member ID: {e}")
+        return jsonify({'error': f'Failed to reserve member ID: {str(e)}'}), 500
+
 # Update an existing member
 @app.route('/api/members/<member_id>', methods=['PUT'])
 def update_member(member_id):
-    # Use in-memory storage if MongoDB is not available
-    if members_collection is None:
-        try:
-            # Check if request has JSON data
-            if not request.is_json:
-                return jsonify({'error': 'Request must be JSON'}), 400
-                
-            member_data = request.json
-            logger.info(f"Updating member {member_id} with data: {member_data}")
-            
-            # Validate required fields
-            required_fields = ['name', 'mId', 'mobile', 'trainingType', 'address', 
-                              'idProof', 'batch', 'planType', 'purchaseDate', 
-                              'expiryDate', 'totalAmount', 'amountPaid', 'dueAmount', 
-                              'paymentDetails']
-            
-            missing_fields = [field for field in required_fields if field not in member_data]
-            if missing_fields:
-                return jsonify({'error': f'Missing required fields: {missing_fields}'}), 400
-                
-            # Find and update member in in-memory storage
-            member_index = None
-            for i, m in enumerate(in_memory_storage):
-                if str(m.get('_id', m.get('id', ''))) == member_id:
-                    member_index = i
-                    break
-            
-            if member_index is None:
-                return jsonify({'error': 'Member not found'}), 404
-                
-            # Update the member data
-            member_data['_id'] = member_id
-            member_data['id'] = member_id  # For consistency with frontend
-            
-            # Validate numeric fields
-            try:
-                member_data['totalAmount'] = float(member_data['totalAmount'])
-                member_data['amountPaid'] = float(member_data['amountPaid'])
-                member_data['dueAmount'] = float(member_data['dueAmount'])
-            except (ValueError, TypeError) as e:
-                return jsonify({'error': f'Invalid numeric values: {str(e)}'}), 400
-                
-            # Validate date fields
-            try:
-                # This will raise ValueError if dates are invalid
-                from datetime import datetime
-                datetime.strptime(member_data['purchaseDate'], '%Y-%m-%d')
-                datetime.strptime(member_data['expiryDate'], '%Y-%m-%d')
-            except ValueError as e:
-                return jsonify({'error': f'Invalid date format. Use YYYY-MM-DD: {str(e)}'}), 400
-                
-            # Update in in-memory storage
-            in_memory_storage[member_index] = member_data
-            
-            # Log the operation
-            logger.info(f"Updated member: {member_data.get('name', 'Unknown')}")
-            response = jsonify(member_to_dict(member_data))
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-            return response
-        except Exception as e:
-            logger.error(f"Error updating member {member_id}: {e}")
-            logger.error(traceback.format_exc())
-            return jsonify({'error': f'Failed to update member: {str(e)}'}), 500
-    
     try:
-        # Validate ObjectId format
-        ObjectId(member_id)
+        # Validate ID format
+        members_repository.validate_id(member_id)
         
         # Check if request has JSON data
         if not request.is_json:
             return jsonify({'error': 'Request must be JSON'}), 400
             
         member_data = request.json
-        logger.info(f"Updating member {member_id} with data: {member_data}")
-        
-        # Validate required fields
-        required_fields = ['name', 'mId', 'mobile', 'trainingType', 'address', 
-                          'idProof', 'batch', 'planType', 'purchaseDate', 
-                          'expiryDate', 'totalAmount', 'amountPaid', 'dueAmount', 
-                          'paymentDetails']
+        logger.debug('Updating member', extra={'member_id': member_id, 'member': member_data})
         
-        missing_fields = [field for field in required_fields if field not in member_data]
-        if missing_fields:
-            return jsonify({'error': f'Missing required fields: {missing_fields}'}), 400
-            
-        # Remove _id from the update data if present
-        if '_id' in member_data:
-            del member_data['_id']
-            
-        # Validate numeric fields
-        try:
-            member_data['totalAmount'] = float(member_data['totalAmount'])
-            member_data['amountPaid'] = float(member_data['amountPaid'])
-            member_data['dueAmount'] = float(member_data['dueAmount'])
-        except (ValueError, TypeError) as e:
-            return jsonify({'error': f'Invalid numeric values: {str(e)}'}), 400
+        # Required fields, numbers and YYYY-MM-DD dates, checked in one pass
+        member_data = member_validator.validate(member_data)
             
-        # Validate date fields
-        try:
-            # This will raise ValueError if dates are invalid
-            from datetime import datetime
-            datetime.strptime(member_data['purchaseDate'], '%Y-%m-%d')
-            datetime.strptime(member_data['expiryDate'], '%Y-%m-%d')
-        except ValueError as e:
-            return jsonify({'error': f'Invalid date format. Use YYYY-MM-DD: {str(e)}'}), 400
-            
-        # Update the member in the database
-        result = members_collection.update_one(
-            {'_id': ObjectId(member_id)},
-            {'$set': member_data}
-        )
+        updated_member = members_repository.update_member(member_id, member_data)
         
-        if result.matched_count > 0:
-            # Fetch and return the updated member
-            updated_member = members_collection.find_one({'_id': ObjectId(member_id)})
-            logger.info(f"Updated member: {updated_member.get('name', 'Unknown')}")
+        if updated_member is not None:
+            logger.info('Updated member', extra={'member_id': member_id, 'mId': updated_member.get('mId')})
             response = jsonify(member_to_dict(updated_member))
             response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
             response.headers['Pragma'] = 'no-cache'
@@ -477,161 +731,249 @@ def update_member(member_id):
             return jsonify({'error': 'Member not found'}), 404
     except InvalidId:
         return jsonify({'error': 'Invalid member ID format'}), 400
+    except MemberValidationError as e:
+        return invalid_member(e)
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.exception(f"Error updating member {member_id}: {e}")
+        return jsonify({'error': f'Failed to update member: {str(e)}'}), 500
+
+# Change some of a member's fields
+@app.route('/api/members/<member_id>', methods=['PATCH'])
+def patch_member(member_id):
+    try:
+        members_repository.validate_id(member_id)
+        if not request.is_json or not isinstance(request.json, dict):
+            return jsonify({'error': 'Request must be a JSON object'}), 400
+        fields = member_validator.validate(request.json, partial=True)
+        if not fields:
+            return jsonify({'error': 'No fields to update'}), 400
+        member = members_repository.patch_member(member_id, fields)
+    except InvalidId:
+        return jsonify({'error': 'Invalid member ID format'}), 400
+    except MemberValidationError as e:
+        return invalid_member(e)
+    except DuplicateKeyError:
+        return jsonify({'error': 'A member with this ID already exists. Please use a different Member ID.'}), 409
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
     except Exception as e:
-        logger.error(f"Error updating member {member_id}: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error patching member {member_id}: {e}")
         return jsonify({'error': f'Failed to update member: {str(e)}'}), 500
+    if member is None:
+        return jsonify({'error': 'Member not found'}), 404
+    logger.info('Patched member', extra={'member_id': member_id, 'fields': sorted(fields)})
+    response = jsonify(member_to_dict(member))
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    return response
+
+# Create many members from a JSON array; every row is validated and reported on its own
+@app.route('/api/members/import', methods=['POST'])
+def import_members():
+    rows = request.json if request.is_json else None
+    if not isinstance(rows, list) or not rows:
+        return jsonify({'error': 'Request must be a non-empty JSON array of members'}), 400
+    if len(rows) > IMPORT_MAX_MEMBERS:
+        return jsonify({'error': f'At most {IMPORT_MAX_MEMBERS} members per import'}), 400
+    valid, errors = member_validator.validate_many(rows)
+    results = [{'row': index, 'result': 'invalid', 'errors': row_errors} for index, row_errors in errors.items()]
+    imported, failure = 0, None
+    # In chunks, so a timeout part-way through still reports every row written before it
+    for start in range(0, len(valid), IMPORT_CHUNK_SIZE):
+        chunk = valid[start:start + IMPORT_CHUNK_SIZE]
+        if failure is not None:
+            results.extend({'row': index, 'result': 'not_imported', 'mId': member.get('mId')}
+                           for index, member in chunk)
+            continue
+        try:
+            ids = members_repository.insert_members([member for _, member in chunk])
+        except DATABASE_ERRORS as e:
+            if not imported:
+                return database_unavailable(e)
+            failure = e
+            # The chunk may have been partly written; importing it again reports those rows as duplicates
+            results.extend({'row': index, 'result': 'unknown', 'mId': member.get('mId')} for index, member in chunk)
+            continue
+        except Exception as e:
+            logger.exception(f"Error importing members: {e}")
+            return jsonify({'error': f'Failed to import members: {str(e)}'}), 500
+        for (index, member), member_id in zip(chunk, ids):
+            if member_id is None:
+                results.append({'row': index, 'result': 'duplicate', 'mId': member.get('mId')})
+            else:
+                imported += 1
+                results.append({'row': index, 'result': 'imported', '_id': str(member_id), 'mId': member.get('mId')})
+    results.sort(key=lambda item: item['row'])
+    logger.info('Imported members', extra={'rows': len(rows), 'imported': imported, 'complete': failure is None})
+    body = {'imported': imported, 'complete': failure is None, 'results': results}
+    if failure is not None:
+        body['error'] = f'Database did not respond in time: {failure}'
+    return jsonify(body)
+
+def _bulk_update(operation_name=None):
+    if not request.is_json or not isinstance(request.json, dict):
+        return jsonify({'error': 'Request must be a JSON object'}), 400
+    body = request.json
+    try:
+        target = BulkTarget(body)
+        operation = BulkOperation(body, local_today(), operation_name)
+        result = run_bulk_update(members_repository, target, operation)
+    except BulkRequestError as e:
+        return jsonify({'error': str(e)}), 400
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.exception(f"Error in bulk {operation_name or body.get('operation')}: {e}")
+        return jsonify({'error': f'Failed to update members: {str(e)}'}), 500
+    logger.info('Bulk updated members', extra={'operation': result['operation'], 'matched': result['matched'],
+                                               'updated': result['updated']})
+    return jsonify(result)
+
+# Apply one change (extend, payment or batch) to many members in a single request
+@app.route('/api/members/bulk-update', methods=['POST'])
+def bulk_update_members():
+    return _bulk_update()
+
+# Renew many members for another plan period (bulk-update with operation "extend")
+@app.route('/api/members/renew', methods=['POST'])
+def renew_members():
+    return _bulk_update('extend')
+
+# Long-expired members moved out of the live collection, oldest _id first
+@app.route('/api/members/archived', methods=['GET'])
+def get_archived_members():
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 25))
+        members = members_repository.list_archived((page - 1) * per_page, per_page)
+    except ValueError:
+        return jsonify({'error': 'page and per_page must be numbers'}), 400
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.exception(f"Error fetching archived members: {e}")
+        return jsonify({'error': f'Failed to fetch archived members: {str(e)}'}), 500
+    return jsonify([archived_member_to_dict(member) for member in members])
+
+# Move one member to the archive now instead of waiting for the archive job
+@app.route('/api/members/<member_id>/archive', methods=['POST'])
+def archive_member(member_id):
+    try:
+        if not members_repository.archive_member(member_id):
+            return jsonify({'error': 'Member not found'}), 404
+    except InvalidId:
+        return jsonify({'error': 'Invalid member ID format'}), 400
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.exception(f"Error archiving member {member_id}: {e}")
+        return jsonify({'error': f'Failed to archive member: {str(e)}'}), 500
+    logger.info('Archived member', extra={'member_id': member_id})
+    return jsonify({'message': 'Member archived successfully'})
+
+# Bring an archived member back into the live collection
+@app.route('/api/members/<member_id>/restore', methods=['POST'])
+def restore_member(member_id):
+    try:
+        member = members_repository.restore_member(member_id)
+    except InvalidId:
+        return jsonify({'error': 'Invalid member ID format'}), 400
+    except DuplicateKeyError:
+        return jsonify({'error': 'Another member now has this member ID. Change theirs first, then restore.'}), 409
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.exception(f"Error restoring member {member_id}: {e}")
+        return jsonify({'error': f'Failed to restore member: {str(e)}'}), 500
+    if member is None:
+        return jsonify({'error': 'Archived member not found'}), 404
+    logger.info('Restored member', extra={'member_id': member_id, 'mId': member.get('mId')})
+    return jsonify(member_to_dict(member))
 
 # Delete a member
 @app.route('/api/members/<member_id>', methods=['DELETE'])
 def delete_member(member_id):
-    # Use in-memory storage if MongoDB is not available
-    if members_collection is None:
-        try:
-            # Find and remove member from in-memory storage
-            member_index = None
-            for i, m in enumerate(in_memory_storage):
-                if str(m.get('_id', m.get('id', ''))) == member_id:
-                    member_index = i
-                    break
-            
-            if member_index is None:
-                return jsonify({'error': 'Member not found'}), 404
-                
-            # Remove from in-memory storage
-            deleted_member = in_memory_storage.pop(member_index)
-            
-            logger.info(f"Deleted member with ID: {member_id}")
-            return jsonify({'message': 'Member deleted successfully'})
-        except Exception as e:
-            logger.error(f"Error deleting member {member_id}: {e}")
-            logger.error(traceback.format_exc())
-            return jsonify({'error': f'Failed to delete member: {str(e)}'}), 500
-    
     try:
-        # Validate ObjectId format
-        ObjectId(member_id)
-        
-        result = members_collection.delete_one({'_id': ObjectId(member_id)})
-        
-        if result.deleted_count > 0:
-            logger.info(f"Deleted member with ID: {member_id}")
+        if members_repository.delete_member(member_id):
+            logger.info('Deleted member', extra={'member_id': member_id})
             return jsonify({'message': 'Member deleted successfully'})
         else:
             return jsonify({'error': 'Member not found'}), 404
     except InvalidId:
         return jsonify({'error': 'Invalid member ID format'}), 400
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
     except Exception as e:
-        logger.error(f"Error deleting member {member_id}: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error deleting member {member_id}: {e}")
         return jsonify({'error': f'Failed to delete member: {str(e)}'}), 500
 
-# Enhanced CORS middleware that manually adds headers to all responses
+# Record a check-in at the door
+@app.route('/api/members/<member_id>/checkins', methods=['POST'])
+def record_checkin(member_id):
+    try:
+        member = members_repository.get_member(member_id)
+        if not member:
+            return jsonify({'error': 'Member not found'}), 404
+        checkin = new_checkin(member)
+        stored_in = checkin_recorder.record(checkin)
+    except InvalidId:
+        return jsonify({'error': 'Invalid member ID format'}), 400
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    except CheckinBacklogFull:
+        response = jsonify({'error': 'Too many check-ins queued. Please retry shortly.'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    except Exception as e:
+        logger.exception(f"Error recording check-in for member {member_id}: {e}")
+        return jsonify({'error': f'Failed to record check-in: {str(e)}'}), 500
+    # 201 once its batch is committed; 202 while still queued during a burst
+    return jsonify({'checkin': checkin_to_dict(checkin), 'stored_in': stored_in}), 201 if stored_in else 202
+
+# A member's most recent check-ins
+@app.route('/api/members/<member_id>/checkins', methods=['GET'])
+def member_checkins(member_id):
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), CHECKIN_HISTORY_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    try:
+        checkins = checkin_recorder.store.member_checkins(member_id, limit)
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.exception(f"Error fetching check-ins for member {member_id}: {e}")
+        return jsonify({'error': f'Failed to fetch check-ins: {str(e)}'}), 500
+    return jsonify({'checkins': [checkin_to_dict(checkin) for checkin in checkins]})
+
+# Daily and hourly occupancy per batch, read from the rollups the writer maintains
+@app.route('/api/checkins/occupancy', methods=['GET'])
+def checkin_occupancy():
+    today = datetime.datetime.now(LOCAL_TZ).date()
+    try:
+        start = datetime.date.fromisoformat(request.args.get('from') or request.args.get('date') or today.isoformat())
+        end = datetime.date.fromisoformat(request.args.get('to') or request.args.get('date') or start.isoformat())
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    if end < start or (end - start).days >= CHECKINS_MAX_RANGE_DAYS:
+        return jsonify({'error': f'from must not be after to, and the range is at most {CHECKINS_MAX_RANGE_DAYS} days'}), 400
+    try:
+        days = checkin_recorder.store.occupancy(start, end, request.args.get('batch'))
+    except DATABASE_ERRORS as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.exception(f"Error fetching occupancy: {e}")
+        return jsonify({'error': f'Failed to fetch occupancy: {str(e)}'}), 500
+    return jsonify({'timezone': str(LOCAL_TZ), 'days': days})
+
+# Add security headers to every response
 @app.after_request
-def after_request(response):
-    # Get the origin from the request
-    origin = request.headers.get('Origin')
-    
-    # List of allowed origins
-    allowed_origins = [
-        FRONTEND_URL,  # Use the environment variable
-        'http://localhost:5173',
-        'http://localhost:5734',
-        'https://gym-git-main-dhirus-projects-0e28fcdd.vercel.app',
-        'https://gym-backend-kixz.onrender.com',
-        'https://*.netlify.app',
-        'https://*.vercel.app',
-        'https://efcgym.vercel.app'  # Add your new Vercel domain
-    ]
-    
-    # Check if origin is in allowed origins or if it's a Vercel deployment
-    if origin:
-        # Check if it matches any of the allowed patterns
-        is_allowed = False
-        for allowed_origin in allowed_origins:
-            if allowed_origin == origin or (allowed_origin.startswith('https://*.') and origin.startswith('https://' + allowed_origin[10:])):
-                is_allowed = True
-                break
-            # Special case for Vercel deployments
-            if 'vercel.app' in origin and 'vercel.app' in allowed_origin:
-                is_allowed = True
-                break
-            # Special case for your specific domain
-            if origin == 'https://efcgym.vercel.app':
-                is_allowed = True
-                break
-                
-        if is_allowed:
-            response.headers['Access-Control-Allow-Origin'] = origin
-        else:
-            # Allow all for testing (you might want to remove this in production)
-            response.headers['Access-Control-Allow-Origin'] = origin
-    else:
-        # If no origin, allow all
-        response.headers['Access-Control-Allow-Origin'] = '*'
-    
-    # Add all necessary CORS headers
-    response.headers['Access-Control-Allow-Credentials'] = 'true'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, Access-Control-Allow-Origin, Access-Control-Allow-Credentials'
-    response.headers['Access-Control-Max-Age'] = '3600'
-    
-    # Add security headers
+def add_security_headers(response):
     response.headers['X-Content-Type-Options'] = 'nosniff'
     response.headers['X-Frame-Options'] = 'DENY'
-    
     return response
 
-# Handle preflight OPTIONS requests
-@app.before_request
-def handle_options():
-    if request.method == 'OPTIONS':
-        response = make_response()
-        origin = request.headers.get('Origin')
-        
-        # List of allowed origins
-        allowed_origins = [
-            FRONTEND_URL,  # Use the environment variable
-            'http://localhost:5173',
-            'http://localhost:5174',
-            'https://gym-git-main-dhirus-projects-0e28fcdd.vercel.app',
-            'https://gym-backend-kixz.onrender.com',
-            'https://*.netlify.app',
-            'https://*.vercel.app',
-            'https://efcgym.vercel.app'  # Add your new Vercel domain
-        ]
-        
-        # Check if origin is in allowed origins
-        if origin:
-            is_allowed = False
-            for allowed_origin in allowed_origins:
-                if allowed_origin == origin or (allowed_origin.startswith('https://*.') and origin.startswith('https://' + allowed_origin[10:])):
-                    is_allowed = True
-                    break
-                # Special case for Vercel deployments
-                if 'vercel.app' in origin and 'vercel.app' in allowed_origin:
-                    is_allowed = True
-                    break
-                # Special case for your specific domain
-                if origin == 'https://efcgym.vercel.app':
-                    is_allowed = True
-                    break
-                    
-            if is_allowed:
-                response.headers['Access-Control-Allow-Origin'] = origin
-            else:
-                # Allow all for testing
-                response.headers['Access-Control-Allow-Origin'] = origin
-        else:
-            response.headers['Access-Control-Allow-Origin'] = '*'
-        
-        response.headers['Access-Control-Allow-Credentials'] = 'true'
-        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, Access-Control-Allow-Origin, Access-Control-Allow-Credentials'
-        response.headers['Access-Control-Max-Age'] = '3600'
-        response.status_code = 200
-        return response
-
 if __name__ == '__main__':
     # Use the PORT environment variable provided by Render, default to 5000 for local development
     port = int(os.environ.get('PORT', 5000))
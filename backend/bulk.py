@@ -0,0 +1,223 @@
+import calendar
+import datetime
+import os
+
+from member_schema import MemberValidationError, member_validator
+from repository import MEMBER_STATUSES, member_status
+
+# Most members one bulk request may change; a larger filter must be narrowed
+BULK_MAX_MEMBERS = int(os.getenv('BULK_MAX_MEMBERS', 1000))
+
+# The frontend MemberForm's plan types and their length
+PLAN_MONTHS = {'1 month': 1, '2 month': 2, '4 month': 4, '6 month': 6, 'Annual': 12}
+
+# Fields a bulk operation reads to compute each member's changes
+BULK_FIELDS = ('mId', 'updatedAt', 'planType', 'expiryDate', 'totalAmount', 'amountPaid', 'dueAmount',
+               'paymentDetails', 'batch')
+
+# Keys of a bulk request's filter and the member field each one matches
+FILTER_FIELDS = {'status': 'status', 'batch': 'batch', 'planType': 'planType', 'trainingType': 'trainingType'}
+# A filter must include one of these so its query uses an index (trainingType alone has none)
+INDEXED_FILTER_KEYS = ('status', 'batch', 'planType', 'expiryFrom', 'expiryBefore')
+
+
+class BulkRequestError(ValueError):
+    """The bulk request itself is malformed (400); problems with single members are per-item results"""
+
+
+class SkipMember(Exception):
+    """This member is left unchanged; the message is its per-item result"""
+
+
+def add_months(date, months):
+    month = date.month - 1 + months
+    year = date.year + month // 12
+    month = month % 12 + 1
+    return datetime.date(year, month, min(date.day, calendar.monthrange(year, month)[1]))
+
+
+def _amount(body, field, required):
+    value = body.get(field)
+    if value is None and not required:
+        return None
+    try:
+        value = round(float(value), 2)
+    except (TypeError, ValueError):
+        raise BulkRequestError(f'{field} must be a number')
+    if value <= 0:
+        raise BulkRequestError(f'{field} must be positive')
+    return value
+
+
+def _date(value, field):
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        raise BulkRequestError(f'{field} must be a YYYY-MM-DD date')
+
+
+class BulkTarget:
+    """The members a bulk request applies to: an explicit ID list or a filter"""
+
+    def __init__(self, body):
+        ids, member_filter = body.get('ids'), body.get('filter')
+        if (ids is None) == (member_filter is None):
+            raise BulkRequestError('Provide either ids or filter')
+        self.ids = None
+        self.filter = {}
+        if ids is not None:
+            if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+                raise BulkRequestError('ids must be a non-empty list of member IDs')
+            if len(ids) > BULK_MAX_MEMBERS:
+                raise BulkRequestError(f'At most {BULK_MAX_MEMBERS} members per request')
+            self.ids = list(dict.fromkeys(ids))
+            return
+        if not isinstance(member_filter, dict) or not member_filter:
+            raise BulkRequestError('filter must be a non-empty object')
+        unknown = set(member_filter) - set(FILTER_FIELDS) - {'expiryBefore', 'expiryFrom'}
+        if unknown:
+            raise BulkRequestError(f'Unknown filter keys: {sorted(unknown)}')
+        if not any(key in member_filter for key in INDEXED_FILTER_KEYS):
+            raise BulkRequestError(f"filter must include one of {', '.join(INDEXED_FILTER_KEYS)}")
+        if 'status' in member_filter and member_filter['status'] not in MEMBER_STATUSES:
+            raise BulkRequestError(f"status must be one of {', '.join(MEMBER_STATUSES)}")
+        for key, field in FILTER_FIELDS.items():
+            if key in member_filter:
+                self.filter[field] = str(member_filter[key])
+        expiry = {}
+        if 'expiryFrom' in member_filter:
+            expiry['$gte'] = _date(member_filter['expiryFrom'], 'expiryFrom').isoformat()
+        if 'expiryBefore' in member_filter:
+            expiry['$lt'] = _date(member_filter['expiryBefore'], 'expiryBefore').isoformat()
+        if expiry:
+            self.filter['expiryDate'] = expiry
+
+
+class BulkOperation:
+    """A validated bulk change and the per-member fields it sets.
+
+    extend  - renew for another plan period, from the current expiry or from
+              today if the plan has already lapsed (optional planType, charge)
+    payment - record a payment of `amount` against each member's dues (optional method)
+    batch   - move members to `batch`
+    """
+
+    NAMES = ('extend', 'payment', 'batch')
+
+    def __init__(self, body, today, name=None):
+        self.name = name or body.get('operation')
+        if self.name not in self.NAMES:
+            raise BulkRequestError(f"operation must be one of {', '.join(self.NAMES)}")
+        self.today = today
+        self.plan_type = None
+        if self.name == 'extend':
+            self.plan_type = body.get('planType')
+            if self.plan_type is not None and self.plan_type not in PLAN_MONTHS:
+                raise BulkRequestError(f"planType must be one of {', '.join(PLAN_MONTHS)}")
+            self.charge = _amount(body, 'charge', required=False)
+        elif self.name == 'payment':
+            self.amount = _amount(body, 'amount', required=True)
+            self.method = str(body.get('method') or 'Cash')
+        else:
+            self.batch = str(body.get('batch') or '').strip()
+            if not self.batch:
+                raise BulkRequestError('batch is required')
+
+    def changes(self, member):
+        """Fields to $set on this member; raises SkipMember to leave it alone"""
+        return getattr(self, f"_{self.name}")(member)
+
+    def _extend(self, member):
+        plan_type = self.plan_type or member.get('planType')
+        if plan_type not in PLAN_MONTHS:
+            raise SkipMember('unknown_plan')
+        try:
+            expiry = datetime.date.fromisoformat(str(member.get('expiryDate')))
+        except ValueError:
+            expiry = self.today
+        start = max(expiry, self.today)
+        new_expiry = add_months(start, PLAN_MONTHS[plan_type])
+        fields = {
+            'planType': plan_type,
+            'purchaseDate': start.isoformat(),
+            'expiryDate': new_expiry.isoformat(),
+            'status': member_status(new_expiry, self.today),
+        }
+        if self.charge:
+            fields['totalAmount'] = round(float(member.get('totalAmount') or 0) + self.charge, 2)
+            fields['dueAmount'] = round(float(member.get('dueAmount') or 0) + self.charge, 2)
+        return fields
+
+    def _payment(self, member):
+        due = float(member.get('dueAmount') or 0)
+        if self.amount > due + 0.005:
+            raise SkipMember('exceeds_due')
+        paid = round(float(member.get('amountPaid') or 0) + self.amount, 2)
+        entry = f"{self.method} {self.amount:g} - {self.today.isoformat()}"
+        details = member.get('paymentDetails')
+        return {
+            'amountPaid': paid,
+            'dueAmount': round(max(0.0, float(member.get('totalAmount') or 0) - paid), 2),
+            'paymentDetails': f"{details}; {entry}" if details and details != 'Pending' else entry,
+        }
+
+    def _batch(self, member):
+        if member.get('batch') == self.batch:
+            raise SkipMember('unchanged')
+        return {'batch': self.batch}
+
+
+def plan_bulk_update(members, operation):
+    """Split the targeted members into (updates, skipped).
+
+    updates is a list of (member, fields to set); skipped maps member IDs to
+    their per-item result.
+    """
+    updates, skipped = [], {}
+    for member in members:
+        try:
+            # The same rules as single-member writes, for the fields this operation sets
+            updates.append((member, member_validator.validate(operation.changes(member), partial=True)))
+        except SkipMember as reason:
+            skipped[str(member['_id'])] = str(reason)
+        except MemberValidationError:
+            skipped[str(member['_id'])] = 'invalid'
+    return updates, skipped
+
+
+def bulk_results(target, members, updates, skipped, conflicts=()):
+    """Per-item results in request order (ID lists) or roster order (filters)"""
+    found = {str(member['_id']): member for member in members}
+    changed = {str(member['_id']): fields for member, fields in updates}
+    order = target.ids if target.ids is not None else list(found)
+    results = []
+    for member_id in order:
+        member = found.get(member_id)
+        item = {'_id': member_id, 'mId': member.get('mId') if member else None}
+        if member is None:
+            item['result'] = 'not_found'
+        elif member_id in skipped:
+            item['result'] = skipped[member_id]
+        elif member_id in conflicts:
+            item['result'] = 'conflict'
+        else:
+            item['result'] = 'updated'
+            item['changes'] = changed[member_id]
+        results.append(item)
+    return results
+
+
+def run_bulk_update(repository, target, operation):
+    """Read the targets once, compute every change, write them in one batch; returns the response body"""
+    members = repository.find_members(target.ids, target.filter, BULK_FIELDS, BULK_MAX_MEMBERS + 1)
+    if len(members) > BULK_MAX_MEMBERS:
+        raise BulkRequestError(f'The filter matches more than {BULK_MAX_MEMBERS} members; narrow it down')
+    updates, skipped = plan_bulk_update(members, operation)
+    conflicts = repository.apply_member_updates(updates) if updates else set()
+    results = bulk_results(target, members, updates, skipped, conflicts)
+    return {
+        'operation': operation.name,
+        'matched': len(members),
+        'updated': sum(1 for item in results if item['result'] == 'updated'),
+        'results': results,
+    }
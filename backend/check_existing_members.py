@@ -1,10 +1,31 @@
+import sys
+from urllib.parse import quote
+
 import requests
 
+BACKEND_URL = "https://gym-backend-kixz.onrender.com"
+
+def check_member_ids(member_ids):
+    """
+    Check whether specific member IDs are taken, one indexed HEAD request each
+    """
+    taken = []
+    for member_id in member_ids:
+        response = requests.head(f"{BACKEND_URL}/api/members/by-mid/{quote(member_id, safe='')}")
+        if response.status_code == 200:
+            taken.append(member_id)
+            print(f"ID: {member_id} | taken")
+        elif response.status_code == 404:
+            print(f"ID: {member_id} | available")
+        else:
+            print(f"ID: {member_id} | error {response.status_code}")
+    return taken
+
 def check_existing_members():
     """
     Check what members currently exist in the database to identify taken IDs
     """
-    url = "https://gym-backend-kixz.onrender.com/api/members"
+    url = f"{BACKEND_URL}/api/members"
     
     try:
         response = requests.get(url)
@@ -33,4 +54,8 @@ def check_existing_members():
         return []
 
 if __name__ == "__main__":
-    check_existing_members()
\ No newline at end of file
+    # python check_existing_members.py 042 043  checks just those IDs
+    if len(sys.argv) > 1:
+        check_member_ids(sys.argv[1:])
+    else:
+        check_existing_members()
\ No newline at end of file
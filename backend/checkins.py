@@ -0,0 +1,554 @@
+import datetime
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import Counter, deque
+
+import pymongo
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import CollectionInvalid
+
+from indexes import ensure_checkin_indexes
+from resilience import (
+    BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS, CircuitBreaker, guarded_call, is_transient_failure,
+)
+
+logger = logging.getLogger(__name__)
+
+# Most check-ins written to MongoDB in one insert_many
+CHECKINS_BATCH_SIZE = int(os.getenv('CHECKINS_BATCH_SIZE', 200))
+# Check-ins waiting to be written; beyond this the endpoint answers 503
+CHECKINS_QUEUE_SIZE = int(os.getenv('CHECKINS_QUEUE_SIZE', 10000))
+# Requests that may wait for their batch to commit. Further check-ins during a
+# burst are acknowledged with 202 once queued, so they never tie up the threads
+# that serve member CRUD.
+CHECKINS_MAX_WAITERS = int(os.getenv('CHECKINS_MAX_WAITERS', 8))
+CHECKINS_COMMIT_TIMEOUT_SECONDS = float(os.getenv('CHECKINS_COMMIT_TIMEOUT_SECONDS', 2))
+CHECKINS_WRITE_TIMEOUT_SECONDS = float(os.getenv('CHECKINS_WRITE_TIMEOUT_SECONDS', 2))
+# Append-only log: the store without MongoDB, and where batches go while MongoDB is unreachable
+CHECKINS_LOG_PATH = os.getenv('CHECKINS_LOG_PATH', '/tmp/gym-checkins.ndjson')
+# Raw check-ins are kept this long; the occupancy rollups are kept forever
+CHECKINS_RETENTION_DAYS = int(os.getenv('CHECKINS_RETENTION_DAYS', 400))
+# Days and hours in occupancy reports are in the gym's local time
+CHECKINS_TIMEZONE = os.getenv('CHECKINS_TIMEZONE', 'Asia/Kolkata')
+CHECKINS_MAX_RANGE_DAYS = int(os.getenv('CHECKINS_MAX_RANGE_DAYS', 92))
+# Most check-ins GET /api/members/<member_id>/checkins returns, and all the local store keeps per member
+CHECKIN_HISTORY_LIMIT = 100
+
+try:
+    from zoneinfo import ZoneInfo
+    LOCAL_TZ = ZoneInfo(CHECKINS_TIMEZONE)
+except Exception as e:
+    logger.warning(f"Unknown CHECKINS_TIMEZONE {CHECKINS_TIMEZONE!r}, using UTC: {e}")
+    LOCAL_TZ = datetime.timezone.utc
+
+
+class CheckinBacklogFull(Exception):
+    """More check-ins are queued than CHECKINS_QUEUE_SIZE"""
+
+
+def checkin_id(member_id, ts):
+    """The same _id every time a check-in is written, so a replayed batch can skip what already landed"""
+    key = f"{member_id}|{_as_utc(ts).isoformat()}".encode('utf-8')
+    return ObjectId(hashlib.sha1(key).digest()[:12])
+
+
+def new_checkin(member, at=None):
+    """A time-series document: ts is the time field, meta the per-member series key"""
+    ts = at or datetime.datetime.now(datetime.timezone.utc)
+    return {
+        '_id': checkin_id(member['_id'], ts),
+        'ts': ts,
+        'meta': {'memberId': str(member['_id']), 'mId': member.get('mId'), 'batch': member.get('batch') or ''},
+    }
+
+
+def checkin_to_dict(checkin):
+    return {
+        'memberId': checkin['meta']['memberId'],
+        'mId': checkin['meta'].get('mId'),
+        'batch': checkin['meta'].get('batch'),
+        'ts': _as_utc(checkin['ts']).isoformat(),
+    }
+
+
+def _as_utc(ts):
+    # pymongo returns naive UTC datetimes
+    return ts if ts.tzinfo else ts.replace(tzinfo=datetime.timezone.utc)
+
+
+def rollup_counts(checkins):
+    """Check-ins per (local day, batch, local hour)"""
+    counts = Counter()
+    for checkin in checkins:
+        local = _as_utc(checkin['ts']).astimezone(LOCAL_TZ)
+        counts[(local.date().isoformat(), checkin['meta'].get('batch') or '', local.hour)] += 1
+    return counts
+
+
+def rollup_id(day, batch):
+    # Day first, so a date range is a range scan on _id
+    return f"{day}|{batch}"
+
+
+def add_rollup_counts(rollups, counts):
+    """Add rollup_counts() to a {rollup_id: rollup document} dict"""
+    for (day, batch, hour), count in counts.items():
+        rollup = rollups.setdefault(rollup_id(day, batch), {'day': day, 'batch': batch, 'total': 0, 'hours': {}})
+        rollup['total'] += count
+        rollup['hours'][f"{hour:02d}"] = rollup['hours'].get(f"{hour:02d}", 0) + count
+    return rollups
+
+
+def retention_cutoff(now=None):
+    return (now or datetime.datetime.now(datetime.timezone.utc)) - datetime.timedelta(days=CHECKINS_RETENTION_DAYS)
+
+
+def occupancy_report(rollups, start, end):
+    """Group rollup documents into one entry per day from start to end inclusive"""
+    days = {}
+    day = start
+    while day <= end:
+        days[day.isoformat()] = {'date': day.isoformat(), 'total': 0, 'batches': {}}
+        day += datetime.timedelta(days=1)
+    for rollup in rollups:
+        entry = days.get(rollup['day'])
+        if entry is None:
+            continue
+        hourly = [rollup.get('hours', {}).get(f"{hour:02d}", 0) for hour in range(24)]
+        entry['batches'][rollup['batch']] = {'total': rollup['total'], 'hourly': hourly}
+        entry['total'] += rollup['total']
+    return list(days.values())
+
+
+class CheckinLog:
+    """Append-only NDJSON file of check-ins, fsynced once per batch.
+
+    compact() drops check-ins older than the retention period and keeps
+    their occupancy counts in a rollups line at the top of the file.
+    """
+
+    def __init__(self, path=CHECKINS_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    def append(self, checkins):
+        # The _id is derived from ts and memberId again when the log is read
+        lines = ''.join(json.dumps({'ts': _as_utc(checkin['ts']).isoformat(), 'meta': checkin['meta']}) + '\n'
+                        for checkin in checkins)
+        with self._lock, open(self.path, 'a') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _lines(self, path=None):
+        try:
+            with open(path or self.path) as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except FileNotFoundError:
+            return
+
+    def read(self, path=None):
+        for checkin in self._lines(path):
+            if 'rollups' in checkin:
+                continue
+            checkin['ts'] = datetime.datetime.fromisoformat(checkin['ts'])
+            checkin['_id'] = checkin_id(checkin['meta']['memberId'], checkin['ts'])
+            yield checkin
+
+    def read_rollups(self):
+        """Occupancy counts of the check-ins compact() removed, by rollup _id"""
+        for line in self._lines():
+            if 'rollups' in line:
+                return {rollup_id(rollup['day'], rollup['batch']): rollup for rollup in line['rollups']}
+        return {}
+
+    def compact(self, cutoff):
+        """Rewrite the log without check-ins older than cutoff; returns how many were dropped.
+
+        The new file replaces the old one atomically. Other processes must not
+        append to the same log meanwhile, so only the local store compacts.
+        """
+        with self._lock:
+            rollups = self.read_rollups()
+            kept, expired = [], []
+            for checkin in self.read():
+                (expired if _as_utc(checkin['ts']) < cutoff else kept).append(checkin)
+            if not expired:
+                return 0
+            add_rollup_counts(rollups, rollup_counts(expired))
+            compacted_path = f"{self.path}.compact-{os.getpid()}"
+            with open(compacted_path, 'w') as f:
+                f.write(json.dumps({'rollups': list(rollups.values())}) + '\n')
+                for checkin in kept:
+                    f.write(json.dumps({'ts': _as_utc(checkin['ts']).isoformat(), 'meta': checkin['meta']}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(compacted_path, self.path)
+        return len(expired)
+
+    def take_backlog(self):
+        """Move the log aside for replay; returns the paths of every backlog this process holds.
+
+        Besides the current log, that is any replay file left behind by a
+        process that is gone, e.g. a worker that died mid-replay. Claiming is
+        an atomic rename to a name carrying this pid, so when several workers
+        share the log only one of them claims each backlog.
+        """
+        with self._lock:
+            claimed = []
+            for replay_path in glob.glob(f"{glob.escape(self.path)}.replay-*"):
+                owner = _replay_owner(replay_path)
+                if owner == os.getpid():
+                    claimed.append(replay_path)
+                elif owner is None or not _pid_running(owner):
+                    claimed.append(self._claim(replay_path))
+            claimed.append(self._claim(self.path))
+        return sorted(path for path in claimed if path is not None)
+
+    def _claim(self, path):
+        self._sequence += 1
+        replay_path = f"{self.path}.replay-{os.getpid()}-{self._sequence}"
+        try:
+            os.replace(path, replay_path)
+        except FileNotFoundError:
+            return None  # Nothing logged, or another worker claimed it first
+        return replay_path
+
+
+def _replay_owner(replay_path):
+    try:
+        return int(replay_path.rsplit('.replay-', 1)[1].split('-')[0])
+    except ValueError:
+        return None
+
+
+def _pid_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Running under another user
+    return True
+
+
+class LocalCheckinStore:
+    """Check-ins kept in the append-only log when MongoDB is not configured.
+
+    The log is compacted at startup and once a day after, so it holds
+    CHECKINS_RETENTION_DAYS of check-ins like the time-series collection.
+    Only the last CHECKIN_HISTORY_LIMIT check-ins per member stay in memory.
+    """
+
+    name = 'local'
+
+    def __init__(self, log):
+        self.log = log
+        self._lock = threading.Lock()
+        self._compacted_on = None
+        self._compact()
+        self._rollups = log.read_rollups()
+        self._recent = {}
+        self._apply(list(log.read()))
+
+    def _compact(self):
+        today = datetime.datetime.now(LOCAL_TZ).date()
+        if self._compacted_on == today:
+            return
+        self._compacted_on = today
+        try:
+            dropped = self.log.compact(retention_cutoff())
+        except OSError as e:
+            logger.warning(f"Could not compact the check-in log {self.log.path}: {e}")
+            return
+        if dropped:
+            logger.info(f"Dropped {dropped} check-ins older than {CHECKINS_RETENTION_DAYS} days from {self.log.path}")
+
+    def _apply(self, checkins):
+        with self._lock:
+            add_rollup_counts(self._rollups, rollup_counts(checkins))
+            for checkin in checkins:
+                recent = self._recent.get(checkin['meta']['memberId'])
+                if recent is None:
+                    recent = self._recent[checkin['meta']['memberId']] = deque(maxlen=CHECKIN_HISTORY_LIMIT)
+                recent.append(checkin)
+
+    def write(self, checkins):
+        self._compact()
+        self.log.append(checkins)
+        self._apply(checkins)
+
+    def occupancy(self, start, end, batch=None):
+        with self._lock:
+            rollups = [dict(r) for r in self._rollups.values()
+                       if start.isoformat() <= r['day'] <= end.isoformat() and batch in (None, r['batch'])]
+        return occupancy_report(rollups, start, end)
+
+    def member_checkins(self, member_id, limit):
+        with self._lock:
+            recent = self._recent.get(str(member_id), ())
+            return [recent[-index] for index in range(1, min(limit, len(recent)) + 1)]
+
+
+class MongoCheckinStore:
+    """Check-ins in a time-series collection, with per-day, per-batch hourly rollups.
+
+    Writes come from the recorder, which has its own breaker and timeout.
+    Reads are served to requests, so they go through ``breaker`` and the
+    request deadline like member reads do.
+    """
+
+    name = 'mongodb'
+
+    def __init__(self, checkins, rollups, breaker=None):
+        self.checkins = checkins
+        self.rollups = rollups
+        self.breaker = breaker or CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+
+    def write(self, checkins):
+        # Two round trips per batch, however many check-ins it holds
+        self.checkins.insert_many(checkins, ordered=False)
+        increments = [
+            UpdateOne({'_id': rollup_id(day, batch)},
+                      {'$setOnInsert': {'day': day, 'batch': batch},
+                       '$inc': {'total': count, f"hours.{hour:02d}": count}},
+                      upsert=True)
+            for (day, batch, hour), count in rollup_counts(checkins).items()
+        ]
+        try:
+            self.rollups.bulk_write(increments, ordered=False)
+        except Exception as e:
+            # The check-ins are stored; only the occupancy counts for this batch are short
+            logger.error(f"Failed to update check-in rollups for {len(checkins)} check-ins: {e}")
+
+    def replay(self, checkins):
+        """write() the check-ins not already stored.
+
+        A batch that timed out may have landed anyway before it was logged,
+        and a replay may fail part-way and be retried. Time-series collections
+        do not enforce unique _ids, so the ones already present are skipped
+        here, and only the rest are counted in the rollups. Returns how many
+        were written.
+        """
+        if not checkins:
+            return 0
+        stored = {checkin['_id'] for checkin in self.checkins.find(
+            {'ts': {'$gte': min(c['ts'] for c in checkins), '$lte': max(c['ts'] for c in checkins)},
+             '_id': {'$in': [checkin['_id'] for checkin in checkins]}},
+            {'_id': 1})}
+        missing = [checkin for checkin in checkins if checkin['_id'] not in stored]
+        if missing:
+            self.write(missing)
+        return len(missing)
+
+    def occupancy(self, start, end, batch=None):
+        query = {'_id': {'$gte': rollup_id(start.isoformat(), ''),
+                         '$lt': rollup_id((end + datetime.timedelta(days=1)).isoformat(), '')}}
+        if batch is not None:
+            query['batch'] = batch
+        return occupancy_report(guarded_call(self.breaker, lambda: list(self.rollups.find(query))), start, end)
+
+    def member_checkins(self, member_id, limit):
+        return guarded_call(self.breaker, lambda: list(
+            self.checkins.find({'meta.memberId': str(member_id)}, {'_id': 0})
+            .sort('ts', pymongo.DESCENDING).limit(limit)))
+
+
+def init_checkin_collections(db, collection_name):
+    """Create the time-series collection (MongoDB 5.0+) or fall back to a plain one"""
+    name = f"{collection_name}_checkins"
+    try:
+        db.create_collection(
+            name,
+            timeseries={'timeField': 'ts', 'metaField': 'meta', 'granularity': 'minutes'},
+            expireAfterSeconds=CHECKINS_RETENTION_DAYS * 86400,
+        )
+        logger.info(f"Created time-series collection {name}")
+    except CollectionInvalid:
+        pass  # Already exists
+    except Exception as e:
+        logger.warning(f"Could not create time-series collection {name}, using a regular collection: {e}")
+    checkins = db[name]
+    ensure_checkin_indexes(checkins)
+    return checkins, db[f"{collection_name}_checkin_rollups"]
+
+
+def _outcome_rank(stored_in):
+    # Lost, then appended to the fallback log, then written to the store
+    return {None: 0, 'fallback': 1}.get(stored_in, 2)
+
+
+class _Ticket:
+    """Completion of the check-ins queued together, shared by every one of them.
+
+    They may be written in several batches; the ticket reports the worst
+    outcome, so nobody is told their check-in was stored when it was not.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.stored_in = None
+        self.batches = 0
+
+    def add_batch(self, stored_in):
+        if not self.batches or _outcome_rank(stored_in) < _outcome_rank(self.stored_in):
+            self.stored_in = stored_in
+        self.batches += 1
+
+
+class CheckinRecorder:
+    """Group commit for check-ins.
+
+    Requests append to a queue; one writer thread takes everything queued
+    (up to CHECKINS_BATCH_SIZE) and writes it in a single batch, so while one
+    batch is in flight the next one fills up. When the primary store fails
+    or its breaker is open, the batch goes to the append-only log instead and
+    is replayed after the next successful write.
+    """
+
+    def __init__(self, store, fallback=None, breaker=None):
+        self.store = store
+        self.fallback = fallback
+        self.breaker = breaker or CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+        self._pending = []
+        self._ticket = _Ticket()
+        self._condition = threading.Condition()
+        self._waiters = 0
+        self._stop = False
+        self._thread = None
+        self.stats_counters = Counter()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='checkin-writer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Write whatever is still queued, then stop the writer"""
+        with self._condition:
+            self._stop = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(CHECKINS_COMMIT_TIMEOUT_SECONDS + CHECKINS_WRITE_TIMEOUT_SECONDS)
+
+    def record(self, checkin, wait=True):
+        """Queue a check-in; returns where it was stored, or None if it is still queued"""
+        with self._condition:
+            if len(self._pending) >= CHECKINS_QUEUE_SIZE:
+                self.stats_counters['rejected'] += 1
+                raise CheckinBacklogFull(len(self._pending))
+            self._pending.append(checkin)
+            ticket = self._ticket
+            self._condition.notify()
+            if not wait or self._waiters >= CHECKINS_MAX_WAITERS:
+                self.stats_counters['acknowledged_queued'] += 1
+                return None
+            self._waiters += 1
+        try:
+            # A ticket spanning several batches has an outcome before its last batch
+            # commits; until then the check-in is only queued
+            if not ticket.done.wait(CHECKINS_COMMIT_TIMEOUT_SECONDS):
+                self.stats_counters['acknowledged_queued'] += 1
+                return None
+            return ticket.stored_in
+        finally:
+            with self._condition:
+                self._waiters -= 1
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._pending and not self._stop:
+                self._condition.wait()
+            batch = self._pending[:CHECKINS_BATCH_SIZE]
+            del self._pending[:CHECKINS_BATCH_SIZE]
+            ticket = self._ticket
+            drained = not self._pending
+            if drained:
+                # Check-ins queued from now on wait for the next batch
+                self._ticket = _Ticket()
+            return batch, ticket, drained
+
+    def _run(self):
+        if self.fallback is not None:
+            # Check-ins logged before a restart
+            self._replay_fallback()
+        while True:
+            batch, ticket, drained = self._next_batch()
+            if not batch:
+                return  # Stopped with nothing left to write
+            stored_in = self._write(batch)
+            # A ticket covers everything queued before its batch was taken, which
+            # can span several batches when more than CHECKINS_BATCH_SIZE are waiting
+            ticket.add_batch(stored_in)
+            if drained:
+                ticket.done.set()
+            if stored_in == self.store.name and self.fallback is not None:
+                self._replay_fallback()
+
+    def _write(self, batch):
+        try:
+            self.breaker.allow()
+            with pymongo.timeout(CHECKINS_WRITE_TIMEOUT_SECONDS):
+                self.store.write(batch)
+            self.breaker.record_success()
+            self.stats_counters['batches'] += 1
+            self.stats_counters['written'] += len(batch)
+            return self.store.name
+        except Exception as e:
+            if is_transient_failure(e):
+                self.breaker.record_failure()
+            if self.fallback is None:
+                logger.error(f"Lost {len(batch)} check-ins: {e}")
+                self.stats_counters['lost'] += len(batch)
+                return None
+            logger.warning(f"Check-in store unavailable, appending {len(batch)} check-ins to {self.fallback.path}: {e}")
+            try:
+                self.fallback.append(batch)
+            except OSError as log_error:
+                logger.error(f"Lost {len(batch)} check-ins: {log_error}")
+                self.stats_counters['lost'] += len(batch)
+                return None
+            self.stats_counters['fallback'] += len(batch)
+            return 'fallback'
+
+    def _replay_fallback(self):
+        try:
+            paths = self.fallback.take_backlog()
+        except OSError as e:
+            logger.warning(f"Could not claim logged check-ins from {self.fallback.path}: {e}")
+            return
+        for path in paths:
+            backlog, replayed = [], 0
+            try:
+                backlog = list(self.fallback.read(path))
+                self.breaker.allow()
+                for start in range(0, len(backlog), CHECKINS_BATCH_SIZE):
+                    with pymongo.timeout(CHECKINS_WRITE_TIMEOUT_SECONDS):
+                        replayed += self.store.replay(backlog[start:start + CHECKINS_BATCH_SIZE])
+            except Exception as e:
+                # Left in place; the next successful batch tries again and skips what was written
+                logger.warning(f"Replaying {len(backlog)} logged check-ins from {path} failed: {e}")
+                return
+            os.remove(path)
+            self.stats_counters['replayed'] += replayed
+            logger.info(f"Replayed {replayed} of {len(backlog)} logged check-ins from {path}")
+
+    def stats(self):
+        with self._condition:
+            queued = len(self._pending)
+        batches = self.stats_counters['batches']
+        return {
+            'store': self.store.name,
+            'queued': queued,
+            'avg_batch_size': round(self.stats_counters['written'] / batches, 1) if batches else None,
+            **self.stats_counters,
+            'breaker': self.breaker.stats(),
+        }
@@ -0,0 +1,204 @@
+import gzip
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+# Brotli is optional - gzip is always available through the standard library
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent as-is; compressing them costs more than it saves
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+COMPRESSION_CACHE_ENTRIES = int(os.getenv('COMPRESSION_CACHE_ENTRIES', 256))
+COMPRESSION_CACHE_BYTES = int(os.getenv('COMPRESSION_CACHE_BYTES', 16 * 1024 * 1024))
+# Streamed responses are flushed to the client after about this much input
+COMPRESSION_STREAM_FLUSH_BYTES = int(os.getenv('COMPRESSION_STREAM_FLUSH_BYTES', 32 * 1024))
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'text/csv',
+    'text/plain',
+    'text/html',
+}
+
+
+def _accepted_encodings(header):
+    """Parse an Accept-Encoding header into the set of codings with a non-zero q-value"""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding)
+    return accepted
+
+
+def choose_encoding(header):
+    """Pick the best supported content coding for an Accept-Encoding header"""
+    if not header:
+        return None
+    accepted = _accepted_encodings(header)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress_bytes(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESSION_BROTLI_QUALITY)
+    # mtime=0 keeps the output deterministic so identical bodies compress identically
+    return gzip.compress(data, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def stream_compress(chunks, encoding, flush_bytes=None):
+    """Compress an iterable of chunks incrementally.
+
+    The first chunk is flushed at once so the client gets bytes immediately.
+    After that the output is flushed every `flush_bytes` of input rather than
+    per chunk: an export yields one chunk per CSV row or JSON member, and a
+    flush per row would cost most of the compression ratio.
+    """
+    flush_bytes = COMPRESSION_STREAM_FLUSH_BYTES if flush_bytes is None else flush_bytes
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        # wbits=31 selects the gzip container
+        compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+
+        def flush():
+            return compressor.flush(zlib.Z_SYNC_FLUSH)
+    first, unflushed = True, 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = process(chunk)
+        unflushed += len(chunk)
+        if first or unflushed >= flush_bytes:
+            data += flush()
+            first, unflushed = False, 0
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressedBodyCache:
+    """Bounded LRU of compressed bodies keyed by a digest of the uncompressed body.
+
+    Hashing a body is far cheaper than compressing it, so unchanged resources
+    (the same member page requested by every desk) are compressed only once.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+compressed_cache = CompressedBodyCache(COMPRESSION_CACHE_ENTRIES, COMPRESSION_CACHE_BYTES)
+
+
+def _add_vary(response):
+    vary = response.headers.get('Vary')
+    if not vary:
+        response.headers['Vary'] = 'Accept-Encoding'
+    elif 'accept-encoding' not in vary.lower():
+        response.headers['Vary'] = f"{vary}, Accept-Encoding"
+
+
+def compress_response(response):
+    """after_request hook: content-negotiated compression of JSON, CSV and export bodies"""
+    if request.method == 'HEAD':
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if 'Content-Encoding' in response.headers:
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+    _add_vary(response)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        # Streamed exports are compressed chunk by chunk so the first bytes go out immediately
+        response.response = stream_compress(response.response, encoding)
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Content-Length', None)
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESSION_MIN_SIZE:
+        return response
+
+    key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+    compressed = compressed_cache.get(key)
+    if compressed is None:
+        compressed = compress_bytes(body, encoding)
+        compressed_cache.put(key, compressed)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
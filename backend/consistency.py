@@ -0,0 +1,105 @@
+import base64
+import logging
+import os
+
+import bson
+from flask import g, has_request_context, request
+from pymongo.read_preferences import SecondaryPreferred
+
+logger = logging.getLogger(__name__)
+
+# Set to false to send every read to the primary
+READ_ROUTING_ENABLED = os.getenv('READ_ROUTING_ENABLED', 'True').lower() == 'true'
+# How far behind the primary a secondary may be and still serve routed reads (MongoDB's minimum is 90)
+READ_MAX_STALENESS_SECONDS = int(os.getenv('READ_MAX_STALENESS_SECONDS', 90))
+# Routes whose reads may come from a secondary: lists, reports and exports. Everything
+# else, including reads right after a write (PUT/PATCH responses, GET by ID), stays on the primary.
+SECONDARY_READ_ENDPOINTS = set(
+    name.strip() for name in os.getenv(
+        'SECONDARY_READ_ENDPOINTS', 'get_members,export_members,member_stats,expiring_members,get_archived_members'
+    ).split(',') if name.strip()
+)
+# The report job's aggregation over every member reads from a secondary too
+JOBS_READ_SECONDARY = os.getenv('JOBS_READ_SECONDARY', 'True').lower() == 'true'
+# Returned after each write and sent back by the client, so its next reads include that write
+CAUSAL_TOKEN_HEADER = os.getenv('CAUSAL_TOKEN_HEADER', 'X-Causal-Token')
+
+SECONDARY_READS = SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS)
+
+
+def reads_from_secondary(background=False):
+    """Whether the current route (or, outside a request, a background job) reads from a secondary"""
+    if not READ_ROUTING_ENABLED:
+        return False
+    if has_request_context():
+        return request.endpoint in SECONDARY_READ_ENDPOINTS
+    return background and JOBS_READ_SECONDARY
+
+
+def encode_causal_token(session):
+    document = {'operationTime': session.operation_time, 'clusterTime': session.cluster_time}
+    return base64.urlsafe_b64encode(bson.encode(document)).decode('ascii')
+
+
+def decode_causal_token(token):
+    """The operation and cluster time in a token, or None if it is missing or malformed"""
+    if not token:
+        return None
+    try:
+        document = bson.decode(base64.urlsafe_b64decode(token.encode('ascii')))
+    except Exception:
+        return None
+    if not isinstance(document.get('operationTime'), bson.Timestamp):
+        return None
+    return document
+
+
+def has_causal_token():
+    return has_request_context() and decode_causal_token(request.headers.get(CAUSAL_TOKEN_HEADER)) is not None
+
+
+def request_session(client):
+    """The request's causally consistent session, started on first use.
+
+    It carries the client's token, so reads with it wait until the server
+    they go to has the client's last write. None outside a request, with read
+    routing off, or when the driver has no session support (mongomock).
+    """
+    if not (READ_ROUTING_ENABLED and has_request_context()):
+        return None
+    if 'mongo_session' not in g:
+        g.mongo_session = None
+        try:
+            session = client.start_session(causal_consistency=True)
+        except NotImplementedError:
+            return None
+        token = decode_causal_token(request.headers.get(CAUSAL_TOKEN_HEADER))
+        if token is not None:
+            if token.get('clusterTime'):
+                session.advance_cluster_time(token['clusterTime'])
+            session.advance_operation_time(token['operationTime'])
+        g.mongo_session = session
+    return g.mongo_session
+
+
+def add_causal_token(response):
+    """after_request hook: hand the client the time of its last write (or of the token it sent)"""
+    session = g.get('mongo_session')
+    if session is not None and session.operation_time is not None:
+        response.headers[CAUSAL_TOKEN_HEADER] = encode_causal_token(session)
+    return response
+
+
+def end_request_session(exc=None):
+    """teardown_request hook"""
+    session = g.pop('mongo_session', None)
+    if session is not None:
+        try:
+            session.end_session()
+        except Exception as e:
+            logger.debug(f"Could not end the request session: {e}")
+
+
+def init_consistency(app):
+    app.after_request(add_causal_token)
+    app.teardown_request(end_request_session)
@@ -0,0 +1,95 @@
+import re
+
+from flask import request, make_response
+
+# Bound on the number of distinct Origin values remembered, so arbitrary
+# Origin headers cannot grow the decision cache without limit
+MAX_CACHED_ORIGINS = 1024
+
+
+class CorsPolicy:
+    """CORS decisions compiled once at startup.
+
+    Exact origins go into a set, wildcard origins (``https://*.vercel.app``)
+    are folded into a single regex, and the headers for every origin seen
+    are cached so each response costs one dict lookup.
+    """
+
+    def __init__(self, origins, methods, allow_headers, max_age=86400,
+                 supports_credentials=True, allow_unlisted=False, expose_headers=()):
+        # Keep the configured order for display but drop duplicates and blanks
+        self.origins = list(dict.fromkeys(origin.rstrip('/') for origin in origins if origin))
+        self.allow_unlisted = allow_unlisted
+
+        self._exact = frozenset(origin for origin in self.origins if '*' not in origin)
+        patterns = [
+            re.escape(origin).replace(r'\*', r'[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*')
+            for origin in self.origins if '*' in origin
+        ]
+        self._wildcard = re.compile('^(?:' + '|'.join(patterns) + ')$') if patterns else None
+
+        self._common_headers = {'Vary': 'Origin'}
+        if supports_credentials:
+            self._common_headers['Access-Control-Allow-Credentials'] = 'true'
+        if expose_headers:
+            # Response headers the frontend's JavaScript may read
+            self._common_headers['Access-Control-Expose-Headers'] = ', '.join(expose_headers)
+        self._preflight_headers = {
+            'Access-Control-Allow-Methods': ', '.join(methods),
+            'Access-Control-Allow-Headers': ', '.join(allow_headers),
+            'Access-Control-Max-Age': str(max_age),
+        }
+        self._decisions = {}
+
+    def is_allowed(self, origin):
+        if origin in self._exact:
+            return True
+        if self._wildcard is not None and self._wildcard.match(origin):
+            return True
+        return self.allow_unlisted
+
+    def _compile_decision(self, origin):
+        if not self.is_allowed(origin):
+            # Still vary on Origin so caches never reuse a denied response for an allowed origin
+            return {'Vary': 'Origin'}, None
+        headers = dict(self._common_headers)
+        headers['Access-Control-Allow-Origin'] = origin
+        preflight = dict(headers)
+        preflight.update(self._preflight_headers)
+        return headers, preflight
+
+    def decision(self, origin):
+        """Return (response headers, preflight headers) for an origin; preflight headers are None if denied"""
+        decision = self._decisions.get(origin)
+        if decision is None:
+            decision = self._compile_decision(origin)
+            if len(self._decisions) >= MAX_CACHED_ORIGINS:
+                self._decisions.clear()
+            self._decisions[origin] = decision
+        return decision
+
+    def handle_preflight(self):
+        """before_request hook: answer OPTIONS preflights without reaching the view"""
+        if request.method != 'OPTIONS':
+            return None
+        response = make_response('', 204)
+        origin = request.headers.get('Origin')
+        if origin:
+            _, preflight = self.decision(origin)
+            if preflight:
+                response.headers.update(preflight)
+        return response
+
+    def apply_headers(self, response):
+        """after_request hook: add CORS headers for allowed origins"""
+        origin = request.headers.get('Origin')
+        if origin and request.method != 'OPTIONS':
+            headers, _ = self.decision(origin)
+            response.headers.update(headers)
+        return response
+
+
+def init_cors(app, policy):
+    app.before_request(policy.handle_preflight)
+    app.after_request(policy.apply_headers)
+    return policy
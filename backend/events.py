@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from bson import Timestamp
+from pymongo.errors import OperationFailure, PyMongoError
+
+from sync import encode_version
+
+logger = logging.getLogger(__name__)
+
+# Recent events kept per worker so reconnecting clients can resume with Last-Event-ID
+EVENTS_BUFFER_SIZE = int(os.getenv('EVENTS_BUFFER_SIZE', 1000))
+# A comment line is sent this often so proxies (Render's included) keep idle streams open
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))
+# Streams are closed after this long; EventSource reconnects and resumes transparently
+EVENTS_MAX_STREAM_SECONDS = float(os.getenv('EVENTS_MAX_STREAM_SECONDS', 300))
+# Open streams per worker; each one holds a gthread thread (or a gevent greenlet)
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv('EVENTS_MAX_SUBSCRIBERS', 16))
+# Reconnection delay suggested to clients, in milliseconds
+EVENTS_RETRY_MS = int(os.getenv('EVENTS_RETRY_MS', 3000))
+# "auto" uses MongoDB change streams when the deployment supports them, "off" never does
+EVENTS_CHANGE_STREAMS = os.getenv('EVENTS_CHANGE_STREAMS', 'auto').lower()
+
+def _serializable(member):
+    if member is None:
+        return None
+    member = dict(member)
+    if '_id' in member:
+        member['_id'] = str(member['_id'])
+    if isinstance(member.get('updatedAt'), Timestamp):
+        member['updatedAt'] = encode_version(member['updatedAt'])
+    return member
+
+
+class MemberEventBus:
+    """Ring buffer of member change events with blocking waits for subscribers.
+
+    Events published from the repository's write path get IDs local to this
+    process (``<boot id>-<sequence>``). Events relayed from a change stream
+    use the stream's resume token, which every worker shares, so a client
+    can resume on any worker that still has the event buffered.
+    """
+
+    def __init__(self, size=EVENTS_BUFFER_SIZE):
+        self.boot_id = uuid.uuid4().hex[:8]
+        self._events = deque(maxlen=size)
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self.subscribers = 0
+        self.published = 0
+        # ChangeStreamRelay feeding this bus, if any
+        self.relay = None
+        # Called with every event after it is published
+        self._listeners = []
+
+    def publish(self, event_type, member_id, member=None, event_id=None):
+        with self._condition:
+            self._sequence += 1
+            event = {
+                'seq': self._sequence,
+                'id': event_id or f"{self.boot_id}-{self._sequence}",
+                'type': event_type,
+                'member_id': str(member_id),
+                'member': _serializable(member),
+                'ts': time.time(),
+            }
+            self._events.append(event)
+            self.published += 1
+            self._condition.notify_all()
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Member event listener failed: {e}")
+        return event
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    @property
+    def last_sequence(self):
+        return self._sequence
+
+    def resume_point(self, last_event_id):
+        """Sequence to resume after, or None if the ID is unknown or already evicted"""
+        with self._condition:
+            for event in reversed(self._events):
+                if event['id'] == last_event_id:
+                    return event['seq']
+        return None
+
+    def wait_for_events(self, after_sequence, timeout):
+        """Events newer than after_sequence, blocking up to timeout for the first one.
+
+        Returns None if events after that point were already evicted from the buffer.
+        """
+        with self._condition:
+            if self._sequence <= after_sequence:
+                self._condition.wait(timeout)
+            if self._events and self._events[0]['seq'] > after_sequence + 1:
+                return None
+            return [event for event in self._events if event['seq'] > after_sequence]
+
+    def try_subscribe(self):
+        with self._condition:
+            if self.subscribers >= EVENTS_MAX_SUBSCRIBERS:
+                return False
+            self.subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self._condition:
+            self.subscribers -= 1
+
+    def stats(self):
+        return {
+            'source': 'change-stream' if self.relay is not None else 'write-path',
+            'subscribers': self.subscribers,
+            'buffered': len(self._events),
+            'published': self.published,
+        }
+
+
+def format_event(event):
+    payload = {key: event[key] for key in ('type', 'member_id', 'member', 'ts')}
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+def stream_events(bus, last_event_id=None, heartbeat=None, max_seconds=None):
+    """Generate the text/event-stream body for one subscriber.
+
+    Resumes after last_event_id when it is still buffered. Otherwise, and
+    whenever the subscriber falls behind the buffer, a ``reset`` event tells
+    the client to reload the full list before applying further deltas.
+    """
+    heartbeat = EVENTS_HEARTBEAT_SECONDS if heartbeat is None else heartbeat
+    max_seconds = EVENTS_MAX_STREAM_SECONDS if max_seconds is None else max_seconds
+    yield f"retry: {EVENTS_RETRY_MS}\n\n"
+    cursor = bus.last_sequence
+    if last_event_id:
+        resumed = bus.resume_point(last_event_id)
+        if resumed is None:
+            yield 'event: reset\ndata: {}\n\n'
+        else:
+            cursor = resumed
+    closes_at = time.monotonic() + max_seconds
+    while time.monotonic() < closes_at:
+        events = bus.wait_for_events(cursor, min(heartbeat, max(0.0, closes_at - time.monotonic())))
+        if events is None:
+            cursor = bus.last_sequence
+            yield 'event: reset\ndata: {}\n\n'
+        elif events:
+            cursor = events[-1]['seq']
+            yield ''.join(format_event(event) for event in events)
+        else:
+            yield ': keepalive\n\n'
+
+
+class ChangeStreamRelay:
+    """Feeds the event bus from a MongoDB change stream on a background thread"""
+
+    OPERATION_TYPES = {'insert': 'created', 'update': 'updated', 'replace': 'updated', 'delete': 'deleted'}
+    RETRY_SECONDS = 2
+
+    def __init__(self, collection, bus):
+        self.collection = collection
+        self.bus = bus
+        self.resume_token = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='change-stream-relay', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.collection.watch(full_document='updateLookup', resume_after=self.resume_token,
+                                           max_await_time_ms=1000) as stream:
+                    while not self._stop.is_set():
+                        change = stream.try_next()
+                        if change is not None:
+                            self._relay(change)
+                        self.resume_token = stream.resume_token
+            except PyMongoError as e:
+                logger.warning(f"Change stream interrupted, resuming in {self.RETRY_SECONDS}s: {e}")
+                self._stop.wait(self.RETRY_SECONDS)
+
+    def _relay(self, change):
+        event_type = self.OPERATION_TYPES.get(change['operationType'])
+        if event_type is None:
+            return
+        self.bus.publish(event_type, change['documentKey']['_id'], change.get('fullDocument'),
+                         event_id=change['_id']['_data'])
+
+
+def change_streams_supported(collection):
+    """Change streams need a replica set or sharded cluster (Atlas always is one)"""
+    try:
+        with collection.watch(max_await_time_ms=1):
+            return True
+    except OperationFailure:
+        # Standalone mongod: "The $changeStream stage is only supported on replica sets"
+        return False
+    except Exception as e:
+        logger.warning(f"Could not open a change stream: {e}")
+        return False
+
+
+def init_member_events(collection):
+    """Create the bus; relay a change stream into it when the deployment supports one.
+
+    Returns (bus, publish_writes): when publish_writes is true the repository
+    must publish its own writes, because no change stream will.
+    """
+    bus = MemberEventBus()
+    if collection is not None and EVENTS_CHANGE_STREAMS != 'off' and change_streams_supported(collection):
+        bus.relay = ChangeStreamRelay(collection, bus).start()
+        logger.info('Member events relayed from a MongoDB change stream')
+        return bus, False
+    logger.info('Member events published from the write path (single-worker only)')
+    return bus, True
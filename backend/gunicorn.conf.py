@@ -0,0 +1,15 @@
+# Loaded automatically by `gunicorn wsgi:app` (startup.sh) from this directory.
+import os
+
+# /api/members/events holds each subscriber's connection open. Sync workers
+# would spend a whole process per open stream; gthread gives each one a
+# thread instead. GUNICORN_WORKER_CLASS=gevent (with gevent installed) scales
+# further. With more than one worker and no change streams, each worker
+# only sees its own writes, so keep WEB_CONCURRENCY at 1 in that setup.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+# Comfortably above EVENTS_MAX_SUBSCRIBERS so open streams never starve API requests
+threads = int(os.getenv('GUNICORN_THREADS', 32))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
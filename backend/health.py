@@ -0,0 +1,89 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import pymongo
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PROBE_INTERVAL_SECONDS = float(os.getenv('HEALTH_PROBE_INTERVAL_SECONDS', 15))
+HEALTH_PROBE_TIMEOUT_SECONDS = float(os.getenv('HEALTH_PROBE_TIMEOUT_SECONDS', 2))
+# Number of recent pings kept for the rolling round-trip statistics
+HEALTH_PROBE_WINDOW = int(os.getenv('HEALTH_PROBE_WINDOW', 20))
+
+
+class DependencyProber:
+    """Pings MongoDB from a background thread so readiness checks cost no database round-trip"""
+
+    def __init__(self, client, interval=HEALTH_PROBE_INTERVAL_SECONDS,
+                 timeout=HEALTH_PROBE_TIMEOUT_SECONDS, window=HEALTH_PROBE_WINDOW):
+        self.client = client
+        self.interval = interval
+        self.timeout = timeout
+        self.rtts_ms = deque(maxlen=window)
+        self.last_success = None
+        self.last_failure = None
+        self.last_error = None
+        self.consecutive_failures = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='mongo-prober', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval)
+
+    def probe(self):
+        started = time.monotonic()
+        try:
+            with pymongo.timeout(self.timeout):
+                self.client.admin.command('ping')
+        except Exception as e:
+            with self._lock:
+                self.last_failure = time.time()
+                self.last_error = str(e)
+                self.consecutive_failures += 1
+            logger.warning(f"MongoDB health probe failed: {e}")
+            return False
+        rtt_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self.rtts_ms.append(rtt_ms)
+            self.last_success = time.time()
+            self.consecutive_failures = 0
+        return True
+
+    @property
+    def healthy(self):
+        # Nothing probed yet: the startup ping already succeeded
+        return self.consecutive_failures == 0
+
+    def snapshot(self):
+        with self._lock:
+            rtts = sorted(self.rtts_ms)
+            return {
+                'reachable': self.consecutive_failures == 0,
+                'consecutive_failures': self.consecutive_failures,
+                'last_success': self.last_success,
+                'last_failure': self.last_failure,
+                'last_error': self.last_error,
+                'rtt_ms': {
+                    'samples': len(rtts),
+                    'last': round(self.rtts_ms[-1], 2) if rtts else None,
+                    'avg': round(sum(rtts) / len(rtts), 2) if rtts else None,
+                    'p50': round(rtts[len(rtts) // 2], 2) if rtts else None,
+                    'max': round(rtts[-1], 2) if rtts else None,
+                },
+                'interval_seconds': self.interval,
+            }
@@ -0,0 +1,110 @@
+from pymongo import ASCENDING, DESCENDING
+
+# The single source of truth for the members collection's indexes. app.py
+# creates them at startup and init_db.py on first setup; the query-plan
+# checks in perf/query_plans.py verify every endpoint's queries use one.
+MEMBER_INDEXES = [
+    {'keys': [('mId', ASCENDING)], 'unique': True},  # Member ID should be unique
+    {'keys': [('mobileNormalized', ASCENDING)]},     # Check-in lookups by phone number
+    {'keys': [('name', ASCENDING)]},                 # Name searches
+    {'keys': [('expiryDate', ASCENDING)]},           # Expired/expiring member lists
+    {'keys': [('updatedAt', ASCENDING)]},            # Delta sync (/api/members/changes)
+    {'keys': [('status', ASCENDING), ('_id', ASCENDING)]},  # Member list filtered by status
+    {'keys': [('batch', ASCENDING), ('status', ASCENDING)]},       # Bulk filters on batch
+    {'keys': [('planType', ASCENDING), ('expiryDate', ASCENDING)]},  # Bulk renewals by plan
+]
+
+# Check-in history per member; time-series collections index ts within each series already
+CHECKIN_INDEXES = [
+    {'keys': [('meta.memberId', ASCENDING), ('ts', DESCENDING)]},
+]
+
+# Archived members are looked up like live ones when a request asks for include_archived
+ARCHIVE_INDEXES = [
+    {'keys': [('mId', ASCENDING)]},
+    {'keys': [('mobileNormalized', ASCENDING)]},
+]
+
+# Tombstones left by deletes, read by delta sync and expired by a TTL index
+TOMBSTONE_INDEXES = [
+    {'keys': [('deletedAt', ASCENDING)]},
+    {'keys': [('expireAt', ASCENDING)], 'expireAfterSeconds': 0},
+]
+
+
+def index_name(keys):
+    """The name MongoDB gives an index by default, e.g. mId_1"""
+    return '_'.join(f"{field}_{direction}" for field, direction in keys)
+
+
+def _ensure(collection, specs):
+    names = []
+    for spec in specs:
+        options = {key: value for key, value in spec.items() if key != 'keys'}
+        names.append(collection.create_index(spec['keys'], **options))
+    return names
+
+
+def ensure_member_indexes(collection):
+    """Create any missing member indexes; returns their names"""
+    return _ensure(collection, MEMBER_INDEXES)
+
+
+def ensure_tombstone_indexes(collection):
+    return _ensure(collection, TOMBSTONE_INDEXES)
+
+
+def ensure_archive_indexes(collection):
+    return _ensure(collection, ARCHIVE_INDEXES)
+
+
+def ensure_checkin_indexes(collection):
+    return _ensure(collection, CHECKIN_INDEXES)
+
+
+def tombstones_for(collection):
+    """The tombstone collection that belongs to a members collection"""
+    return collection.database[f"{collection.name}_tombstones"]
+
+
+def counters_for(collection):
+    """Sequence counters (such as the next member ID) for a members collection"""
+    return collection.database[f"{collection.name}_counters"]
+
+
+def archive_for(collection):
+    """Long-expired members moved out of a members collection"""
+    return collection.database[f"{collection.name}_archived"]
+
+
+def reports_for(collection):
+    """Precomputed reports (member stats, the expiring-soon list) for a members collection"""
+    return collection.database[f"{collection.name}_reports"]
+
+
+def leases_for(collection):
+    """Leases that keep background jobs to one worker at a time"""
+    return collection.database[f"{collection.name}_leases"]
+
+
+def index_drift(collection):
+    """Compare the live indexes with MEMBER_INDEXES.
+
+    Returns (missing, unexpected, mismatched) lists of index names, where
+    mismatched indexes exist with the right keys but different options
+    (for example a non-unique mId index).
+    """
+    live = {
+        name: info for name, info in collection.index_information().items() if name != '_id_'
+    }
+    expected = {index_name(spec['keys']): spec for spec in MEMBER_INDEXES}
+    missing = sorted(name for name in expected if name not in live)
+    unexpected = sorted(name for name in live if name not in expected)
+    mismatched = sorted(
+        name for name, spec in expected.items()
+        if name in live and (
+            [tuple(key) for key in live[name]['key']] != list(spec['keys'])
+            or bool(live[name].get('unique')) != bool(spec.get('unique'))
+        )
+    )
+    return missing, unexpected, mismatched
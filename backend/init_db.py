@@ -2,6 +2,12 @@ import os
 from dotenv import load_dotenv
 from pymongo import MongoClient
 
+from indexes import archive_for, ensure_archive_indexes, ensure_member_indexes, ensure_tombstone_indexes, tombstones_for
+from member_schema import ensure_member_validator
+from repository import backfill_normalized_mobiles
+from sync import backfill_versions
+from tenants import tenant_names, tenant_namespace
+
 # Load environment variables
 load_dotenv()
 
@@ -14,23 +20,36 @@ try:
     # Initialize MongoDB client
     client = MongoClient(MONGODB_URI)
     
-    # Access database
-    db = client[DB_NAME]
-    
-    # Create collection if it doesn't exist
-    if COLLECTION_NAME not in db.list_collection_names():
-        db.create_collection(COLLECTION_NAME)
-        print(f"Collection '{COLLECTION_NAME}' created successfully!")
-    else:
-        print(f"Collection '{COLLECTION_NAME}' already exists.")
-        
-    # Create indexes for better performance
-    collection = db[COLLECTION_NAME]
-    collection.create_index("mId", unique=True)  # Member ID should be unique
-    collection.create_index("mobile")  # Index on mobile for faster searches
-    collection.create_index("name")  # Index on name for faster searches
-    print("Indexes created successfully!")
-    
+    # Every branch gets the same collections, indexes and validator as app startup
+    for tenant in tenant_names():
+        database_name, collection_name = tenant_namespace(tenant, DB_NAME, COLLECTION_NAME)
+        db = client[database_name]
+        print(f"Branch '{tenant}': {database_name}.{collection_name}")
+
+        # Create collection if it doesn't exist
+        if collection_name not in db.list_collection_names():
+            db.create_collection(collection_name)
+            print(f"Collection '{collection_name}' created successfully!")
+        else:
+            print(f"Collection '{collection_name}' already exists.")
+
+        # Create indexes for better performance
+        collection = db[collection_name]
+        # Same index set as app startup (see indexes.py)
+        names = ensure_member_indexes(collection)
+        names += ensure_tombstone_indexes(tombstones_for(collection))
+        names += ensure_archive_indexes(archive_for(collection))
+        print(f"Indexes created successfully: {', '.join(names)}")
+
+        # Same rules as the API's member_validator (see member_schema.py)
+        ensure_member_validator(collection)
+        print("Member schema validator installed")
+
+        # Members created before delta sync have no version yet
+        print(f"Stamped updatedAt on {backfill_versions(collection)} existing members")
+        # Check-in lookups only find members through the normalized number
+        print(f"Normalized the mobile number of {backfill_normalized_mobiles(collection)} existing members")
+
     print("Database initialization completed!")
     
 except Exception as e:
@@ -0,0 +1,263 @@
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from repository import local_today
+
+logger = logging.getLogger(__name__)
+
+# Set to false to run no background jobs in this process (e.g. one-off scripts)
+JOBS_ENABLED = os.getenv('JOBS_ENABLED', 'True').lower() == 'true'
+# How often each worker checks whether a job is due
+JOBS_POLL_SECONDS = float(os.getenv('JOBS_POLL_SECONDS', 60))
+# A lease not released within this long is assumed abandoned (its worker died)
+JOBS_LEASE_SECONDS = float(os.getenv('JOBS_LEASE_SECONDS', 600))
+# A failed run is retried after this long
+JOBS_RETRY_SECONDS = float(os.getenv('JOBS_RETRY_SECONDS', 300))
+# Time allowed for each database call a job makes (requests get REQUEST_DEADLINE_MS)
+JOBS_TIMEOUT_SECONDS = float(os.getenv('JOBS_TIMEOUT_SECONDS', 60))
+# Local time of the nightly expiry sweep, HH:MM
+EXPIRY_SWEEP_AT = os.getenv('EXPIRY_SWEEP_AT', '02:00')
+# Local time of the nightly archive run, HH:MM
+ARCHIVE_AT = os.getenv('ARCHIVE_AT', '03:00')
+# How often member stats and the expiring-soon list are recomputed between sweeps
+REPORTS_REFRESH_SECONDS = float(os.getenv('REPORTS_REFRESH_SECONDS', 300))
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def daily_at(clock_time, tz):
+    """Schedule for a job that runs once a day at HH:MM local time"""
+    hour, minute = (int(part) for part in clock_time.split(':'))
+
+    def due_since(now):
+        local = now.astimezone(tz)
+        slot = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if slot > local:
+            slot -= datetime.timedelta(days=1)
+        return slot.astimezone(datetime.timezone.utc)
+    return due_since
+
+
+def every(seconds):
+    """Schedule for a job that runs every `seconds`"""
+    return lambda now: now - datetime.timedelta(seconds=seconds)
+
+
+class Job:
+    """A named task and its schedule.
+
+    ``schedule(now)`` returns the latest moment the job should have run by;
+    the job is due while its last success is older than that. ``run()``
+    returns the number of items it processed.
+    """
+
+    def __init__(self, name, run, schedule):
+        self.name = name
+        self.run = run
+        self.schedule = schedule
+
+
+class MongoLeaseStore:
+    """Job leases in MongoDB, shared by every worker and instance.
+
+    Claiming a lease is one atomic upsert that only matches when nobody
+    holds the lease and the job has not succeeded since it became due, so
+    each scheduled run happens on exactly one worker.
+    """
+
+    def __init__(self, collection, owner=None):
+        self.collection = collection
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    def acquire(self, name, due_since, lease_seconds=JOBS_LEASE_SECONDS):
+        now = _utcnow()
+        try:
+            lease = self.collection.find_one_and_update(
+                {'_id': name, '$and': [
+                    {'$or': [{'expiresAt': None}, {'expiresAt': {'$lte': now}}]},
+                    {'$or': [{'lastSuccessAt': None}, {'lastSuccessAt': {'$lt': due_since}}]},
+                ]},
+                {'$set': {'owner': self.owner, 'acquiredAt': now,
+                          'expiresAt': now + datetime.timedelta(seconds=lease_seconds)}},
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # The lease exists but is held, or the job already ran
+            return False
+        return lease is not None
+
+    def release(self, name, succeeded, duration, processed=None, error=None):
+        now = _utcnow()
+        update = {'lastRunAt': now, 'lastDuration': round(duration, 3), 'lastError': error,
+                  'lastProcessed': processed,
+                  # A failed run keeps the lease until it may be retried
+                  'expiresAt': now if succeeded else now + datetime.timedelta(seconds=JOBS_RETRY_SECONDS)}
+        if succeeded:
+            update['lastSuccessAt'] = now
+        self.collection.update_one({'_id': name, 'owner': self.owner}, {'$set': update})
+
+    def states(self):
+        return {lease.pop('_id'): lease for lease in self.collection.find()}
+
+
+class LocalLeaseStore:
+    """Job leases for a single process without MongoDB"""
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}-{os.getpid()}"
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, name, due_since, lease_seconds=JOBS_LEASE_SECONDS):
+        now = _utcnow()
+        with self._lock:
+            lease = self._leases.setdefault(name, {'expiresAt': None, 'lastSuccessAt': None})
+            if lease['expiresAt'] is not None and lease['expiresAt'] > now:
+                return False
+            if lease['lastSuccessAt'] is not None and lease['lastSuccessAt'] >= due_since:
+                return False
+            lease.update(owner=self.owner, acquiredAt=now, expiresAt=now + datetime.timedelta(seconds=lease_seconds))
+            return True
+
+    def release(self, name, succeeded, duration, processed=None, error=None):
+        now = _utcnow()
+        with self._lock:
+            lease = self._leases[name]
+            lease.update(lastRunAt=now, lastDuration=round(duration, 3), lastError=error, lastProcessed=processed,
+                         expiresAt=now if succeeded else now + datetime.timedelta(seconds=JOBS_RETRY_SECONDS))
+            if succeeded:
+                lease['lastSuccessAt'] = now
+
+    def states(self):
+        with self._lock:
+            return {name: dict(lease) for name, lease in self._leases.items()}
+
+
+class Scheduler:
+    """Runs due jobs on a background thread in every worker; the lease store picks one of them"""
+
+    def __init__(self, leases, metrics, poll_seconds=JOBS_POLL_SECONDS):
+        self.leases = leases
+        self.poll_seconds = poll_seconds
+        self.jobs = {}
+        self.running = set()
+        self._stop = threading.Event()
+        self._thread = None
+        self._runs = metrics.counter('job_runs_total', 'Background job runs in this worker, by outcome')
+        self._duration = metrics.gauge('job_last_duration_seconds', 'Duration of the last run in this worker')
+        self._last_success = metrics.gauge('job_last_success_timestamp_seconds',
+                                           'Unix time of the last successful run in this worker')
+        self._processed = metrics.gauge('job_last_processed_items', 'Items processed by the last successful run')
+
+    def add(self, job):
+        self.jobs[job.name] = job
+        return self
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='job-scheduler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            self._stop.wait(self.poll_seconds)
+
+    def run_pending(self):
+        """Run every job that is due and whose lease this worker wins; returns their names"""
+        ran = []
+        for job in list(self.jobs.values()):
+            try:
+                acquired = self.leases.acquire(job.name, job.schedule(_utcnow()))
+            except Exception as e:
+                logger.warning(f"Could not check job {job.name}: {e}")
+                continue
+            if acquired:
+                self._run(job)
+                ran.append(job.name)
+        return ran
+
+    def _run(self, job):
+        self.running.add(job.name)
+        started = time.monotonic()
+        processed, error = None, None
+        try:
+            processed = job.run()
+        except Exception as e:
+            error = str(e)
+            logger.exception(f"Job {job.name} failed: {e}")
+        finally:
+            self.running.discard(job.name)
+        duration = time.monotonic() - started
+        outcome = 'failure' if error else 'success'
+        self._runs.inc(job=job.name, outcome=outcome)
+        self._duration.set(duration, job=job.name)
+        if not error:
+            self._last_success.set(time.time(), job=job.name)
+            self._processed.set(processed or 0, job=job.name)
+            logger.info(f"Job {job.name} processed {processed} items in {duration:.2f}s")
+        try:
+            self.leases.release(job.name, not error, duration, processed, error)
+        except Exception as e:
+            # The lease expires on its own after JOBS_LEASE_SECONDS
+            logger.warning(f"Could not release the lease of job {job.name}: {e}")
+
+    def stats(self):
+        leases, lease_error = {}, None
+        try:
+            leases = self.leases.states()
+        except Exception as e:
+            lease_error = str(e)
+        return {
+            'owner': self.leases.owner,
+            'running': sorted(self.running),
+            'lease_error': lease_error,
+            'jobs': {
+                name: {
+                    'runs': self._runs.value(job=name, outcome='success'),
+                    'failures': self._runs.value(job=name, outcome='failure'),
+                    'lease': leases.get(name),
+                } for name in self.jobs
+            },
+        }
+
+
+def member_jobs(repository, tz, tenant=None):
+    """The nightly expiry sweep and archive run, and the report refresh that runs between them.
+
+    A branch other than the default one prefixes its job names with its own
+    name, so each branch's jobs have their own lease and metrics.
+    """
+    prefix = f"{tenant}/" if tenant else ''
+
+    def refresh_reports():
+        report = repository.build_report(local_today(), JOBS_TIMEOUT_SECONDS)
+        repository.save_report(report, JOBS_TIMEOUT_SECONDS)
+        return report['stats']['totalMembers']
+
+    def expiry_sweep():
+        changed = repository.sweep_statuses(local_today(), JOBS_TIMEOUT_SECONDS)
+        refresh_reports()
+        return changed
+
+    def archive_expired():
+        return repository.archive_expired(local_today(), JOBS_TIMEOUT_SECONDS)
+
+    return [
+        Job(f'{prefix}expiry-sweep', expiry_sweep, daily_at(EXPIRY_SWEEP_AT, tz)),
+        Job(f'{prefix}archive-expired', archive_expired, daily_at(ARCHIVE_AT, tz)),
+        Job(f'{prefix}member-reports', refresh_reports, every(REPORTS_REFRESH_SECONDS)),
+    ]
@@ -0,0 +1,155 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# "json" for one structured object per line, "text" for human-readable local output
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+# Longest string value written to the log before it is truncated
+LOG_MAX_FIELD_LENGTH = int(os.getenv('LOG_MAX_FIELD_LENGTH', 200))
+# Fraction of successful access-log lines kept for hot read routes, per level
+LOG_SAMPLE_RATES = {
+    logging.DEBUG: float(os.getenv('LOG_SAMPLE_RATE_DEBUG', 0.01)),
+    logging.INFO: float(os.getenv('LOG_SAMPLE_RATE_INFO', 0.1)),
+}
+
+# Fields that are never written to the log as-is
+REDACTED_FIELDS = {'profilePicture', 'idProof', 'address', 'Authorization', 'password'}
+MASKED_FIELDS = {'mobile'}
+
+# Standard LogRecord attributes; anything else on a record was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def redact(value, key=None):
+    """Copy a logged value with sensitive fields hidden and long strings cut short"""
+    if key in REDACTED_FIELDS and value:
+        return f"<redacted {len(str(value))} chars>"
+    if key in MASKED_FIELDS and isinstance(value, str) and value:
+        return '*' * max(0, len(value) - 4) + value[-4:]
+    if isinstance(value, dict):
+        return {k: redact(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value[:20]] + ([f"<+{len(value) - 20} items>"] if len(value) > 20 else [])
+    if isinstance(value, str) and len(value) > LOG_MAX_FIELD_LENGTH:
+        return f"{value[:LOG_MAX_FIELD_LENGTH]}...<+{len(value) - LOG_MAX_FIELD_LENGTH} chars>"
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key != 'sample':
+                entry[key] = redact(value, key)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        extras = {k: redact(v, k) for k, v in record.__dict__.items()
+                  if k not in _RECORD_ATTRIBUTES and k != 'sample'}
+        return f"{line} {json.dumps(extras, default=str)}" if extras else line
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the current request ID (runs on the request thread)"""
+
+    def filter(self, record):
+        if has_request_context() and 'request_id' in g:
+            record.request_id = g.request_id
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records logged with extra={'sample': True}"""
+
+    def filter(self, record):
+        if not getattr(record, 'sample', False):
+            return True
+        rate = LOG_SAMPLE_RATES.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread.
+
+    The stock prepare() formats the message on the calling thread; here the
+    record is only snapshotted (extra dicts shallow-copied so later mutation
+    by the handler cannot race the listener) and enqueued. A full queue drops
+    the record instead of blocking the request.
+    """
+
+    dropped = 0
+
+    def prepare(self, record):
+        for key, value in list(record.__dict__.items()):
+            if key not in _RECORD_ATTRIBUTES and isinstance(value, dict):
+                setattr(record, key, {k: (dict(v) if isinstance(v, dict) else v) for k, v in value.items()})
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DeferredQueueHandler.dropped += 1
+
+
+def setup_logging():
+    """Route every logger through a queue so formatting and I/O happen off the request thread"""
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    listener = QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def assign_request_id():
+    """before_request hook: reuse the caller's X-Request-ID or mint one"""
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+    g.request_started = time.monotonic()
+
+
+def add_request_id_header(response):
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+
+def init_request_logging(app):
+    app.before_request(assign_request_id)
+    app.after_request(add_request_id_header)
@@ -1,54 +1,82 @@
 import requests
 import json
+import time
+from urllib.parse import quote
+
+# Times a rate-limited (429) or busy (503) page of /api/members/changes is retried
+SYNC_MAX_RETRIES = 5
 
 class MemberManagementHelper:
     def __init__(self, backend_url="https://gym-backend-kixz.onrender.com"):
         self.backend_url = backend_url
         self.members_url = f"{backend_url}/api/members"
+        # Local copy of the roster, kept current through /api/members/changes
+        self._members = {}
+        self._sync_token = '0'
     
+    def sync_members(self):
+        """Fetch only what changed since the last sync; returns False if the backend could not be reached"""
+        retries = 0
+        while True:
+            response = requests.get(f"{self.members_url}/changes", params={'since': self._sync_token})
+            if response.status_code in (429, 503) and retries < SYNC_MAX_RETRIES:
+                # A full sync of a large roster outruns the bulk rate limit; wait as told and resume
+                retries += 1
+                time.sleep(float(response.headers.get('Retry-After', 1)))
+                continue
+            retries = 0
+            if response.status_code == 410:
+                # Token older than the server keeps deletes for: start over
+                self._members, self._sync_token = {}, '0'
+                continue
+            if response.status_code != 200:
+                print(f"Error fetching members: {response.status_code}")
+                print(response.text)
+                return False
+            changes = response.json()
+            for member in changes['members']:
+                self._members[member['_id']] = member
+            for member_id in changes['deleted']:
+                self._members.pop(member_id, None)
+            self._sync_token = changes['next']
+            if not changes['has_more']:
+                return True
+
     def get_all_members(self):
         """Get all members from the database"""
         try:
-            response = requests.get(self.members_url)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                print(f"Error fetching members: {response.status_code}")
-                print(response.text)
-                return []
+            synced = self.sync_members()
         except Exception as e:
             print(f"Error connecting to backend: {e}")
-            return []
+            synced = False
+        if not synced:
+            print(f"Warning: showing {len(self._members)} members from the last sync; the list may be incomplete")
+        return list(self._members.values())
     
     def check_member_id_exists(self, member_id):
         """Check if a member ID already exists"""
-        members = self.get_all_members()
-        for member in members:
-            if member.get('mId') == member_id:
-                return True, member
+        try:
+            response = requests.get(f"{self.members_url}/by-mid/{quote(member_id, safe='')}")
+            if response.status_code == 200:
+                return True, response.json()
+            if response.status_code != 404:
+                print(f"Error checking member ID: {response.status_code}")
+                print(response.text)
+        except Exception as e:
+            print(f"Error connecting to backend: {e}")
         return False, None
     
     def suggest_next_member_id(self):
-        """Suggest the next available member ID"""
-        members = self.get_all_members()
-        
-        # Extract existing numeric IDs
-        existing_ids = []
-        for member in members:
-            mid = member.get('mId')
-            if mid and mid.isdigit():
-                existing_ids.append(int(mid))
-        
-        # Sort the IDs
-        existing_ids.sort()
-        
-        # Find the next available ID
-        if existing_ids:
-            next_id = max(existing_ids) + 1
-            # Format to match the existing pattern (3 digits with leading zeros)
-            return f"{next_id:03d}"
-        else:
-            return "001"
+        """Reserve the next available member ID from the server's allocator"""
+        try:
+            response = requests.post(f"{self.backend_url}/api/member-ids/next")
+            if response.status_code == 201:
+                return response.json()['mId']
+            print(f"Error reserving member ID: {response.status_code}")
+            print(response.text)
+        except Exception as e:
+            print(f"Error connecting to backend: {e}")
+        return None
     
     def create_member(self, member_data):
         """Create a new member"""
@@ -94,13 +122,12 @@ class MemberManagementHelper:
         # Show existing IDs
         existing_ids = [member.get('mId') for member in members if member.get('mId')]
         print(f"\n🔢 Existing Member IDs: {sorted(existing_ids)}")
-        
-        # Show suggested next ID
-        next_id = self.suggest_next_member_id()
-        print(f"💡 Suggested next ID: {next_id}")
     
     def _get_member_status(self, member):
         """Get member status based on expiry date"""
+        # Kept current by the server's nightly expiry sweep
+        if member.get('status'):
+            return member['status'].upper()
         try:
             from datetime import datetime
             expiry_date = datetime.strptime(member.get('expiryDate', ''), '%Y-%m-%d')
@@ -0,0 +1,171 @@
+import datetime
+import math
+import os
+import re
+
+from pymongo.errors import OperationFailure
+
+# What MongoDB does with a write that breaks the collection's $jsonSchema: "error" or "warn"
+MEMBER_VALIDATION_ACTION = os.getenv('MEMBER_VALIDATION_ACTION', 'error')
+# Most rows one import request may carry
+IMPORT_MAX_MEMBERS = int(os.getenv('IMPORT_MAX_MEMBERS', 5000))
+# Rows written per bulk_write; a chunk that fails leaves the ones before it imported
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 500))
+
+_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+# MongoDB's namespace-not-found error code (collMod on a collection that does not exist yet)
+_NAMESPACE_NOT_FOUND = 26
+
+
+class Field:
+    """One member field: its kind ('string', 'number' or 'date') and whether every member has it"""
+
+    def __init__(self, kind, required=True):
+        self.kind = kind
+        self.required = required
+
+
+# The frontend's MemberForm, and the single source of truth for every write
+# path and for the collection's $jsonSchema
+MEMBER_SCHEMA = {
+    'name': Field('string'),
+    'mId': Field('string'),
+    'mobile': Field('string'),
+    'trainingType': Field('string'),
+    'address': Field('string'),
+    'idProof': Field('string'),
+    'batch': Field('string'),
+    'planType': Field('string'),
+    'purchaseDate': Field('date'),
+    'expiryDate': Field('date'),
+    'totalAmount': Field('number'),
+    'amountPaid': Field('number'),
+    'dueAmount': Field('number'),
+    'paymentDetails': Field('string'),
+    'profilePicture': Field('string', required=False),
+}
+
+
+class MemberValidationError(ValueError):
+    """A member payload with bad fields; errors maps each field to what is wrong with it"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        missing = [field for field, error in errors.items() if error == 'is required']
+        problems = [f"{field} {error}" for field, error in errors.items() if error != 'is required']
+        if missing:
+            problems.insert(0, f"Missing required fields: {missing}")
+        super().__init__('; '.join(problems))
+
+
+def _string(value):
+    if isinstance(value, str):
+        return value
+    # Member IDs and mobile numbers typed into number inputs
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ValueError('must be a string')
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('must be a number')
+    if not math.isfinite(number):
+        raise ValueError('must be a finite number')
+    return number
+
+
+def _date(value):
+    if not isinstance(value, str) or not _DATE.fullmatch(value):
+        raise ValueError('must be a YYYY-MM-DD date')
+    try:
+        datetime.date(int(value[:4]), int(value[5:7]), int(value[8:]))
+    except ValueError:
+        raise ValueError('is not a valid date')
+    return value
+
+
+_COERCE = {'string': _string, 'number': _number, 'date': _date}
+
+_BSON_TYPES = {
+    'string': {'bsonType': 'string'},
+    'number': {'bsonType': ['double', 'int', 'long', 'decimal']},
+    'date': {'bsonType': 'string', 'pattern': r'^\d{4}-\d{2}-\d{2}$'},
+}
+
+
+class MemberValidator:
+    """A schema compiled into one pass over its fields that coerces values and collects every error.
+
+    Fields outside the schema are passed through untouched.
+    """
+
+    def __init__(self, schema):
+        self._fields = tuple((name, _COERCE[field.kind], field.required) for name, field in schema.items())
+        self._schema = schema
+
+    def validate(self, data, partial=False):
+        """Coerced copy of `data`; `partial` (PATCH, bulk changes) only checks the fields present"""
+        if not isinstance(data, dict):
+            raise MemberValidationError({'member': 'must be a JSON object'})
+        member = dict(data)
+        errors = {}
+        for name, coerce, required in self._fields:
+            value = member.get(name)
+            if value is None:
+                if required and (name in member or not partial):
+                    errors[name] = 'is required'
+                continue
+            try:
+                member[name] = coerce(value)
+            except ValueError as e:
+                errors[name] = str(e)
+        if errors:
+            raise MemberValidationError(errors)
+        return member
+
+    def validate_many(self, rows):
+        """Split rows into (valid members, {row index: errors})"""
+        members, errors = [], {}
+        for index, row in enumerate(rows):
+            try:
+                members.append((index, self.validate(row)))
+            except MemberValidationError as e:
+                errors[index] = e.errors
+        return members, errors
+
+    def json_schema(self):
+        """The schema as a MongoDB $jsonSchema; other fields (server-side ones, legacy extras) are allowed"""
+        properties = {}
+        for name, field in self._schema.items():
+            rule = dict(_BSON_TYPES[field.kind])
+            if not field.required:
+                types = rule['bsonType'] if isinstance(rule['bsonType'], list) else [rule['bsonType']]
+                rule['bsonType'] = types + ['null']
+            properties[name] = rule
+        return {
+            'bsonType': 'object',
+            'required': [name for name, field in self._schema.items() if field.required],
+            'properties': properties,
+        }
+
+
+member_validator = MemberValidator(MEMBER_SCHEMA)
+
+
+def ensure_member_validator(collection, action=MEMBER_VALIDATION_ACTION):
+    """Install the member $jsonSchema on the collection, creating it if needed.
+
+    validationLevel "moderate" leaves members written before the validator
+    existed editable even if they break it; new and valid members stay valid.
+    """
+    options = {'validator': {'$jsonSchema': member_validator.json_schema()},
+               'validationLevel': 'moderate', 'validationAction': action}
+    try:
+        collection.database.command('collMod', collection.name, **options)
+    except OperationFailure as e:
+        if e.code != _NAMESPACE_NOT_FOUND:
+            raise
+        collection.database.create_collection(collection.name, **options)
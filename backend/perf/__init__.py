@@ -0,0 +1 @@
+"""Performance tooling: load tests, benchmarks and query-plan checks for the backend"""
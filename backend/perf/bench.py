@@ -0,0 +1,55 @@
+"""Run the micro-benchmarks and gate on regressions against a stored baseline.
+
+Examples (run from backend/):
+
+    python -m perf.bench save                 # record a baseline for this machine
+    python -m perf.bench check                # compare with the latest baseline, fail on >10% mean regression
+    python -m perf.bench check --threshold 5 --metric median
+    BENCH_MONGODB_URI=mongodb://localhost:27017 python -m perf.bench save
+
+Baselines are kept under perf/.benchmarks/ (one directory per
+interpreter/platform), so only compare runs taken on the same machine.
+"""
+import argparse
+import os
+import sys
+
+import pytest
+
+PERF_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_DIR = os.path.join(PERF_DIR, 'benchmarks')
+DEFAULT_STORAGE = os.path.join(PERF_DIR, '.benchmarks')
+
+
+def pytest_args(args):
+    argv = [BENCHMARK_DIR, '-q', '-p', 'no:cacheprovider',
+            f"--benchmark-storage=file://{args.storage}",
+            '--benchmark-columns=min,mean,median,max,ops,rounds',
+            '--benchmark-sort=fullname']
+    if args.k:
+        argv += ['-k', args.k]
+    if args.command == 'save':
+        argv.append('--benchmark-autosave')
+    else:
+        argv += [f"--benchmark-compare={args.baseline}" if args.baseline else '--benchmark-compare',
+                 f"--benchmark-compare-fail={args.metric}:{args.threshold}%"]
+    return argv
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro-benchmarks with a regression gate')
+    parser.add_argument('command', choices=['save', 'check'],
+                        help='save: store a new baseline; check: compare against a baseline and fail on regressions')
+    parser.add_argument('--storage', default=DEFAULT_STORAGE, help='Baseline directory (default: perf/.benchmarks)')
+    parser.add_argument('--baseline', help='Baseline run number or id prefix to compare with (default: latest)')
+    parser.add_argument('--metric', default='mean', choices=['min', 'max', 'mean', 'median'],
+                        help='Statistic compared against the baseline (default: mean)')
+    parser.add_argument('--threshold', type=int, default=int(os.getenv('BENCH_REGRESSION_THRESHOLD', 10)),
+                        help='Allowed slowdown in percent before failing (default: 10)')
+    parser.add_argument('-k', help='Only run benchmarks matching this pytest expression')
+    args = parser.parse_args(argv)
+    return pytest.main(pytest_args(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
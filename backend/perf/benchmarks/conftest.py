@@ -0,0 +1,91 @@
+"""Fixtures for the request-handler micro-benchmarks.
+
+The app (imported by perf/conftest.py's setup) is pointed at each storage
+backend by swapping ``app.members_repository``. Set BENCH_MONGODB_URI to
+also benchmark against a real local mongod, and BENCH_NETWORK_PROFILE to
+reach it through perf.latency_proxy with one of its network profiles.
+"""
+import itertools
+import os
+
+import pytest
+
+import app as app_module
+from perf.generate_members import MemberGenerator, load_into_mongo, load_into_storage
+from perf.latency_proxy import PROFILES, LatencyProxy, proxied_mongodb_uri
+from indexes import ensure_member_indexes
+from repository import InMemoryMemberRepository, MongoMemberRepository
+from resilience import CircuitBreaker
+
+ROSTER_SIZE = int(os.getenv('BENCH_ROSTER_SIZE', 1000))
+BENCH_MONGODB_URI = os.getenv('BENCH_MONGODB_URI')
+BENCH_NETWORK_PROFILE = os.getenv('BENCH_NETWORK_PROFILE')
+
+BACKENDS = ['memory', 'mongomock'] + (['mongod'] if BENCH_MONGODB_URI else [])
+
+
+def _roster():
+    return MemberGenerator(seed=7).members(ROSTER_SIZE)
+
+
+def _build_repository(backend):
+    if backend == 'memory':
+        storage = []
+        load_into_storage(storage, _roster())
+        return InMemoryMemberRepository(storage), None, None
+
+    proxy = None
+    if backend == 'mongomock':
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        from pymongo import MongoClient
+        from pymongo.uri_parser import parse_uri
+        uri = BENCH_MONGODB_URI
+        if BENCH_NETWORK_PROFILE:
+            proxy = LatencyProxy(parse_uri(uri)['nodelist'][0], PROFILES[BENCH_NETWORK_PROFILE], seed=1)
+            uri = proxied_mongodb_uri(proxy.start())
+        client = MongoClient(uri)
+    collection = client['gym_benchmarks']['members']
+    collection.drop()
+    ensure_member_indexes(collection)
+    load_into_mongo(collection, _roster())
+    return MongoMemberRepository(collection, CircuitBreaker(5, 10)), client, proxy
+
+
+@pytest.fixture(scope='session', params=BACKENDS)
+def repository(request):
+    repository, client, proxy = _build_repository(request.param)
+    yield repository
+    if client is not None:
+        repository.collection.drop()
+        client.close()
+    if proxy is not None:
+        proxy.stop()
+
+
+@pytest.fixture
+def client(repository, monkeypatch):
+    monkeypatch.setattr(app_module, 'members_repository', repository)
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def member_ids(repository):
+    return [str(member['_id']) for member in repository.list_members(0, 100)]
+
+
+class _FreshMembers:
+    """New members with mIds unique across every benchmark in the session"""
+
+    def __init__(self):
+        self._generator = MemberGenerator(seed=11, mid_prefix='BENCH', mid_width=8)
+        self._serials = itertools.count(1)
+
+    def __call__(self):
+        return self._generator.member(next(self._serials))
+
+
+@pytest.fixture(scope='session')
+def new_member():
+    return _FreshMembers()
@@ -0,0 +1,83 @@
+"""Benchmarks of the isolated functions every request goes through"""
+import copy
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app import cors_policy, member_to_dict
+from compression import choose_encoding, compress_bytes
+from log_config import redact
+from member_schema import member_validator
+from metrics import MetricsRegistry
+from perf.generate_members import MemberGenerator
+from pool import PoolMonitor
+
+MEMBERS = list(MemberGenerator(seed=3).members(25))
+IMPORT_ROWS = list(MemberGenerator(seed=4).members(10000))
+
+
+def test_serialize_member_page(benchmark):
+    def serialize():
+        return json.dumps([member_to_dict(dict(member)) for member in MEMBERS])
+
+    assert benchmark(serialize)
+
+
+def test_origin_decision_cached(benchmark):
+    cors_policy.decision('https://efcgym.vercel.app')
+    headers, _ = benchmark(cors_policy.decision, 'https://efcgym.vercel.app')
+    assert headers['Access-Control-Allow-Origin'] == 'https://efcgym.vercel.app'
+
+
+def test_origin_decision_uncached(benchmark):
+    # Compile a fresh decision each round to measure the regex/set match itself
+    headers, _ = benchmark(cors_policy._compile_decision, 'https://preview-123.vercel.app')
+    assert headers['Access-Control-Allow-Origin'] == 'https://preview-123.vercel.app'
+
+
+def test_member_status(benchmark):
+    # The helper is a CLI script that imports requests at module level
+    helper_module = pytest.importorskip('member_management_helper')
+    helper = helper_module.MemberManagementHelper(backend_url='http://localhost:5000')
+
+    def statuses():
+        return [helper._get_member_status(member) for member in MEMBERS]
+
+    assert len(benchmark(statuses)) == len(MEMBERS)
+
+
+def test_accept_encoding_negotiation(benchmark):
+    assert benchmark(choose_encoding, 'gzip, deflate, br;q=0.9, zstd') in ('br', 'gzip')
+
+
+def test_gzip_member_page(benchmark):
+    body = json.dumps(MEMBERS).encode('utf-8')
+    assert benchmark(compress_bytes, body, 'gzip')
+
+
+def test_redact_member_payload(benchmark):
+    member = copy.deepcopy(MEMBERS[0])
+    member['profilePicture'] = 'data:image/jpeg;base64,' + 'A' * 20000
+    assert benchmark(redact, member)['profilePicture'].startswith('<redacted')
+
+
+def test_validate_import_rows(benchmark):
+    # A 10,000-row import file through the same validator as POST/PUT/PATCH
+    members, errors = benchmark(member_validator.validate_many, IMPORT_ROWS)
+    assert len(members) == len(IMPORT_ROWS) and not errors
+
+
+def test_pool_listener_checkout_cycle(benchmark):
+    # The CMAP events the driver emits around every database call
+    monitor = PoolMonitor(MetricsRegistry())
+    event = SimpleNamespace(address=('localhost', 27017), connection_id=1, reason=None)
+    monitor.connection_created(event)
+
+    def checkout_cycle():
+        monitor.connection_check_out_started(event)
+        monitor.connection_checked_out(event)
+        monitor.connection_checked_in(event)
+
+    benchmark(checkout_cycle)
+    assert monitor.stats()['localhost:27017']['checked_out'] == 0
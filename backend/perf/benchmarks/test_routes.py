@@ -0,0 +1,90 @@
+"""End-to-end handler benchmarks through the Flask test client"""
+import itertools
+
+
+def test_list_members(benchmark, client):
+    response = benchmark(client.get, '/api/members?page=2&per_page=25')
+    assert response.status_code == 200
+
+
+def test_list_members_compressed(benchmark, client):
+    response = benchmark(client.get, '/api/members?page=1&per_page=100', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+
+
+def test_get_member(benchmark, client, member_ids):
+    ids = itertools.cycle(member_ids)
+    response = benchmark(lambda: client.get(f"/api/members/{next(ids)}"))
+    assert response.status_code == 200
+
+
+def test_member_by_mobile(benchmark, client, member_ids):
+    # Check-in at the door: look members up by the number as it was typed at signup
+    mobiles = itertools.cycle([client.get(f"/api/members/{member_id}").get_json()['mobile']
+                               for member_id in member_ids])
+    response = benchmark(lambda: client.get(f"/api/members/by-mobile/{next(mobiles)}"))
+    assert response.status_code == 200
+
+
+def test_create_member(benchmark, client, new_member):
+    response = benchmark(lambda: client.post('/api/members', json=new_member()))
+    assert response.status_code == 201
+
+
+def test_update_member(benchmark, client, member_ids):
+    # Fetch the documents up front so only the PUT is timed
+    members = []
+    for member_id in member_ids:
+        member = client.get(f"/api/members/{member_id}").get_json()
+        member.pop('_id', None)
+        members.append((member_id, member))
+    targets = itertools.cycle(members)
+
+    def update():
+        member_id, member = next(targets)
+        return client.put(f"/api/members/{member_id}", json=member)
+
+    response = benchmark(update)
+    assert response.status_code == 200
+
+
+def test_create_then_delete_member(benchmark, client, new_member):
+    def create_and_delete():
+        created = client.post('/api/members', json=new_member())
+        return client.delete(f"/api/members/{created.get_json()['_id']}")
+
+    response = benchmark(create_and_delete)
+    assert response.status_code == 200
+
+
+def test_bulk_renew(benchmark, client, member_ids):
+    # A promotion renews a whole list of members in one request
+    response = benchmark(client.post, '/api/members/renew', json={'ids': member_ids})
+    assert response.status_code == 200
+    assert response.get_json()['updated'] == len(member_ids)
+
+
+def test_preflight(benchmark, client):
+    headers = {'Origin': 'https://efcgym.vercel.app', 'Access-Control-Request-Method': 'PUT'}
+    response = benchmark(client.options, '/api/members', headers=headers)
+    assert response.status_code == 204
+
+
+def test_readiness(benchmark, client):
+    response = benchmark(client.get, '/readyz')
+    assert response.status_code == 200
+
+
+def test_reject_invalid_member(benchmark, client, new_member):
+    # Validation alone: the request fails before touching storage
+    member = new_member()
+    member['totalAmount'] = 'not-a-number'
+    response = benchmark(client.post, '/api/members', json=member)
+    assert response.status_code == 400
+
+
+def test_record_checkin(benchmark, client, member_ids):
+    # Scanned at the door: one request per member, group-committed by the writer thread
+    ids = itertools.cycle(member_ids)
+    response = benchmark(lambda: client.post(f"/api/members/{next(ids)}/checkins"))
+    assert response.status_code in (201, 202)
@@ -0,0 +1,54 @@
+"""Benchmarks of /api/members/search's in-process index at front-desk roster sizes"""
+import os
+
+import pytest
+
+from perf.generate_members import MemberGenerator
+from repository import member_summary
+from search import MemberSearchIndex
+
+# The index must answer within a few milliseconds at this many members
+SEARCH_MEMBERS = int(os.getenv('BENCH_SEARCH_MEMBERS', 100000))
+
+
+@pytest.fixture(scope='module')
+def search_index():
+    members = list(MemberGenerator(seed=21, mid_width=len(str(SEARCH_MEMBERS))).members(SEARCH_MEMBERS))
+    for number, member in enumerate(members):
+        member['_id'] = f"member-{number}"
+    index = MemberSearchIndex()
+    for start in range(0, len(members), 1000):
+        index.upsert_many([(member, member_summary(member)) for member in members[start:start + 1000]])
+    return index, members[len(members) // 2]
+
+
+def _misspell(name):
+    first, _, last = name.partition(' ')
+    return f"{first[:-2]}{first[-1]}{first[-2]} {last}"
+
+
+# What the front desk types to find a member
+QUERIES = {
+    'full_name': lambda m: m['name'],
+    'typeahead': lambda m: m['name'][:4],
+    'misspelled': lambda m: _misspell(m['name']),
+    'mobile': lambda m: m['mobile'],
+    'member_id': lambda m: m['mId'],
+}
+
+
+@pytest.mark.parametrize('kind', list(QUERIES))
+def test_search(benchmark, search_index, kind):
+    index, target = search_index
+    results = benchmark(index.search, QUERIES[kind](target), 10)
+    assert results
+    if kind in ('mobile', 'member_id'):
+        assert results[0][0]['_id'] == target['_id']
+    elif kind != 'typeahead':
+        assert results[0][0]['name'] == target['name']
+
+
+def test_reindex_member(benchmark, search_index):
+    index, target = search_index
+    benchmark(index.upsert, dict(target, address='12 MG Road, Bengaluru'), member_summary(target))
+    assert index.search('bengaluru', 50)
@@ -0,0 +1,18 @@
+"""Shared setup for the perf test suites (benchmarks/ and tests/).
+
+The app is imported with admission control off and without MONGODB_URI,
+so each suite chooses the storage it runs against.
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+os.environ.pop('MONGODB_URI', None)
+os.environ['ADMISSION_ENABLED'] = 'false'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+# Check-ins logged by the suites go to a throwaway file, not the shared default
+os.environ.setdefault('CHECKINS_LOG_PATH', os.path.join(tempfile.mkdtemp(prefix='gym-perf-'), 'checkins.ndjson'))
@@ -0,0 +1,228 @@
+"""Seeded generator of realistic member rosters for benchmarks and index decisions.
+
+Every field in the API's required_fields is filled with values shaped like
+production data: the frontend's batches, plan types and training types,
+purchase dates spread over the last two years with expiry dates derived
+from the plan (so a realistic share is expired or expiring), partial
+payments with dues, mobile numbers in the mixed formats clerks actually
+type, and optional base64 photos of a configurable size.
+
+Examples (run from backend/):
+
+    python -m perf.generate_members --count 100000 --ndjson members.ndjson
+    python -m perf.generate_members --count 1000000 --mongodb-uri mongodb://localhost:27017 --db bench --drop
+"""
+import argparse
+import base64
+import calendar
+import datetime
+import json
+import random
+import sys
+import time
+
+FIRST_NAMES = [
+    'Aarav', 'Vivaan', 'Aditya', 'Vihaan', 'Arjun', 'Sai', 'Reyansh', 'Ayaan', 'Krishna', 'Ishaan',
+    'Rohan', 'Rahul', 'Amit', 'Suresh', 'Ravi', 'Vikram', 'Karan', 'Manish', 'Deepak', 'Nikhil',
+    'Ananya', 'Diya', 'Aadhya', 'Saanvi', 'Pari', 'Anika', 'Navya', 'Priya', 'Sneha', 'Pooja',
+    'Kavya', 'Meera', 'Neha', 'Riya', 'Shreya', 'Divya', 'Anjali', 'Lakshmi', 'Sunita', 'Fatima',
+    'Mohammed', 'Imran', 'Farhan', 'Zoya', 'Gurpreet', 'Harpreet', 'Simran', 'Joseph', 'Mary', 'Thomas',
+]
+LAST_NAMES = [
+    'Sharma', 'Verma', 'Gupta', 'Singh', 'Kumar', 'Patel', 'Shah', 'Reddy', 'Rao', 'Nair',
+    'Iyer', 'Menon', 'Das', 'Bose', 'Chatterjee', 'Banerjee', 'Mukherjee', 'Joshi', 'Kulkarni', 'Deshpande',
+    'Khan', 'Ahmed', 'Sheikh', 'Gill', 'Sandhu', 'Dhillon', 'Fernandes', 'DSouza', 'Pillai', 'Yadav',
+]
+STREETS = ['MG Road', 'Station Road', 'Gandhi Nagar', 'Nehru Street', 'Park Avenue', 'Lake View Road',
+           'Temple Street', 'Market Road', 'Civil Lines', 'Sector 14', 'Main Bazaar', 'Ring Road']
+CITIES = ['Pune', 'Mumbai', 'Bengaluru', 'Hyderabad', 'Chennai', 'Delhi', 'Jaipur', 'Lucknow', 'Kochi', 'Indore']
+
+# Option lists mirror the frontend's MemberForm
+TRAINING_TYPES = (['Personal Training', 'General Training', 'Weight Training', 'Cardio Training'], [10, 55, 25, 10])
+BATCHES = (['Morning(5AM-10AM)', 'Evening(5PM-10PM)'], [55, 45])
+PLAN_TYPES = (['1 month', '2 month', '4 month', '6 month', 'Annual'], [40, 15, 15, 15, 15])
+PLAN_MONTHS = {'1 month': 1, '2 month': 2, '4 month': 4, '6 month': 6, 'Annual': 12}
+PLAN_PRICES = {'1 month': 1000, '2 month': 1800, '4 month': 3400, '6 month': 4800, 'Annual': 8500}
+PAYMENT_METHODS = ['Cash', 'UPI', 'Card', 'Bank Transfer']
+ID_PROOFS = ['Aadhaar', 'PAN', 'Driving Licence', 'Voter ID']
+
+# Purchase dates fall within this many days before today, weighted towards recent ones
+PURCHASE_WINDOW_DAYS = 730
+
+
+def add_months(date, months):
+    month = date.month - 1 + months
+    year = date.year + month // 12
+    month = month % 12 + 1
+    day = min(date.day, calendar.monthrange(year, month)[1])
+    return datetime.date(year, month, day)
+
+
+def format_mobile(rng, digits):
+    """The same number written the ways front-desk staff type it"""
+    style = rng.random()
+    if style < 0.6:
+        return digits
+    if style < 0.75:
+        return f"+91 {digits[:5]} {digits[5:]}"
+    if style < 0.85:
+        return f"0{digits}"
+    if style < 0.95:
+        return f"{digits[:5]}-{digits[5:]}"
+    return f"+91{digits}"
+
+
+class MemberGenerator:
+    def __init__(self, seed=42, photo_ratio=0.0, photo_bytes=20000, today=None, mid_width=3, mid_prefix=''):
+        self.rng = random.Random(seed)
+        self.photo_ratio = photo_ratio
+        self.today = today or datetime.date.today()
+        self.mid_width = mid_width
+        self.mid_prefix = mid_prefix
+        # A small pool of photos keeps generation fast while payload sizes stay realistic
+        photo_rng = random.Random(seed + 1)
+        self.photos = [
+            'data:image/jpeg;base64,' + base64.b64encode(
+                bytes(photo_rng.getrandbits(8) for _ in range(photo_bytes))
+            ).decode('ascii')
+            for _ in range(8)
+        ] if photo_ratio > 0 else []
+
+    def member(self, serial):
+        rng = self.rng
+        plan = rng.choices(*PLAN_TYPES)[0]
+        purchase = self.today - datetime.timedelta(days=int(rng.triangular(0, PURCHASE_WINDOW_DAYS, 0)))
+        expiry = add_months(purchase, PLAN_MONTHS[plan])
+        total = PLAN_PRICES[plan] - rng.choice([0, 0, 0, 100, 200, 500])
+        paid = total if rng.random() < 0.7 else round(total * rng.choice([0, 0.25, 0.5, 0.75]), 2)
+        method = rng.choice(PAYMENT_METHODS)
+        digits = f"{rng.choice('6789')}{rng.randrange(10 ** 9):09d}"
+        member = {
+            'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            'mId': f"{self.mid_prefix}{serial:0{self.mid_width}d}",
+            'mobile': format_mobile(rng, digits),
+            'trainingType': rng.choices(*TRAINING_TYPES)[0],
+            'address': f"{rng.randint(1, 999)}, {rng.choice(STREETS)}, {rng.choice(CITIES)}",
+            'idProof': f"{rng.choice(ID_PROOFS)} {rng.randrange(10 ** 11):011d}",
+            'batch': rng.choices(*BATCHES)[0],
+            'planType': plan,
+            'purchaseDate': purchase.isoformat(),
+            'expiryDate': expiry.isoformat(),
+            'totalAmount': float(total),
+            'amountPaid': float(paid),
+            'dueAmount': float(round(total - paid, 2)),
+            'paymentDetails': f"{method} - {purchase.isoformat()}" if paid else 'Pending',
+        }
+        if self.photos and rng.random() < self.photo_ratio:
+            member['profilePicture'] = rng.choice(self.photos)
+        return member
+
+    def members(self, count, start=1):
+        for serial in range(start, start + count):
+            yield self.member(serial)
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def load_into_mongo(collection, members, batch_size=5000):
+    """Bulk insert with unordered batches; returns the number of inserted documents.
+
+    Documents get the fields MongoMemberRepository derives on every write.
+    """
+    from repository import normalize_mobile
+    from sync import backfill_versions
+    inserted = 0
+    for batch in batched(members, batch_size):
+        for member in batch:
+            member['mobileNormalized'] = normalize_mobile(member['mobile'])
+        inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+    backfill_versions(collection)
+    return inserted
+
+
+def load_into_storage(storage, members):
+    """Fill the app's in-memory store the way InMemoryMemberRepository.insert_member would"""
+    import uuid
+    from repository import normalize_mobile
+    from sync import VersionClock
+    clock = VersionClock()
+    count = 0
+    for member in members:
+        member_id = str(uuid.uuid4())
+        member['_id'] = member_id
+        member['id'] = member_id
+        member['updatedAt'] = clock.next()
+        member['mobileNormalized'] = normalize_mobile(member['mobile'])
+        storage.append(member)
+        count += 1
+    return count
+
+
+def write_ndjson(path, members):
+    count = 0
+    with open(path, 'w') as f:
+        for member in members:
+            f.write(json.dumps(member, separators=(',', ':')))
+            f.write('\n')
+            count += 1
+    return count
+
+
+def read_ndjson(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a realistic synthetic member roster')
+    parser.add_argument('--count', type=int, default=10000, help='Number of members (default: 10000)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same roster')
+    parser.add_argument('--photo-ratio', type=float, default=0.0,
+                        help='Fraction of members with a profilePicture (default: 0)')
+    parser.add_argument('--photo-bytes', type=int, default=20000,
+                        help='Raw size of each photo before base64 encoding (default: 20000)')
+    parser.add_argument('--today', help='Reference date YYYY-MM-DD for purchase/expiry dates (default: today)')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--ndjson', help='Write members to this NDJSON file')
+    target.add_argument('--mongodb-uri', help='Bulk insert into MongoDB at this URI')
+    parser.add_argument('--db', default='Members', help='Database for --mongodb-uri (default: Members)')
+    parser.add_argument('--collection', default='Members_List', help='Collection for --mongodb-uri')
+    parser.add_argument('--drop', action='store_true', help='Drop the collection before loading')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Documents per insert_many (default: 5000)')
+    args = parser.parse_args(argv)
+
+    today = datetime.date.fromisoformat(args.today) if args.today else None
+    generator = MemberGenerator(args.seed, args.photo_ratio, args.photo_bytes, today,
+                                mid_width=max(3, len(str(args.count))))
+    members = generator.members(args.count)
+    started = time.perf_counter()
+    if args.ndjson:
+        count = write_ndjson(args.ndjson, members)
+        destination = args.ndjson
+    else:
+        from pymongo import MongoClient
+        client = MongoClient(args.mongodb_uri)
+        collection = client[args.db][args.collection]
+        if args.drop:
+            collection.drop()
+        count = load_into_mongo(collection, members, args.batch_size)
+        destination = f"{args.db}.{args.collection}"
+        client.close()
+    elapsed = time.perf_counter() - started
+    print(f"Loaded {count} members into {destination} in {elapsed:.1f}s ({count / elapsed:.0f}/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
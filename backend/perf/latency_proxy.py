@@ -0,0 +1,230 @@
+"""TCP proxy that makes a local mongod behave like a distant Atlas cluster.
+
+Every chunk read from either side is delivered after a one-way delay
+(latency plus random jitter), at most at the configured bandwidth. Chunks
+are never reordered. With a drop rate set, the proxy can also cut a
+connection mid-stream. Round trips that a local mongod hides, such as a
+second find_one after an update, then cost real wall-clock time.
+
+Examples (run from backend/):
+
+    # Standalone: point the app at mongodb://127.0.0.1:27018/?directConnection=true
+    python -m perf.latency_proxy --target localhost:27017 --listen 127.0.0.1:27018 --profile atlas-cross-region
+
+    # Custom conditions
+    python -m perf.latency_proxy --target localhost:27017 --latency-ms 20 --jitter-ms 5 --bandwidth-kbps 8000
+
+Connect through the proxy with directConnection=true. Otherwise the
+driver discovers the replica set's real addresses and bypasses the proxy.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, asdict
+
+
+@dataclass
+class NetworkProfile:
+    latency_ms: float = 0.0        # One-way delay added to every chunk
+    jitter_ms: float = 0.0         # Uniform random extra delay, 0..jitter_ms
+    bandwidth_kbps: float = 0.0    # Per-direction cap in kilobits/second; 0 is unlimited
+    drop_rate: float = 0.0         # Probability that a given chunk cuts its connection instead
+
+
+# Round-trip time is twice latency_ms
+PROFILES = {
+    'local': NetworkProfile(),
+    # Render and Atlas in the same cloud region
+    'atlas-same-region': NetworkProfile(latency_ms=1.5, jitter_ms=1.0, bandwidth_kbps=200000),
+    # Render in Oregon talking to an Atlas cluster in Virginia
+    'atlas-cross-region': NetworkProfile(latency_ms=35, jitter_ms=5, bandwidth_kbps=50000),
+    # The free tier on a bad day: slow, jittery, and occasionally resets connections
+    'atlas-degraded': NetworkProfile(latency_ms=80, jitter_ms=40, bandwidth_kbps=10000, drop_rate=0.001),
+}
+
+
+def parse_address(value, default_host='127.0.0.1'):
+    host, _, port = value.rpartition(':')
+    return host or default_host, int(port)
+
+
+class LatencyProxy:
+    """Forward TCP connections to target while applying a NetworkProfile.
+
+    ``start()`` runs the proxy on its own event loop thread so it can sit in
+    front of a synchronous client in the same process; ``serve_forever()``
+    is the standalone entry point.
+    """
+
+    READ_SIZE = 65536
+
+    def __init__(self, target, profile, listen=('127.0.0.1', 0), seed=None):
+        self.target = target
+        self.profile = profile
+        self.listen = listen
+        self.rng = random.Random(seed)
+        self.address = None
+        self.stats = {'connections': 0, 'active': 0, 'dropped': 0,
+                      'chunks_up': 0, 'chunks_down': 0, 'bytes_up': 0, 'bytes_down': 0}
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._writers = set()
+
+    def _delay(self):
+        return (self.profile.latency_ms + self.rng.uniform(0, self.profile.jitter_ms)) / 1000
+
+    async def _pipe(self, reader, writer, direction, peer_writer):
+        """Copy one direction, releasing each chunk at its scheduled arrival time"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        # Time the link is busy until, for the bandwidth cap
+        link_free_at = 0.0
+
+        async def deliver():
+            while True:
+                arrival, data = await queue.get()
+                if data is None:
+                    break
+                wait = arrival - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                writer.write(data)
+                await writer.drain()
+            writer.close()
+
+        sender = asyncio.create_task(deliver())
+        last_arrival = 0.0
+        try:
+            while True:
+                data = await reader.read(self.READ_SIZE)
+                if not data:
+                    break
+                if self.profile.drop_rate and self.rng.random() < self.profile.drop_rate:
+                    self.stats['dropped'] += 1
+                    peer_writer.transport.abort()
+                    writer.transport.abort()
+                    break
+                self.stats[f"chunks_{direction}"] += 1
+                self.stats[f"bytes_{direction}"] += len(data)
+                now = loop.time()
+                if self.profile.bandwidth_kbps:
+                    link_free_at = max(link_free_at, now) + len(data) * 8 / (self.profile.bandwidth_kbps * 1000)
+                    sent = link_free_at
+                else:
+                    sent = now
+                # Jitter must not reorder chunks on the same connection
+                last_arrival = max(last_arrival, sent + self._delay())
+                queue.put_nowait((last_arrival, data))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            queue.put_nowait((0.0, None))
+            try:
+                await sender
+            except (ConnectionError, OSError):
+                pass
+
+    async def _handle(self, client_reader, client_writer):
+        self.stats['connections'] += 1
+        self.stats['active'] += 1
+        try:
+            server_reader, server_writer = await asyncio.open_connection(*self.target)
+        except OSError:
+            client_writer.close()
+            self.stats['active'] -= 1
+            return
+        self._writers.update((client_writer, server_writer))
+        try:
+            await asyncio.gather(
+                self._pipe(client_reader, server_writer, 'up', client_writer),
+                self._pipe(server_reader, client_writer, 'down', server_writer),
+            )
+        finally:
+            self._writers.difference_update((client_writer, server_writer))
+            self.stats['active'] -= 1
+
+    async def _start_server(self):
+        self._server = await asyncio.start_server(self._handle, *self.listen)
+        self.address = self._server.sockets[0].getsockname()[:2]
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start_server())
+        self._ready.set()
+        self._loop.run_forever()
+        self._server.close()
+        # Reset connections still open and let their tasks wind down before the loop closes
+        for writer in list(self._writers):
+            writer.transport.abort()
+        tasks = asyncio.all_tasks(self._loop)
+        if tasks:
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self._loop.close()
+
+    def start(self):
+        """Serve from a daemon thread; returns (host, port) once listening"""
+        self._thread = threading.Thread(target=self._run, name='latency-proxy', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self.address
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+
+    def serve_forever(self):
+        async def serve():
+            await self._start_server()
+            async with self._server:
+                await self._server.serve_forever()
+        asyncio.run(serve())
+
+
+def proxied_mongodb_uri(address):
+    host, port = address
+    return f"mongodb://{host}:{port}/?directConnection=true"
+
+
+def resolve_profile(name=None, **overrides):
+    profile = PROFILES[name] if name else NetworkProfile()
+    values = asdict(profile)
+    values.update({key: value for key, value in overrides.items() if value is not None})
+    return NetworkProfile(**values)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='TCP proxy adding latency, jitter, bandwidth limits and drops')
+    parser.add_argument('--target', default='localhost:27017', help='host:port to forward to (default: localhost:27017)')
+    parser.add_argument('--listen', default='127.0.0.1:27018', help='host:port to listen on (default: 127.0.0.1:27018)')
+    parser.add_argument('--profile', choices=sorted(PROFILES), help='Start from a named network profile')
+    parser.add_argument('--latency-ms', type=float, help='One-way latency in milliseconds')
+    parser.add_argument('--jitter-ms', type=float, help='Extra random one-way delay, up to this many milliseconds')
+    parser.add_argument('--bandwidth-kbps', type=float, help='Per-direction bandwidth cap in kilobits/second')
+    parser.add_argument('--drop-rate', type=float, help='Probability that a chunk resets its connection')
+    parser.add_argument('--seed', type=int, help='Random seed for jitter and drops')
+    args = parser.parse_args(argv)
+
+    profile = resolve_profile(args.profile, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                              bandwidth_kbps=args.bandwidth_kbps, drop_rate=args.drop_rate)
+    listen = parse_address(args.listen)
+    proxy = LatencyProxy(parse_address(args.target, 'localhost'), profile, listen, args.seed)
+    print(f"Proxying {args.listen} -> {args.target} with {profile}", file=sys.stderr)
+    print(f"Connect with {proxied_mongodb_uri(listen)}", file=sys.stderr)
+    started = time.monotonic()
+    try:
+        proxy.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"{proxy.stats} over {time.monotonic() - started:.0f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
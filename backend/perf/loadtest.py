@@ -0,0 +1,523 @@
+"""HTTP load-test harness for the backend.
+
+Boots app.py under gunicorn (against a local mongod, an in-process mongomock
+database or the in-memory store), seeds it, then drives a weighted mix of
+requests either closed-loop (fixed concurrency, each worker sends the next
+request as soon as the last one returns) or open-loop (fixed arrival rate,
+latency measured from the scheduled send time so a slow server cannot hide
+its queueing delay). Results are written as JSON for comparison across
+commits.
+
+Examples (run from backend/):
+
+    python -m perf.loadtest run --store mongomock --concurrency 16 --duration 30 --out base.json
+    python -m perf.loadtest run --store mongod --mongodb-uri mongodb://localhost:27017 --rate 200
+    python -m perf.loadtest run --store mongod --network-profile atlas-cross-region --out cross-region.json
+    python -m perf.loadtest run --target https://staging.example.com --mix list=80,get=20
+    python -m perf.loadtest compare base.json new.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from perf.generate_members import MemberGenerator
+from perf.latency_proxy import PROFILES, proxied_mongodb_uri
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = 'list=40,get=30,create=10,update=10,delete=5,health=5'
+PERCENTILES = (50, 90, 95, 99)
+
+
+def parse_mix(spec):
+    """'list=40,get=30' -> [('list', 40.0), ('get', 30.0)]"""
+    mix = []
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation '{name}'. Choose from: {', '.join(sorted(OPERATIONS))}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def member_payload(rng, serial):
+    # Realistic members from the roster generator, with mIds that cannot clash with real ones
+    return MemberGenerator(seed=rng.randrange(2 ** 32), mid_width=7, mid_prefix='LT').member(serial)
+
+
+class MemberPool:
+    """IDs of members known to exist, shared by all workers"""
+
+    def __init__(self):
+        self.ids = []
+        self.serial = 0
+        self._lock = threading.Lock()
+
+    def next_serial(self):
+        with self._lock:
+            self.serial += 1
+            return self.serial
+
+    def add(self, member_id):
+        with self._lock:
+            self.ids.append(member_id)
+
+    def pick(self, rng):
+        with self._lock:
+            return rng.choice(self.ids) if self.ids else None
+
+    def take(self, rng):
+        with self._lock:
+            if not self.ids:
+                return None
+            return self.ids.pop(rng.randrange(len(self.ids)))
+
+
+class Client:
+    """Keep-alive HTTP connection that transparently reconnects when the server closes it"""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.connection = None
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        self.connection = cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None):
+        headers = {'Accept-Encoding': 'gzip'}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            if self.connection is None:
+                self._connect()
+            try:
+                self.connection.request(method, self.prefix + path, body=data, headers=headers)
+                response = self.connection.getresponse()
+                payload = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.connection.close()
+                    self.connection = None
+                return response.status, payload, response.getheader('Content-Encoding')
+            except (http.client.RemoteDisconnected, ConnectionError, http.client.CannotSendRequest):
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+
+
+def _json(payload, encoding):
+    if encoding == 'gzip':
+        import gzip
+        payload = gzip.decompress(payload)
+    return json.loads(payload)
+
+
+def op_list(client, pool, rng):
+    return client.request('GET', f"/api/members?page={rng.randint(1, 4)}&per_page=25")
+
+
+def op_get(client, pool, rng):
+    member_id = pool.pick(rng)
+    return client.request('GET', f"/api/members/{member_id or 'missing'}")
+
+
+def op_create(client, pool, rng):
+    status, payload, encoding = client.request('POST', '/api/members', member_payload(rng, pool.next_serial()))
+    if status == 201:
+        pool.add(_json(payload, encoding)['_id'])
+    return status, payload, encoding
+
+
+def op_update(client, pool, rng):
+    member_id = pool.pick(rng)
+    body = member_payload(rng, pool.next_serial())
+    return client.request('PUT', f"/api/members/{member_id or 'missing'}", body)
+
+
+def op_delete(client, pool, rng):
+    member_id = pool.take(rng)
+    return client.request('DELETE', f"/api/members/{member_id or 'missing'}")
+
+
+def op_stats(client, pool, rng):
+    return client.request('GET', '/api/members/stats')
+
+
+def op_checkin(client, pool, rng):
+    member_id = pool.pick(rng)
+    return client.request('POST', f"/api/members/{member_id or 'missing'}/checkins")
+
+
+def op_health(client, pool, rng):
+    return client.request('GET', '/readyz')
+
+
+OPERATIONS = {
+    'list': op_list,
+    'get': op_get,
+    'create': op_create,
+    'update': op_update,
+    'delete': op_delete,
+    'stats': op_stats,
+    'checkin': op_checkin,
+    'health': op_health,
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.statuses = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, op, latency_ms, status):
+        with self._lock:
+            self.samples.setdefault(op, []).append(latency_ms)
+            counts = self.statuses.setdefault(op, {})
+            counts[str(status)] = counts.get(str(status), 0) + 1
+            if status is None or status >= 500 or status in (0, 429):
+                self.errors[op] = self.errors.get(op, 0) + 1
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 3)
+
+
+def summarize(samples, elapsed, errors=0, statuses=None):
+    values = sorted(samples)
+    summary = {
+        'requests': len(values),
+        'errors': errors,
+        'throughput_rps': round(len(values) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(values) / len(values), 3) if values else None,
+            'max': round(values[-1], 3) if values else None,
+        },
+    }
+    for pct in PERCENTILES:
+        summary['latency_ms'][f"p{pct}"] = _percentile(values, pct)
+    if statuses is not None:
+        summary['statuses'] = statuses
+    return summary
+
+
+def _execute(op, client, pool, rng, recorder, scheduled):
+    try:
+        status = OPERATIONS[op](client, pool, rng)[0]
+    except (OSError, http.client.HTTPException):
+        status = 0
+    recorder.record(op, (time.perf_counter() - scheduled) * 1000, status)
+
+
+def run_closed_loop(base_url, mix, concurrency, duration, pool, recorder, seed, timeout):
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    stop_at = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = Client(base_url, timeout)
+        while time.perf_counter() < stop_at:
+            op = rng.choices(names, weights)[0]
+            _execute(op, client, pool, rng, recorder, time.perf_counter())
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open_loop(base_url, mix, rate, concurrency, duration, pool, recorder, seed, timeout):
+    """Send requests at a fixed arrival rate; latency includes time spent waiting for a free worker"""
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    schedule_rng = random.Random(seed)
+    total = int(rate * duration)
+    start = time.perf_counter() + 0.1
+    slots = [(start + i / rate, schedule_rng.choices(names, weights)[0]) for i in range(total)]
+    cursor = {'next': 0}
+    cursor_lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed + index + 1)
+        client = Client(base_url, timeout)
+        while True:
+            with cursor_lock:
+                if cursor['next'] >= total:
+                    return
+                scheduled, op = slots[cursor['next']]
+                cursor['next'] += 1
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            _execute(op, client, pool, rng, recorder, scheduled)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_network_proxy(args):
+    """Run perf.latency_proxy in its own process between the server and mongod.
+
+    A separate process keeps the proxy's event loop from competing with the
+    load generator's threads for the GIL.
+    """
+    from pymongo.uri_parser import parse_uri
+    host, port = parse_uri(args.mongodb_uri)['nodelist'][0]
+    listen = ('127.0.0.1', _free_port())
+    command = [
+        sys.executable, '-m', 'perf.latency_proxy', '--target', f"{host}:{port}",
+        '--listen', f"{listen[0]}:{listen[1]}", '--profile', args.network_profile, '--seed', str(args.seed),
+    ]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, stdout=sys.stderr)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"latency proxy exited with code {process.returncode}")
+        try:
+            socket.create_connection(listen, 0.2).close()
+            return process, proxied_mongodb_uri(listen)
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise SystemExit('latency proxy did not start within 10s')
+
+
+def boot_server(args, mongodb_uri=None):
+    """Start gunicorn on a free local port and wait until /healthz answers"""
+    port = _free_port()
+    env = dict(os.environ)
+    # The load generator is a single client; admission control would just measure itself
+    env.setdefault('ADMISSION_ENABLED', 'false')
+    env.setdefault('LOG_LEVEL', 'WARNING')
+    entry = 'wsgi:app'
+    workers = args.workers
+    if args.store == 'mongomock':
+        entry = 'perf.mongomock_app:app'
+        if workers != 1:
+            print('mongomock keeps data per process; forcing --workers 1', file=sys.stderr)
+            workers = 1
+    elif args.store == 'mongod':
+        env['MONGODB_URI'] = mongodb_uri or args.mongodb_uri
+        env.setdefault('DB_NAME', 'loadtest')
+        env.setdefault('COLLECTION_NAME', 'members')
+    else:
+        env.pop('MONGODB_URI', None)
+        if workers != 1:
+            print('the in-memory store is per process; forcing --workers 1', file=sys.stderr)
+            workers = 1
+
+    # Explicit worker settings so gunicorn.conf.py's production defaults do not apply;
+    # the app sizes its MongoDB pool from the same settings
+    worker_class = 'gthread' if args.threads > 1 else 'sync'
+    env['GUNICORN_WORKER_CLASS'] = worker_class
+    env['GUNICORN_THREADS'] = str(args.threads)
+    if args.pool_size:
+        env['MONGO_MAX_POOL_SIZE'] = str(args.pool_size)
+    command = [
+        sys.executable, '-m', 'gunicorn', '--chdir', BACKEND_DIR,
+        '--bind', f"127.0.0.1:{port}", '--workers', str(workers),
+        '--worker-class', worker_class, '--threads', str(args.threads),
+        '--log-level', 'warning', entry,
+    ]
+    # Server logs go to stderr so stdout stays a clean JSON result
+    process = subprocess.Popen(command, env=env, cwd=BACKEND_DIR, stdout=sys.stderr)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"gunicorn exited with code {process.returncode}")
+        try:
+            if Client(base_url, 1).request('GET', '/healthz')[0] == 200:
+                return process, base_url
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit('gunicorn did not become healthy within 30s')
+
+
+def fetch_pool_stats(base_url, timeout):
+    """One worker's MongoDB pool settings and peak usage, or None if the server does not report them"""
+    try:
+        status, payload, encoding = Client(base_url, timeout).request('GET', '/api/admin/pool')
+    except OSError:
+        return None
+    return _json(payload, encoding) if status == 200 else None
+
+
+def seed_members(base_url, count, pool, seed, timeout):
+    rng = random.Random(seed)
+    client = Client(base_url, timeout)
+    for _ in range(count):
+        status, payload, encoding = client.request('POST', '/api/members', member_payload(rng, pool.next_serial()))
+        if status == 201:
+            pool.add(_json(payload, encoding)['_id'])
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def command_run(args):
+    mix = parse_mix(args.mix)
+    process = proxy = None
+    base_url = args.target
+    if args.network_profile and (args.target or args.store != 'mongod'):
+        raise SystemExit('--network-profile needs --store mongod without --target')
+    try:
+        if not base_url:
+            mongodb_uri = None
+            if args.network_profile:
+                proxy, mongodb_uri = start_network_proxy(args)
+            process, base_url = boot_server(args, mongodb_uri)
+        pool = MemberPool()
+        seed_members(base_url, args.seed_members, pool, args.seed, args.timeout)
+        recorder = Recorder()
+        started = time.perf_counter()
+        if args.rate:
+            run_open_loop(base_url, mix, args.rate, args.concurrency, args.duration, pool, recorder,
+                          args.seed, args.timeout)
+        else:
+            run_closed_loop(base_url, mix, args.concurrency, args.duration, pool, recorder,
+                            args.seed, args.timeout)
+        elapsed = time.perf_counter() - started
+        pool_stats = fetch_pool_stats(base_url, args.timeout)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+        if proxy is not None:
+            proxy.terminate()
+            proxy.wait(10)
+
+    all_samples = [value for values in recorder.samples.values() for value in values]
+    result = {
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'config': {
+            'target': args.target or f"gunicorn ({args.store})",
+            'mode': 'open-loop' if args.rate else 'closed-loop',
+            'rate': args.rate,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'workers': args.workers,
+            'network_profile': args.network_profile,
+            'threads': args.threads,
+            'pool_size': args.pool_size,
+            'mix': dict(mix),
+            'seed_members': args.seed_members,
+            'seed': args.seed,
+        },
+        'elapsed_seconds': round(elapsed, 3),
+        'overall': summarize(all_samples, elapsed, sum(recorder.errors.values())),
+        'operations': {
+            op: summarize(values, elapsed, recorder.errors.get(op, 0), recorder.statuses.get(op))
+            for op, values in sorted(recorder.samples.items())
+        },
+        'pool': pool_stats,
+    }
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    return 0
+
+
+def _delta(base, new):
+    if base in (None, 0) or new is None:
+        return 'n/a'
+    return f"{(new - base) / base * 100:+.1f}%"
+
+
+def command_compare(args):
+    with open(args.baseline) as f:
+        base = json.load(f)
+    with open(args.candidate) as f:
+        new = json.load(f)
+    print(f"baseline {base.get('commit')}  vs  candidate {new.get('commit')}")
+    print(f"{'operation':<10} {'metric':<16} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for op in ['overall'] + sorted(set(base['operations']) | set(new['operations'])):
+        b = base['overall'] if op == 'overall' else base['operations'].get(op, {})
+        n = new['overall'] if op == 'overall' else new['operations'].get(op, {})
+        rows = [('throughput_rps', b.get('throughput_rps'), n.get('throughput_rps'))]
+        for metric in ('p50', 'p99', 'max'):
+            rows.append((f"{metric} ms", b.get('latency_ms', {}).get(metric), n.get('latency_ms', {}).get(metric)))
+        for metric, old_value, new_value in rows:
+            print(f"{op:<10} {metric:<16} {str(old_value):>12} {str(new_value):>12} {_delta(old_value, new_value):>9}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backend HTTP load-test harness')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='Run a load test and write the results as JSON')
+    run.add_argument('--target', help='Base URL of an already running server (skips booting gunicorn)')
+    run.add_argument('--store', choices=['mongomock', 'mongod', 'memory'], default='mongomock',
+                     help='Storage for the booted server (default: mongomock)')
+    run.add_argument('--mongodb-uri', default='mongodb://localhost:27017',
+                     help='MongoDB URI used with --store mongod')
+    run.add_argument('--network-profile', choices=sorted(PROFILES),
+                     help='Route --store mongod traffic through a latency proxy with this profile')
+    run.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    run.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker (gthread when > 1)')
+    run.add_argument('--pool-size', type=int,
+                     help='MongoDB maxPoolSize per worker (default: derived from the worker model)')
+    run.add_argument('--mix', default=DEFAULT_MIX, help=f"Weighted operation mix (default: {DEFAULT_MIX})")
+    run.add_argument('--concurrency', type=int, default=8, help='Client threads')
+    run.add_argument('--rate', type=float, help='Open-loop arrival rate in requests/second')
+    run.add_argument('--duration', type=float, default=10, help='Seconds to run')
+    run.add_argument('--seed-members', type=int, default=200, help='Members created before the run')
+    run.add_argument('--seed', type=int, default=42, help='Random seed for a reproducible mix')
+    run.add_argument('--timeout', type=float, default=30, help='Per-request client timeout in seconds')
+    run.add_argument('--out', help='Write the JSON result to this file')
+    run.set_defaults(func=command_run)
+
+    compare = sub.add_parser('compare', help='Compare two result files')
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+    compare.set_defaults(func=command_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,20 @@
+"""WSGI entry point that runs app.py against an in-process mongomock database.
+
+Used by the load-test harness when no local mongod is available:
+
+    gunicorn --chdir backend perf.mongomock_app:app
+"""
+import os
+
+import mongomock
+import pymongo
+
+# app.py reads MONGODB_URI at import time; any URI works once MongoClient is replaced
+os.environ.setdefault('MONGODB_URI', 'mongodb://mongomock.local:27017')
+os.environ.setdefault('DB_NAME', 'Members')
+os.environ.setdefault('COLLECTION_NAME', 'Members_List')
+pymongo.MongoClient = mongomock.MongoClient
+
+from app import app  # noqa: E402
+
+application = app
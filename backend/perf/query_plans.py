@@ -0,0 +1,235 @@
+"""Explain every endpoint's query shapes and fail on unindexed plans.
+
+Each shape below mirrors a query the API (repository.py) or the member
+tools issue. Shapes run through ``explain()`` against a MongoDB collection.
+A shape fails if its winning plan contains a COLLSCAN, or an in-memory
+SORT stage that sorts more than ``--max-sort-docs`` documents. The live
+indexes are also compared with indexes.MEMBER_INDEXES, so drift between
+app startup, init_db.py and the deployed database is reported.
+
+Examples (run from backend/):
+
+    # Seed a scratch collection with 20000 generated members and check it
+    python -m perf.query_plans --mongodb-uri mongodb://localhost:27017 --seed 20000
+
+    # Check an existing database without writing to it
+    python -m perf.query_plans --mongodb-uri "$MONGODB_URI" --db Members --collection Members_List --json
+"""
+import argparse
+import datetime
+import json
+import sys
+
+from bson import Timestamp
+
+from bulk import BULK_FIELDS, BULK_MAX_MEMBERS
+from indexes import ensure_member_indexes, index_drift
+from repository import (
+    ARCHIVE_BATCH_SIZE, EXPIRING_LIST_LIMIT, EXPIRING_SOON_DAYS, MOBILE_LOOKUP_LIMIT, archive_horizon, normalize_mobile,
+)
+
+# In-memory sorts of up to this many documents are cheap enough to allow
+MAX_SORT_DOCS = 1000
+LIST_PAGE_SIZE = 50
+
+
+def _expiring_filter():
+    today = datetime.date.today()
+    until = today + datetime.timedelta(days=EXPIRING_SOON_DAYS)
+    return {'expiryDate': {'$gte': today.isoformat(), '$lte': until.isoformat()}}
+
+
+def _bulk_find(c, query):
+    # repository.find_members() with a bulk request's filter
+    return c.find(query, dict.fromkeys(BULK_FIELDS, 1)).limit(BULK_MAX_MEMBERS + 1)
+
+
+# name -> (endpoint or caller, cursor factory taking the collection and a sample member)
+QUERY_SHAPES = {
+    'list_page': (
+        'GET /api/members',
+        lambda c, m: c.find().sort('_id', 1).skip(4 * LIST_PAGE_SIZE).limit(LIST_PAGE_SIZE),
+    ),
+    'list_by_status': (
+        'GET /api/members?status=',
+        lambda c, m: c.find({'status': 'expiring'}).sort('_id', 1).skip(LIST_PAGE_SIZE).limit(LIST_PAGE_SIZE),
+    ),
+    'export': (
+        'GET /api/members/export',
+        lambda c, m: c.find().sort('_id', 1).batch_size(500),
+    ),
+    'by_id': (
+        'GET/PUT/DELETE /api/members/<id>',
+        lambda c, m: c.find({'_id': m['_id']}).limit(1),
+    ),
+    'by_mid': (
+        'GET /api/members/by-mid/<mId>',
+        lambda c, m: c.find({'mId': m['mId']}).limit(1),
+    ),
+    'mid_exists': (
+        'HEAD /api/members/by-mid/<mId>',
+        lambda c, m: c.find({'mId': m['mId']}, {'_id': 0, 'mId': 1}).limit(1),
+    ),
+    'by_mobile': (
+        'GET /api/members/by-mobile/<number>',
+        lambda c, m: c.find({'mobileNormalized': normalize_mobile(m['mobile'])}).limit(MOBILE_LOOKUP_LIMIT),
+    ),
+    'name_prefix': (
+        'name search',
+        lambda c, m: c.find({'name': {'$regex': '^' + m['name'].split()[0]}}).sort('name', 1).limit(20),
+    ),
+    'expiring': (
+        'member-reports job (expiring-soon list)',
+        lambda c, m: c.find(_expiring_filter()).sort('expiryDate', 1).limit(EXPIRING_LIST_LIMIT),
+    ),
+    'sweep_expired': (
+        'expiry-sweep job',
+        lambda c, m: c.find({'expiryDate': {'$lt': datetime.date.today().isoformat()}, 'status': {'$ne': 'expired'}}),
+    ),
+    'archive_candidates': (
+        'archive-expired job',
+        lambda c, m: c.find({'expiryDate': {'$lt': archive_horizon(datetime.date.today())}})
+                      .sort('expiryDate', 1).limit(ARCHIVE_BATCH_SIZE),
+    ),
+    'bulk_filter_batch': (
+        'POST /api/members/bulk-update, /renew (filter on batch)',
+        lambda c, m: _bulk_find(c, {'batch': m['batch'], 'trainingType': m['trainingType']}),
+    ),
+    'bulk_filter_status': (
+        'POST /api/members/bulk-update, /renew (filter on status)',
+        lambda c, m: _bulk_find(c, {'status': 'expiring', 'trainingType': m['trainingType']}),
+    ),
+    'bulk_filter_plan_expiry': (
+        'POST /api/members/bulk-update, /renew (filter on planType and expiry)',
+        lambda c, m: _bulk_find(c, {'planType': m['planType'],
+                                    'expiryDate': {'$lt': datetime.date.today().isoformat()}}),
+    ),
+    'changes': (
+        'GET /api/members/changes',
+        lambda c, m: c.find({'updatedAt': {'$gt': m.get('updatedAt', Timestamp(0, 0))}})
+                      .sort('updatedAt', 1).limit(LIST_PAGE_SIZE + 1),
+    ),
+}
+
+
+def _stages(plan):
+    """Yield every stage of a (classic or SBE-wrapped) plan tree"""
+    plan = plan.get('queryPlan', plan)
+    yield plan
+    children = list(plan.get('inputStages', []))
+    if 'inputStage' in plan:
+        children.append(plan['inputStage'])
+    for child in children:
+        yield from _stages(child)
+
+
+def _sort_input(stats):
+    """Number of documents fed to the first blocking SORT stage, if execution stats expose it"""
+    for stage in _stages(stats.get('executionStages', {})):
+        if stage.get('stage') == 'SORT' and 'inputStage' in stage:
+            return stage['inputStage'].get('nReturned')
+    return None
+
+
+def analyze(explain, max_sort_docs=MAX_SORT_DOCS):
+    """Summarize an explain() result and list the reasons it is unacceptable"""
+    winning = explain['queryPlanner']['winningPlan']
+    stats = explain.get('executionStats', {})
+    stages = [stage.get('stage') for stage in _stages(winning)]
+    indexes = sorted({stage['indexName'] for stage in _stages(winning) if 'indexName' in stage})
+    docs_examined = stats.get('totalDocsExamined', 0)
+    returned = stats.get('nReturned', 0)
+    report = {
+        'stages': stages,
+        'indexes': indexes,
+        'nReturned': returned,
+        'totalKeysExamined': stats.get('totalKeysExamined', 0),
+        'totalDocsExamined': docs_examined,
+        'docsExaminedPerReturned': round(docs_examined / returned, 2) if returned else None,
+        'executionTimeMillis': stats.get('executionTimeMillis'),
+        'problems': [],
+    }
+    if 'COLLSCAN' in stages:
+        report['problems'].append('COLLSCAN: no index serves this query')
+    if 'SORT' in stages:
+        sorted_docs = _sort_input(stats)
+        if sorted_docs is None:
+            sorted_docs = max(docs_examined, report['totalKeysExamined'])
+        if sorted_docs > max_sort_docs:
+            report['problems'].append(f"in-memory SORT of {sorted_docs} documents (limit {max_sort_docs})")
+    return report
+
+
+def explain_shapes(collection, max_sort_docs=MAX_SORT_DOCS, shapes=None):
+    """Explain each shape against the collection; returns {name: report}"""
+    sample = collection.find_one(sort=[('_id', -1)])
+    if sample is None:
+        raise ValueError(f"{collection.full_name} is empty; seed it first")
+    reports = {}
+    for name in shapes or QUERY_SHAPES:
+        endpoint, build = QUERY_SHAPES[name]
+        report = analyze(build(collection, sample).explain(), max_sort_docs)
+        report['endpoint'] = endpoint
+        reports[name] = report
+    return reports
+
+
+def seed_collection(collection, count, seed=42):
+    from perf.generate_members import MemberGenerator, load_into_mongo
+    collection.drop()
+    ensure_member_indexes(collection)
+    generator = MemberGenerator(seed=seed, mid_width=max(3, len(str(count))))
+    return load_into_mongo(collection, generator.members(count))
+
+
+def print_reports(reports, drift):
+    print(f"{'shape':<12} {'plan':<34} {'returned':>9} {'keys':>9} {'docs':>9} {'docs/ret':>9}  status")
+    for name, report in reports.items():
+        plan = ' > '.join(report['stages'])
+        ratio = report['docsExaminedPerReturned']
+        status = 'FAIL: ' + '; '.join(report['problems']) if report['problems'] else 'ok'
+        print(f"{name:<12} {plan[:34]:<34} {report['nReturned']:>9} {report['totalKeysExamined']:>9} "
+              f"{report['totalDocsExamined']:>9} {'-' if ratio is None else ratio:>9}  {status}")
+    missing, unexpected, mismatched = drift
+    if missing or unexpected or mismatched:
+        print(f"Index drift: missing={missing} unexpected={unexpected} mismatched={mismatched}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that every endpoint query uses an index')
+    parser.add_argument('--mongodb-uri', default='mongodb://localhost:27017', help='MongoDB to explain against')
+    parser.add_argument('--db', default='gym_query_plans', help='Database (default: gym_query_plans)')
+    parser.add_argument('--collection', default='members', help='Collection (default: members)')
+    parser.add_argument('--seed', type=int, metavar='COUNT',
+                        help='Drop the collection and seed it with COUNT generated members first')
+    parser.add_argument('--max-sort-docs', type=int, default=MAX_SORT_DOCS,
+                        help=f"Largest allowed in-memory sort (default: {MAX_SORT_DOCS})")
+    parser.add_argument('--json', action='store_true', help='Print the reports as JSON')
+    args = parser.parse_args(argv)
+
+    from pymongo import MongoClient
+    client = MongoClient(args.mongodb_uri, serverSelectionTimeoutMS=5000)
+    collection = client[args.db][args.collection]
+    try:
+        if args.seed:
+            seed_collection(collection, args.seed)
+        reports = explain_shapes(collection, args.max_sort_docs)
+        drift = index_drift(collection)
+    finally:
+        client.close()
+
+    if args.json:
+        missing, unexpected, mismatched = drift
+        print(json.dumps({'shapes': reports, 'index_drift': {
+            'missing': missing, 'unexpected': unexpected, 'mismatched': mismatched,
+        }}, indent=2))
+    else:
+        print_reports(reports, drift)
+    # Extra indexes are allowed; missing or differently-defined ones are not
+    missing, _, mismatched = drift
+    failed = any(report['problems'] for report in reports.values()) or missing or mismatched
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
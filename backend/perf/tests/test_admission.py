@@ -0,0 +1,56 @@
+"""Admission control: per-client buckets keyed on the proxy's hop, and priority-aware shedding"""
+from flask import Flask, jsonify
+
+from admission import AdmissionController, InflightLimiter, MemoryBucketStore
+
+
+def _app(max_inflight=4, reserved=1):
+    app = Flask(__name__)
+    controller = AdmissionController(MemoryBucketStore(), InflightLimiter(max_inflight, reserved))
+    app.before_request(controller.admit)
+    app.teardown_request(controller.release)
+
+    @app.route('/api/members/<member_id>', methods=['GET'])
+    def get_member(member_id):
+        return jsonify({'id': member_id})
+
+    @app.route('/api/members', methods=['GET'])
+    def get_members():
+        return jsonify([])
+
+    return app, controller
+
+
+def test_client_key_is_the_proxy_hop():
+    app, controller = _app()
+    with app.test_request_context(headers={'X-Forwarded-For': '1.2.3.4, 203.0.113.7'},
+                                  environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        assert controller.client_key() == '203.0.113.7'
+        assert controller.client_key(trusted_hops=2) == '1.2.3.4'
+        assert controller.client_key(trusted_hops=0) == '10.0.0.1'
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        assert controller.client_key() == '10.0.0.1'
+
+
+def test_forged_first_hops_share_one_bucket():
+    app, controller = _app()
+    client = app.test_client()
+    statuses = [
+        client.get('/api/members', headers={'X-Forwarded-For': f"198.51.100.{i}, 203.0.113.7"}).status_code
+        for i in range(40)
+    ]
+    # The bulk bucket (burst 10) runs out however often the client changes its own header
+    assert statuses.count(200) <= 11
+    assert 429 in statuses
+    assert controller.rate_limited == statuses.count(429)
+
+
+def test_bulk_reads_are_shed_before_point_reads():
+    app, controller = _app(max_inflight=2, reserved=1)
+    with app.test_request_context('/api/members'):
+        assert controller.inflight.try_enter(controller.is_high_priority())
+    with app.test_request_context('/api/members'):
+        # The last slot is reserved for point reads and writes
+        assert not controller.inflight.try_enter(controller.is_high_priority())
+    with app.test_request_context('/api/members/abc'):
+        assert controller.inflight.try_enter(controller.is_high_priority())
@@ -0,0 +1,74 @@
+"""Archival: long-expired members leave the hot collection in batches and come back in one call"""
+import datetime
+
+import mongomock
+
+import repository as repository_module
+from indexes import archive_for, ensure_archive_indexes, ensure_member_indexes, tombstones_for
+from perf.generate_members import MemberGenerator, load_into_mongo
+from repository import MongoMemberRepository, archive_horizon
+from resilience import CircuitBreaker
+
+
+def _repository():
+    collection = mongomock.MongoClient()['gym_archive_tests']['members']
+    ensure_member_indexes(collection)
+    ensure_archive_indexes(archive_for(collection))
+    load_into_mongo(collection, MemberGenerator(seed=11).members(300))
+    return MongoMemberRepository(collection, CircuitBreaker(5, 10), tombstones=tombstones_for(collection))
+
+
+def test_archive_job_moves_only_long_expired_members(monkeypatch):
+    monkeypatch.setattr(repository_module, 'ARCHIVE_BATCH_SIZE', 20)
+    repository = _repository()
+    today = datetime.date.today()
+    horizon = archive_horizon(today)
+    expected = repository.collection.count_documents({'expiryDate': {'$lt': horizon}})
+    assert expected > 20
+
+    assert repository.archive_expired(today) == expected
+    assert repository.archive_expired(today) == 0
+    assert repository.collection.count_documents({'expiryDate': {'$lt': horizon}}) == 0
+    assert repository.collection.count_documents({}) + repository.archive.count_documents({}) == 300
+    # Syncing clients see archived members as deletions
+    assert repository.tombstones.count_documents({}) == expected
+    assert repository.build_report(today)['stats']['archivedMembers'] == expected
+
+
+def test_member_edited_during_archival_stays_live():
+    repository = _repository()
+    members = list(repository.collection.find().limit(2))
+    edited = members[0]
+    repository.collection.update_one({'_id': edited['_id']}, {'$set': {'batch': 'Evening(5PM-10PM)'},
+                                                               '$currentDate': {'updatedAt': {'$type': 'timestamp'}}})
+    assert repository._archive(members) == 1
+    assert repository.collection.find_one({'_id': edited['_id']}) is not None
+    assert repository.archive.find_one({'_id': edited['_id']}) is None
+    assert repository.archive.find_one({'_id': members[1]['_id']}) is not None
+
+
+def test_restore_brings_a_member_back():
+    repository = _repository()
+    member = repository.collection.find_one()
+    member_id = str(member['_id'])
+    assert repository.archive_member(member_id)
+    assert repository.get_member(member_id) is None
+    assert repository.get_archived_member_by_mid(member['mId'])['_id'] == member['_id']
+
+    restored = repository.restore_member(member_id)
+    assert restored['mId'] == member['mId']
+    assert repository.get_member(member_id)['name'] == member['name']
+    assert repository.get_archived_member(member_id) is None
+    assert repository.tombstones.find_one({'_id': member['_id']}) is None
+    assert repository.restore_member(member_id) is None
+
+
+def test_archived_member_ids_stay_reserved():
+    repository = _repository()
+    highest = max(repository.collection.find({'mId': {'$regex': '^[0-9]+$'}}), key=lambda m: int(m['mId']))
+    assert repository.archive_member(str(highest['_id']))
+
+    # Neither the availability check nor a freshly seeded counter offers the archived member's ID
+    assert repository.mid_exists(highest['mId'])
+    assert int(repository.next_member_id()) > int(highest['mId'])
+    assert repository.restore_member(str(highest['_id'])) is not None
@@ -0,0 +1,12 @@
+"""Bulk targets: every filter is answered from an index"""
+import pytest
+
+from bulk import BulkRequestError, BulkTarget
+
+
+def test_filter_needs_an_indexed_key():
+    with pytest.raises(BulkRequestError, match='must include one of'):
+        BulkTarget({'filter': {'trainingType': 'Cardio'}})
+    target = BulkTarget({'filter': {'trainingType': 'Cardio', 'batch': 'Morning'}})
+    assert target.filter == {'batch': 'Morning', 'trainingType': 'Cardio'}
+    assert BulkTarget({'filter': {'expiryBefore': '2024-06-01'}}).filter == {'expiryDate': {'$lt': '2024-06-01'}}
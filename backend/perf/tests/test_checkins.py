@@ -0,0 +1,214 @@
+"""Group commit for check-ins: a burst costs a few batch writes, not one per scan"""
+import datetime
+import subprocess
+import sys
+import threading
+import time
+
+import mongomock
+import pytest
+from pymongo.errors import AutoReconnect, ExecutionTimeout
+
+import checkins as checkins_module
+from checkins import (
+    CHECKIN_HISTORY_LIMIT, CHECKINS_RETENTION_DAYS, LOCAL_TZ, CheckinLog, CheckinRecorder, LocalCheckinStore,
+    MongoCheckinStore, new_checkin,
+)
+from resilience import CircuitBreaker, CircuitOpenError
+
+BURST = 200
+
+
+class GatedStore(MongoCheckinStore):
+    """Holds the first write until released, so the rest of the burst queues behind it"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.release = threading.Event()
+        self.batches = []
+        self.failing = False
+
+    def write(self, checkins):
+        self.release.wait(5)
+        if self.failing:
+            raise AutoReconnect('primary unreachable')
+        self.batches.append(len(checkins))
+        super().write(checkins)
+
+
+def _store():
+    db = mongomock.MongoClient()['gym_checkin_tests']
+    return GatedStore(db['members_checkins'], db['members_checkin_rollups'])
+
+
+def _members(count):
+    return [{'_id': f"member-{number}", 'mId': f"M{number:03d}", 'batch': ('Morning', 'Evening')[number % 2]}
+            for number in range(count)]
+
+
+def _burst(recorder, members, at):
+    results = [None] * len(members)
+
+    def scan(number):
+        results[number] = recorder.record(new_checkin(members[number], at))
+    threads = [threading.Thread(target=scan, args=(number,)) for number in range(len(members))]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_burst_is_group_committed(tmp_path):
+    store = _store()
+    recorder = CheckinRecorder(store, fallback=CheckinLog(str(tmp_path / 'checkins.ndjson'))).start()
+    at = datetime.datetime(2024, 5, 6, 1, 30, tzinfo=datetime.timezone.utc)  # 07:00 in Asia/Kolkata
+    threads, results = _burst(recorder, _members(BURST), at)
+    store.release.set()
+    for thread in threads:
+        thread.join()
+    recorder.stop()
+
+    assert sum(store.batches) == BURST
+    assert len(store.batches) <= 5
+    assert set(results) <= {'mongodb', None}
+    assert store.checkins.count_documents({}) == BURST
+
+    day = store.occupancy(datetime.date(2024, 5, 6), datetime.date(2024, 5, 6))[0]
+    assert day['total'] == BURST
+    assert day['batches']['Morning']['hourly'][7] == BURST // 2
+
+
+def test_unreachable_store_falls_back_to_log_and_replays(tmp_path):
+    store = _store()
+    store.failing = True
+    store.release.set()
+    log = CheckinLog(str(tmp_path / 'checkins.ndjson'))
+    recorder = CheckinRecorder(store, fallback=log, breaker=CircuitBreaker(100, 1)).start()
+    members = _members(3)
+    assert recorder.record(new_checkin(members[0])) == 'fallback'
+    assert len(list(log.read())) == 1
+
+    store.failing = False
+    assert recorder.record(new_checkin(members[1])) == 'mongodb'
+    recorder.stop()
+    # The logged check-in was replayed after the first successful batch
+    assert store.checkins.count_documents({}) == 2
+    assert recorder.stats()['replayed'] == 1
+
+
+def test_local_log_is_compacted_past_retention(tmp_path):
+    log = CheckinLog(str(tmp_path / 'checkins.ndjson'))
+    member = _members(1)[0]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    old = now - datetime.timedelta(days=CHECKINS_RETENTION_DAYS + 30)
+    log.append([new_checkin(member, old + datetime.timedelta(minutes=n)) for n in range(5)])
+    count = CHECKIN_HISTORY_LIMIT + 10
+    log.append([new_checkin(member, now - datetime.timedelta(minutes=n)) for n in reversed(range(count))])
+
+    store = LocalCheckinStore(log)
+    # The expired check-ins are gone from the log but still counted in occupancy
+    assert len(list(log.read())) == count
+    old_day = old.astimezone(LOCAL_TZ).date()
+    assert sum(day['total'] for day in store.occupancy(old_day, old_day + datetime.timedelta(days=1))) == 5
+    assert sum(day['total'] for day in LocalCheckinStore(log).occupancy(
+        old_day, old_day + datetime.timedelta(days=1))) == 5
+
+    recent = store.member_checkins(member['_id'], count)
+    assert len(recent) == CHECKIN_HISTORY_LIMIT
+    assert recent[0]['ts'] == now
+
+
+def test_ticket_spanning_batches_reports_the_worst_outcome(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkins_module, 'CHECKINS_BATCH_SIZE', 2)
+    store = _store()
+    failing_writes = {2}
+    write = store.write
+
+    def write_with_failure(checkins):
+        store.writes = getattr(store, 'writes', 0) + 1
+        store.failing = store.writes in failing_writes
+        write(checkins)
+    store.write = write_with_failure
+
+    recorder = CheckinRecorder(store, fallback=CheckinLog(str(tmp_path / 'checkins.ndjson')),
+                               breaker=CircuitBreaker(100, 1)).start()
+    members = _members(6)
+    # Holds the writer on the first batch while the next five check-ins queue as one ticket
+    recorder.record(new_checkin(members[0]), wait=False)
+    threads, results = _burst(recorder, members[1:], None)
+    while recorder.stats()['queued'] < 5:
+        time.sleep(0.01)
+    store.release.set()
+    for thread in threads:
+        thread.join()
+    recorder.stop()
+
+    # Their second batch failed over to the log, so none of them is told it reached MongoDB
+    assert results == ['fallback'] * 5
+
+
+def test_commit_timeout_on_a_multi_batch_ticket_answers_queued(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkins_module, 'CHECKINS_BATCH_SIZE', 2)
+    monkeypatch.setattr(checkins_module, 'CHECKINS_COMMIT_TIMEOUT_SECONDS', 0.5)
+    store = _store()
+    write = store.write
+
+    def slow_third_write(checkins):
+        store.writes = getattr(store, 'writes', 0) + 1
+        if store.writes == 3:
+            time.sleep(1.0)
+        write(checkins)
+    store.write = slow_third_write
+
+    recorder = CheckinRecorder(store, fallback=CheckinLog(str(tmp_path / 'checkins.ndjson'))).start()
+    members = _members(6)
+    recorder.record(new_checkin(members[0]), wait=False)
+    threads, results = _burst(recorder, members[1:], None)
+    while recorder.stats()['queued'] < 5:
+        time.sleep(0.01)
+    store.release.set()
+    for thread in threads:
+        thread.join()
+    written = store.checkins.count_documents({})
+    recorder.stop()
+
+    # The ticket's first batch had committed, but not the rest of it
+    assert written < 6
+    assert results == [None] * 5
+    assert store.checkins.count_documents({}) == 6
+
+
+def test_orphaned_replay_is_claimed_and_not_double_counted(tmp_path):
+    store = _store()
+    store.release.set()
+    at = datetime.datetime(2024, 5, 6, 1, 30, tzinfo=datetime.timezone.utc)
+    logged = [new_checkin(member, at + datetime.timedelta(seconds=n)) for n, member in enumerate(_members(5))]
+    # A worker that died mid-replay: part of its backlog reached MongoDB, its replay file was left behind
+    store.write([dict(checkin) for checkin in logged[:3]])
+    finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+    finished.wait()
+    path = str(tmp_path / 'checkins.ndjson')
+    CheckinLog(f"{path}.replay-{finished.pid}").append(logged)
+
+    recorder = CheckinRecorder(store, fallback=CheckinLog(path)).start()
+    assert recorder.record(new_checkin(_members(6)[5], at)) == 'mongodb'
+    recorder.stop()
+
+    assert store.checkins.count_documents({}) == 6
+    assert store.occupancy(datetime.date(2024, 5, 6), datetime.date(2024, 5, 6))[0]['total'] == 6
+    assert recorder.stats()['replayed'] == 2
+    assert not list(tmp_path.glob('checkins.ndjson.replay-*'))
+
+
+def test_reads_go_through_the_breaker_and_deadline(monkeypatch):
+    db = mongomock.MongoClient()['gym_checkin_tests']
+    breaker = CircuitBreaker(1, 60)
+    store = MongoCheckinStore(db['members_checkins'], db['members_checkin_rollups'], breaker=breaker)
+    store.write([new_checkin(_members(1)[0])])
+    assert len(store.member_checkins('member-0', 5)) == 1
+
+    monkeypatch.setattr('resilience.remaining_seconds', lambda: 0.0)
+    with pytest.raises(ExecutionTimeout):
+        store.member_checkins('member-0', 5)
+    # The breaker opened, so occupancy fails fast too
+    with pytest.raises(CircuitOpenError):
+        store.occupancy(datetime.date(2024, 5, 6), datetime.date(2024, 5, 6))
@@ -0,0 +1,85 @@
+"""Response compression: negotiated, cached for whole bodies, batched flushes for streams"""
+import csv
+import gzip
+import io
+import zlib
+
+import pytest
+from flask import Flask, Response, jsonify
+
+from compression import COMPRESSION_MIN_SIZE, choose_encoding, init_compression, stream_compress
+from perf.generate_members import MemberGenerator
+
+
+def _csv_rows(count):
+    rows = []
+    for member in MemberGenerator(seed=1).members(count):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(list(member.values()))
+        rows.append(buffer.getvalue())
+    return rows
+
+
+def _app(rows):
+    app = Flask(__name__)
+    init_compression(app)
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/page')
+    def page():
+        return jsonify(rows)
+
+    @app.route('/export')
+    def export():
+        return Response(iter(rows), mimetype='text/csv')
+
+    return app
+
+
+def test_encoding_negotiation():
+    assert choose_encoding('') is None
+    assert choose_encoding('identity') is None
+    assert choose_encoding('gzip;q=0, deflate') is None
+    assert choose_encoding('deflate, gzip;q=0.5') == 'gzip'
+    assert choose_encoding('*') == 'gzip'
+
+
+def test_streamed_gzip_round_trips_with_batched_flushes():
+    rows = _csv_rows(3000)
+    parts = list(stream_compress(iter(rows), 'gzip', flush_bytes=32 * 1024))
+    assert zlib.decompress(b''.join(parts), 31).decode('utf-8') == ''.join(rows)
+    # The first row is flushed at once; the rest go out in a few large blocks
+    assert zlib.decompressobj(31).decompress(parts[0]).decode('utf-8') == rows[0]
+    assert len(parts) < len(rows) / 10
+
+    per_row = b''.join(stream_compress(iter(rows), 'gzip', flush_bytes=1))
+    assert len(b''.join(parts)) < len(per_row) * 0.8
+
+
+def test_after_request_compression():
+    rows = _csv_rows(200)
+    client = _app(rows).test_client()
+    headers = {'Accept-Encoding': 'gzip'}
+
+    small = client.get('/small', headers=headers)
+    assert len(small.get_data()) < COMPRESSION_MIN_SIZE
+    assert 'Content-Encoding' not in small.headers
+    assert small.headers['Vary'] == 'Accept-Encoding'
+
+    page = client.get('/page', headers=headers)
+    assert page.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(page.get_data()) == _app(rows).test_client().get('/page').get_data()
+
+    export = client.get('/export', headers=headers)
+    assert export.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in export.headers
+    assert gzip.decompress(export.get_data()).decode('utf-8') == ''.join(rows)
+
+
+def test_streamed_brotli_round_trips():
+    brotli = pytest.importorskip('brotli')
+    rows = _csv_rows(500)
+    assert brotli.decompress(b''.join(stream_compress(iter(rows), 'br'))).decode('utf-8') == ''.join(rows)
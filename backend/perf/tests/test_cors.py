@@ -0,0 +1,49 @@
+"""CORS: preflights answered before the view, wildcard origins, denied origins get no grant"""
+from app import app, cors_policy
+from consistency import CAUSAL_TOKEN_HEADER
+from cors_policy import CorsPolicy
+from tenants import TENANT_HEADER
+
+
+def test_preflight_response_headers():
+    response = app.test_client().options('/api/members', headers={
+        'Origin': 'https://efcgym.vercel.app',
+        'Access-Control-Request-Method': 'PATCH',
+        'Access-Control-Request-Headers': f"content-type, {TENANT_HEADER}",
+    })
+    assert response.status_code == 204
+    assert response.headers['Access-Control-Allow-Origin'] == 'https://efcgym.vercel.app'
+    assert response.headers['Access-Control-Allow-Credentials'] == 'true'
+    assert 'PATCH' in response.headers['Access-Control-Allow-Methods']
+    allowed = response.headers['Access-Control-Allow-Headers']
+    assert TENANT_HEADER in allowed and CAUSAL_TOKEN_HEADER in allowed
+    assert response.headers['Access-Control-Max-Age'] == str(86400)
+    assert response.headers['Vary'] == 'Origin'
+
+
+def test_simple_request_exposes_the_causal_token():
+    response = app.test_client().get('/healthz', headers={'Origin': 'https://preview-42.vercel.app'})
+    assert response.headers['Access-Control-Allow-Origin'] == 'https://preview-42.vercel.app'
+    assert response.headers['Access-Control-Expose-Headers'] == CAUSAL_TOKEN_HEADER
+    assert 'Access-Control-Allow-Methods' not in response.headers
+
+
+def test_denied_origin_gets_no_grant():
+    client = app.test_client()
+    for origin in ('https://evil.example', 'https://vercel.app.evil.example', 'https://a.vercel.app/x'):
+        preflight = client.options('/api/members', headers={'Origin': origin,
+                                                            'Access-Control-Request-Method': 'DELETE'})
+        assert preflight.status_code == 204
+        assert 'Access-Control-Allow-Origin' not in preflight.headers
+        response = client.get('/healthz', headers={'Origin': origin})
+        assert 'Access-Control-Allow-Origin' not in response.headers
+        assert 'Origin' in response.headers['Vary']
+    assert not cors_policy.is_allowed('https://evil.example')
+
+
+def test_decision_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr('cors_policy.MAX_CACHED_ORIGINS', 8)
+    policy = CorsPolicy(['https://*.vercel.app'], methods=['GET'], allow_headers=['Content-Type'])
+    for number in range(20):
+        policy.decision(f"https://preview-{number}.vercel.app")
+    assert len(policy._decisions) <= 8
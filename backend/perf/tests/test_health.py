@@ -0,0 +1,73 @@
+"""Readiness: answered from the background prober's last results, never from a live ping"""
+from types import SimpleNamespace
+
+from pymongo.errors import ServerSelectionTimeoutError
+
+import app as app_module
+from health import DependencyProber
+
+
+class FlakyClient:
+    """Counts pings and fails them while `down` is set"""
+
+    def __init__(self):
+        self.down = False
+        self.pings = 0
+        self.admin = SimpleNamespace(command=self._command)
+
+    def _command(self, name):
+        self.pings += 1
+        if self.down:
+            raise ServerSelectionTimeoutError('no servers')
+        return {'ok': 1}
+
+
+def test_prober_tracks_failures_and_round_trips():
+    client = FlakyClient()
+    prober = DependencyProber(client, window=3)
+    for _ in range(5):
+        assert prober.probe()
+    snapshot = prober.snapshot()
+    assert snapshot['reachable'] and snapshot['rtt_ms']['samples'] == 3
+
+    client.down = True
+    assert not prober.probe() and not prober.probe()
+    assert not prober.healthy
+    assert prober.snapshot()['consecutive_failures'] == 2
+    assert 'no servers' in prober.snapshot()['last_error']
+
+    client.down = False
+    prober.probe()
+    assert prober.healthy
+
+
+def test_readiness_is_served_from_the_prober(monkeypatch):
+    client = FlakyClient()
+    prober = DependencyProber(client)
+    prober.probe()
+    monkeypatch.setattr(app_module, 'mongo_prober', prober)
+    http = app_module.app.test_client()
+
+    ready = http.get('/readyz')
+    assert ready.status_code == 200 and ready.get_json()['status'] == 'ok'
+    assert ready.headers['Cache-Control'].startswith('no-cache')
+
+    client.down = True
+    prober.probe()
+    pings = client.pings
+    degraded = http.get('/readyz')
+    assert degraded.status_code == 200
+    assert degraded.get_json()['reasons'] == ['mongodb ping failing']
+    # The request itself never pinged
+    assert client.pings == pings
+
+    monkeypatch.setattr(app_module, 'READINESS_FAIL_ON_DEGRADED', True)
+    assert http.get('/readyz').status_code == 503
+    assert http.get('/healthz').status_code == 200
+
+
+def test_in_memory_storage_is_degraded(monkeypatch):
+    monkeypatch.setattr(app_module, 'mongo_prober', None)
+    body = app_module.app.test_client().get('/readyz').get_json()
+    assert body['status'] == 'degraded'
+    assert body['reasons'] == ['using in-memory storage']
@@ -0,0 +1,84 @@
+"""Background jobs: one worker per scheduled run, and the expiry sweep's writes"""
+import datetime
+
+import mongomock
+
+from indexes import ensure_member_indexes, leases_for
+from jobs import Job, MongoLeaseStore, Scheduler, daily_at, every
+from metrics import MetricsRegistry
+from perf.generate_members import MemberGenerator, load_into_mongo
+from repository import MongoMemberRepository, member_status
+from resilience import CircuitBreaker
+
+UTC = datetime.timezone.utc
+
+
+def _leases():
+    return leases_for(mongomock.MongoClient()['gym_job_tests']['members'])
+
+
+def test_each_run_happens_on_one_worker():
+    collection = _leases()
+    workers = [MongoLeaseStore(collection, owner=f"worker-{number}") for number in range(4)]
+    due_since = datetime.datetime.now(UTC) - datetime.timedelta(minutes=1)
+    assert [worker.acquire('expiry-sweep', due_since) for worker in workers] == [True, False, False, False]
+
+    workers[0].release('expiry-sweep', True, 0.5, 10)
+    # Already ran since it became due
+    assert not any(worker.acquire('expiry-sweep', due_since) for worker in workers)
+    # Due again the next day
+    assert workers[2].acquire('expiry-sweep', datetime.datetime.now(UTC) + datetime.timedelta(seconds=1))
+
+
+def test_failed_run_is_retried_later():
+    collection = _leases()
+    worker = MongoLeaseStore(collection, owner='worker-1')
+    due_since = datetime.datetime.now(UTC)
+    assert worker.acquire('member-reports', due_since)
+    worker.release('member-reports', False, 0.1, error='timed out')
+    assert not MongoLeaseStore(collection, owner='worker-2').acquire('member-reports', due_since)
+    assert collection.find_one({'_id': 'member-reports'})['lastError'] == 'timed out'
+
+
+def test_scheduler_records_run_metrics():
+    metrics = MetricsRegistry()
+    scheduler = Scheduler(MongoLeaseStore(_leases()), metrics)
+    scheduler.add(Job('ok', lambda: 3, every(60))).add(Job('broken', lambda: 1 / 0, every(60)))
+    assert scheduler.run_pending() == ['ok', 'broken']
+    assert scheduler.run_pending() == []
+    text = metrics.render()
+    assert 'gym_job_runs_total{job="ok",outcome="success"} 1' in text
+    assert 'gym_job_runs_total{job="broken",outcome="failure"} 1' in text
+    assert 'gym_job_last_processed_items{job="ok"} 3' in text
+
+
+def test_daily_schedule_is_the_last_slot_in_local_time():
+    ist = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+    schedule = daily_at('02:00', ist)
+    before = datetime.datetime(2024, 5, 6, 20, 0, tzinfo=UTC)  # 01:30 on the 7th in IST
+    after = datetime.datetime(2024, 5, 6, 21, 0, tzinfo=UTC)   # 02:30 on the 7th in IST
+    assert schedule(before) == datetime.datetime(2024, 5, 5, 20, 30, tzinfo=UTC)
+    assert schedule(after) == datetime.datetime(2024, 5, 6, 20, 30, tzinfo=UTC)
+
+
+def test_expiry_sweep_only_touches_members_whose_status_changes():
+    collection = mongomock.MongoClient()['gym_job_tests']['members']
+    ensure_member_indexes(collection)
+    load_into_mongo(collection, MemberGenerator(seed=9).members(200))
+    repository = MongoMemberRepository(collection, CircuitBreaker(5, 10))
+    today = datetime.date.today()
+
+    assert repository.sweep_statuses(today) == 200
+    assert repository.sweep_statuses(today) == 0
+    for member in collection.find():
+        assert member['status'] == member_status(member['expiryDate'], today)
+
+    later = today + datetime.timedelta(days=30)
+    changed = repository.sweep_statuses(later)
+    assert changed == sum(member_status(m['expiryDate'], today) != member_status(m['expiryDate'], later)
+                          for m in collection.find())
+
+    report = repository.build_report(later)
+    repository.save_report(report)
+    assert repository.get_report()['stats']['totalMembers'] == 200
+    assert report['expiringTotal'] == collection.count_documents({'status': 'expiring'})
@@ -0,0 +1,68 @@
+"""Structured logging: PII redacted, formatting off the request thread, sampled access logs"""
+import json
+import logging
+import queue
+
+from flask import Flask
+
+import log_config
+from log_config import DeferredQueueHandler, JsonFormatter, RequestContextFilter, SamplingFilter, redact
+
+
+def _record(msg='Request handled', level=logging.INFO, **extra):
+    record = logging.LogRecord('gym', level, __file__, 1, msg, (), None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_redact_hides_pii_and_truncates():
+    member = {'name': 'Asha', 'mobile': '9876543210', 'address': '12 MG Road', 'profilePicture': 'A' * 5000,
+              'paymentDetails': 'x' * 500, 'history': list(range(25))}
+    redacted = redact(member)
+    assert redacted['name'] == 'Asha'
+    assert redacted['mobile'] == '******3210'
+    assert redacted['address'] == '<redacted 10 chars>'
+    assert redacted['profilePicture'] == '<redacted 5000 chars>'
+    assert redacted['paymentDetails'].endswith('...<+300 chars>')
+    assert redacted['history'][-1] == '<+5 items>'
+    # The logged value is a copy
+    assert member['mobile'] == '9876543210'
+
+
+def test_json_lines_carry_extras_and_request_id():
+    app = Flask(__name__)
+    with app.test_request_context():
+        log_config.assign_request_id()
+        record = _record(member={'mobile': '9876543210'}, status=201)
+        RequestContextFilter().filter(record)
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['msg'] == 'Request handled' and entry['level'] == 'INFO'
+    assert entry['status'] == 201
+    assert entry['member'] == {'mobile': '******3210'}
+    assert len(entry['request_id']) == 16
+
+
+def test_queue_handler_defers_formatting_and_never_blocks():
+    handler = DeferredQueueHandler(queue.Queue(1))
+    extra = {'rows': 3}
+    record = _record(detail=extra)
+    handler.emit(record)
+    extra['rows'] = 4
+    queued = handler.queue.get_nowait()
+    # Not formatted on the calling thread, and snapshotted against later mutation
+    assert queued.detail == {'rows': 3}
+    assert not hasattr(queued, 'message')
+
+    dropped = DeferredQueueHandler.dropped
+    handler.emit(_record())
+    handler.emit(_record())
+    assert DeferredQueueHandler.dropped == dropped + 1
+
+
+def test_sampled_records(monkeypatch):
+    monkeypatch.setitem(log_config.LOG_SAMPLE_RATES, logging.INFO, 0.0)
+    sampler = SamplingFilter()
+    assert not sampler.filter(_record(sample=True))
+    assert sampler.filter(_record(sample=False))
+    assert sampler.filter(_record(level=logging.WARNING, sample=True))
@@ -0,0 +1,73 @@
+"""The compiled member schema: one pass, every error collected, one batch write per import"""
+import mongomock
+import pytest
+from pymongo.errors import NetworkTimeout
+
+import app as app_module
+
+from indexes import ensure_member_indexes
+from member_schema import MEMBER_SCHEMA, MemberValidationError, member_validator
+from perf.generate_members import MemberGenerator
+from repository import MongoMemberRepository
+from resilience import CircuitBreaker
+
+
+def test_every_bad_field_is_reported_at_once():
+    member = MemberGenerator(seed=1).member(1)
+    del member['name']
+    member.update(totalAmount='lots', expiryDate='2024-02-30', purchaseDate='5/1/2024', mId=42)
+    with pytest.raises(MemberValidationError) as error:
+        member_validator.validate(member)
+    assert error.value.errors == {'name': 'is required', 'purchaseDate': 'must be a YYYY-MM-DD date',
+                                  'expiryDate': 'is not a valid date', 'totalAmount': 'must be a number'}
+    assert str(error.value).startswith("Missing required fields: ['name']")
+
+
+def test_coercion_and_partial_updates():
+    member = member_validator.validate(dict(MemberGenerator(seed=1).member(1), mId=42, amountPaid='500'))
+    assert member['mId'] == '42' and member['amountPaid'] == 500.0
+    assert member_validator.validate({'batch': 'Evening(5PM-10PM)'}, partial=True) == {'batch': 'Evening(5PM-10PM)'}
+    with pytest.raises(MemberValidationError):
+        member_validator.validate({'name': None}, partial=True)
+
+
+def test_json_schema_matches_the_validator():
+    schema = member_validator.json_schema()
+    assert set(schema['required']) == {name for name, field in MEMBER_SCHEMA.items() if field.required}
+    assert set(schema['properties']) == set(MEMBER_SCHEMA)
+
+
+def test_import_reports_taken_member_ids():
+    collection = mongomock.MongoClient()['gym_schema_tests']['members']
+    ensure_member_indexes(collection)
+    repository = MongoMemberRepository(collection, CircuitBreaker(5, 10))
+    members = [member_validator.validate(row) for row in MemberGenerator(seed=2).members(4)]
+    repository.insert_member(dict(members[1]))
+    ids = repository.insert_members(members)
+    assert ids[1] is None and all(ids[index] for index in (0, 2, 3))
+    assert collection.count_documents({}) == 4
+
+
+def test_import_timeout_keeps_the_chunks_already_written(monkeypatch):
+    collection = mongomock.MongoClient()['gym_schema_tests']['import_chunks']
+    ensure_member_indexes(collection)
+
+    class TimingOutRepository(MongoMemberRepository):
+        chunks = 0
+
+        def insert_members(self, members):
+            self.chunks += 1
+            if self.chunks == 2:
+                raise NetworkTimeout('timed out')
+            return super().insert_members(members)
+
+    monkeypatch.setattr(app_module, 'members_repository', TimingOutRepository(collection, CircuitBreaker(5, 10)))
+    monkeypatch.setattr(app_module, 'IMPORT_CHUNK_SIZE', 2)
+    rows = list(MemberGenerator(seed=8, mid_prefix='CH').members(5))
+    response = app_module.app.test_client().post('/api/members/import', json=rows)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['imported'] == 2 and body['complete'] is False
+    assert [result['result'] for result in body['results']] == ['imported'] * 2 + ['unknown'] * 2 + ['not_imported']
+    assert collection.count_documents({}) == 2
@@ -0,0 +1,74 @@
+"""MongoDB pool: sizing from the worker model and the CMAP listener's accounting"""
+from types import SimpleNamespace
+
+from pymongo import MongoClient
+
+from metrics import MetricsRegistry
+from pool import MONGO_POOL_BACKGROUND, PoolMonitor, pool_settings, request_concurrency
+
+ADDRESS = ('db.example', 27017)
+
+
+def event(reason=None):
+    return SimpleNamespace(address=ADDRESS, connection_id=1, reason=reason)
+
+
+def test_pool_size_follows_the_worker_model():
+    assert request_concurrency('sync', threads=1) == 1
+    # gunicorn switches a sync worker with threads to gthread
+    assert request_concurrency('sync', threads=8) == 8
+    assert request_concurrency('gthread', threads=32) == 32
+    assert request_concurrency('gevent', connections=1000) == 100
+    assert request_concurrency('gevent', connections=50) == 50
+
+    settings = pool_settings('gthread', threads=32)
+    assert settings['maxPoolSize'] == 32 + MONGO_POOL_BACKGROUND
+    assert settings['minPoolSize'] == 0
+    assert pool_settings('sync', threads=1)['maxPoolSize'] == 1 + MONGO_POOL_BACKGROUND
+
+
+def test_env_overrides_the_derived_size(monkeypatch):
+    monkeypatch.setenv('MONGO_MAX_POOL_SIZE', '12')
+    monkeypatch.setenv('MONGO_MIN_POOL_SIZE', '2')
+    settings = pool_settings('gthread', threads=32)
+    assert (settings['maxPoolSize'], settings['minPoolSize']) == (12, 2)
+
+
+def test_monitor_tracks_checkouts_wait_queue_and_creations():
+    metrics = MetricsRegistry()
+    monitor = PoolMonitor(metrics)
+    monitor.pool_created(event())
+    for _ in range(3):
+        monitor.connection_check_out_started(event())
+    monitor.connection_created(event())
+    monitor.connection_created(event())
+    monitor.connection_checked_out(event())
+    monitor.connection_checked_out(event())
+    monitor.connection_check_out_failed(event('timeout'))
+    monitor.connection_checked_in(event())
+    monitor.connection_closed(event('idle'))
+
+    stats = monitor.stats()['db.example:27017']
+    assert stats['open'] == 1
+    assert stats['checked_out'] == 1
+    assert stats['peak_checked_out'] == 2
+    assert stats['wait_queue'] == 0
+    assert stats['peak_wait_queue'] == 3
+    assert stats['created'] == stats['created_last_minute'] == 2
+    assert stats['checkouts'] == 2
+    assert stats['checkout_failures'] == 1
+
+    rendered = metrics.render()
+    assert 'mongo_pool_checked_out{server="db.example:27017"} 1' in rendered
+    assert 'mongo_pool_connections_created_total{server="db.example:27017"} 2' in rendered
+    assert 'mongo_pool_checkout_failures_total{reason="timeout",server="db.example:27017"} 1' in rendered
+
+
+def test_client_accepts_the_settings_and_listener():
+    client = MongoClient('mongodb://localhost:1', connect=False,
+                         event_listeners=[PoolMonitor(MetricsRegistry())], **pool_settings('gthread', threads=8))
+    try:
+        assert client.options.pool_options.max_pool_size == 8 + MONGO_POOL_BACKGROUND
+        assert client.options.pool_options.min_pool_size == 0
+    finally:
+        client.close()
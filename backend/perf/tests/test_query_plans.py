@@ -0,0 +1,108 @@
+"""Index drift and query-plan checks.
+
+The drift and plan-analysis tests run anywhere. The explain tests need a
+real mongod (mongomock has no query planner); point BENCH_MONGODB_URI at
+one to run them, otherwise they are skipped.
+"""
+import ast
+import os
+
+import mongomock
+import pytest
+
+from indexes import MEMBER_INDEXES, ensure_member_indexes, index_drift
+from perf.query_plans import QUERY_SHAPES, analyze, explain_shapes, seed_collection
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BENCH_MONGODB_URI = os.getenv('BENCH_MONGODB_URI')
+# Large enough that an unindexed sort would exceed MAX_SORT_DOCS
+SEED_COUNT = int(os.getenv('QUERY_PLAN_SEED_COUNT', 5000))
+
+
+def _create_index_calls(filename):
+    with open(os.path.join(BACKEND_DIR, filename)) as f:
+        tree = ast.parse(f.read())
+    return [
+        node.func.attr for node in ast.walk(tree)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+        and node.func.attr in ('create_index', 'create_indexes')
+    ]
+
+
+def _calls(filename, function):
+    with open(os.path.join(BACKEND_DIR, filename)) as f:
+        tree = ast.parse(f.read())
+    return [
+        node for node in ast.walk(tree)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == function
+    ]
+
+
+@pytest.mark.parametrize('filename', ['app.py', 'init_db.py'])
+def test_indexes_only_created_from_shared_spec(filename):
+    assert _create_index_calls(filename) == [], f"{filename} creates indexes outside indexes.py"
+    assert _calls(filename, 'ensure_member_indexes'), f"{filename} does not call ensure_member_indexes"
+
+
+def test_ensured_indexes_match_spec():
+    collection = mongomock.MongoClient().db.members
+    names = ensure_member_indexes(collection)
+    assert len(names) == len(MEMBER_INDEXES)
+    assert index_drift(collection) == ([], [], [])
+
+
+def test_drift_detected():
+    collection = mongomock.MongoClient().db.members
+    collection.create_index('mId')  # Not unique
+    collection.create_index('phone')
+    missing, unexpected, mismatched = index_drift(collection)
+    assert missing == ['batch_1_status_1', 'expiryDate_1', 'mobileNormalized_1', 'name_1', 'planType_1_expiryDate_1',
+                       'status_1__id_1', 'updatedAt_1']
+    assert unexpected == ['phone_1']
+    assert mismatched == ['mId_1']
+
+
+def _explain(winning_plan, **stats):
+    return {'queryPlanner': {'winningPlan': winning_plan}, 'executionStats': stats}
+
+
+def test_analyze_flags_collscan():
+    report = analyze(_explain({'stage': 'COLLSCAN'}, nReturned=1, totalDocsExamined=5000))
+    assert report['problems'] and 'COLLSCAN' in report['problems'][0]
+    assert report['docsExaminedPerReturned'] == 5000
+
+
+def test_analyze_flags_large_in_memory_sort():
+    plan = {'stage': 'SORT', 'inputStage': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'mobile_1'}}}
+    stats = {'nReturned': 20, 'totalDocsExamined': 3000, 'totalKeysExamined': 3000,
+             'executionStages': {'stage': 'SORT', 'inputStage': {'stage': 'FETCH', 'nReturned': 3000}}}
+    report = analyze(_explain(plan, **stats), max_sort_docs=1000)
+    assert report['indexes'] == ['mobile_1']
+    assert report['problems'] == ['in-memory SORT of 3000 documents (limit 1000)']
+
+
+def test_analyze_accepts_index_scan():
+    plan = {'queryPlan': {'stage': 'LIMIT', 'inputStage': {
+        'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': '_id_'}}}}
+    report = analyze(_explain(plan, nReturned=50, totalDocsExamined=50, totalKeysExamined=250))
+    assert report['problems'] == []
+    assert report['stages'] == ['LIMIT', 'FETCH', 'IXSCAN']
+
+
+@pytest.fixture(scope='module')
+def seeded_collection():
+    if not BENCH_MONGODB_URI:
+        pytest.skip('BENCH_MONGODB_URI not set; explain() needs a real mongod')
+    from pymongo import MongoClient
+    client = MongoClient(BENCH_MONGODB_URI, serverSelectionTimeoutMS=5000)
+    collection = client['gym_query_plans']['members']
+    seed_collection(collection, SEED_COUNT)
+    yield collection
+    collection.drop()
+    client.close()
+
+
+@pytest.mark.parametrize('shape', sorted(QUERY_SHAPES))
+def test_query_shape_uses_index(seeded_collection, shape):
+    report = explain_shapes(seeded_collection, shapes=[shape])[shape]
+    assert report['problems'] == [], f"{shape} ({report['endpoint']}): {report}"
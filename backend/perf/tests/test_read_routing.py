@@ -0,0 +1,86 @@
+"""Read routing: lists, reports and exports on secondaries; writers still read their own writes.
+
+The mongomock tests check which routes read where. With BENCH_REPLSET_URI
+pointing at a replica set (a local one started with
+``mongod --replSet rs0`` and ``rs.initiate()`` will do), a write and the
+list right after it are checked on the wire.
+"""
+import os
+
+import mongomock
+import pytest
+from pymongo import monitoring
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+import app as app_module
+from consistency import CAUSAL_TOKEN_HEADER, decode_causal_token
+from indexes import ensure_member_indexes
+from perf.generate_members import MemberGenerator
+from repository import MongoMemberRepository
+from resilience import CircuitBreaker
+
+BENCH_REPLSET_URI = os.getenv('BENCH_REPLSET_URI')
+
+
+def _repository(collection):
+    ensure_member_indexes(collection)
+    return MongoMemberRepository(collection, CircuitBreaker(5, 10))
+
+
+def test_routes_choose_their_read_preference():
+    repository = _repository(mongomock.MongoClient()['gym_read_routing']['members'])
+    with app_module.app.test_request_context('/api/members'):
+        collection, session = repository._reader()
+        assert isinstance(collection.read_preference, SecondaryPreferred)
+        assert collection.read_preference.max_staleness >= 90
+        assert session is None
+    with app_module.app.test_request_context('/api/members/6650f1f1f1f1f1f1f1f1f1f1'):
+        assert isinstance(repository._reader()[0].read_preference, Primary)
+    # The report job's aggregation runs outside any request
+    assert isinstance(repository._reader(background=True)[0].read_preference, SecondaryPreferred)
+
+
+def test_malformed_causal_tokens_are_ignored():
+    assert decode_causal_token(None) is None
+    assert decode_causal_token('not-a-token') is None
+
+
+class FindListener(monitoring.CommandListener):
+    def __init__(self):
+        self.finds = []
+
+    def started(self, event):
+        if event.command_name == 'find':
+            self.finds.append(event.command)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def test_writer_reads_its_write_from_a_secondary(monkeypatch):
+    if not BENCH_REPLSET_URI:
+        pytest.skip('BENCH_REPLSET_URI not set')
+    from pymongo import MongoClient
+    listener = FindListener()
+    client = MongoClient(BENCH_REPLSET_URI, event_listeners=[listener])
+    collection = client['gym_read_routing']['members']
+    collection.drop()
+    monkeypatch.setattr(app_module, 'members_repository', _repository(collection))
+    web = app_module.app.test_client()
+    try:
+        created = web.post('/api/members', json=MemberGenerator(seed=8).member(1))
+        token = created.headers[CAUSAL_TOKEN_HEADER]
+        assert decode_causal_token(token)['operationTime'] is not None
+
+        listener.finds.clear()
+        listed = web.get('/api/members?page=1&per_page=50', headers={CAUSAL_TOKEN_HEADER: token})
+        assert created.get_json()['_id'] in {member['_id'] for member in listed.get_json()}
+        find = listener.finds[-1]
+        assert find['$readPreference']['mode'] == 'secondaryPreferred'
+        assert 'afterClusterTime' in find['readConcern']
+    finally:
+        collection.drop()
+        client.close()
@@ -0,0 +1,89 @@
+"""Circuit breaker: trips on consecutive failures, lets one probe through, recovers on success"""
+import time
+
+import mongomock
+import pytest
+from pymongo.errors import ExecutionTimeout, NetworkTimeout
+
+from perf.generate_members import MemberGenerator, load_into_mongo
+from repository import MongoMemberRepository
+from resilience import CircuitBreaker, CircuitOpenError, guarded_call
+
+RESET_SECONDS = 0.05
+
+
+def _trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(3, RESET_SECONDS)
+    _trip(breaker)
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    time.sleep(RESET_SECONDS)
+    breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Everyone else waits for the probe
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.trips == 2
+
+    time.sleep(RESET_SECONDS)
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.allow()
+
+
+def test_stale_reads_while_open():
+    collection = mongomock.MongoClient()['gym_resilience_tests']['members']
+    load_into_mongo(collection, MemberGenerator(seed=5).members(10))
+    breaker = CircuitBreaker(1, RESET_SECONDS)
+    repository = MongoMemberRepository(collection, breaker)
+    fresh = repository.list_members(0, 5)
+
+    def timeout():
+        raise NetworkTimeout('timed out')
+
+    with pytest.raises(NetworkTimeout):
+        repository._call(timeout)
+    stale = repository.list_members(0, 5)
+    # Served as a copy, so the cached entry stays intact
+    assert stale == fresh and stale is not fresh
+    with pytest.raises(CircuitOpenError):
+        repository.list_members(5, 5)
+
+
+@pytest.mark.parametrize('stream', ['iter_members', 'iter_archived'])
+def test_export_stream_closes_a_half_open_breaker(stream):
+    collection = mongomock.MongoClient()['gym_resilience_tests']['members']
+    load_into_mongo(collection, MemberGenerator(seed=5).members(10))
+    breaker = CircuitBreaker(3, RESET_SECONDS)
+    repository = MongoMemberRepository(collection, breaker)
+    _trip(breaker)
+    time.sleep(RESET_SECONDS)
+
+    # The export is the half-open probe; it must hand the breaker back
+    list(getattr(repository, stream)())
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert len(repository.list_members(0, 25)) == 10
+
+
+def test_spent_budget_never_reaches_the_driver(monkeypatch):
+    monkeypatch.setattr('resilience.remaining_seconds', lambda: 0.0)
+    breaker = CircuitBreaker(2, RESET_SECONDS)
+    calls = []
+    for _ in range(2):
+        with pytest.raises(ExecutionTimeout):
+            guarded_call(breaker, lambda: calls.append(1))
+    assert not calls
+    # Counted like any other timeout
+    assert breaker.state == CircuitBreaker.OPEN
+    assert guarded_call(CircuitBreaker(2, RESET_SECONDS), lambda: 'ok', timeout=1) == 'ok'
@@ -0,0 +1,205 @@
+"""Round-trip budgets for the member endpoints.
+
+Under Atlas latency every MongoDB round trip is paid in full, so each
+endpoint has a fixed budget of database calls. The mongomock tests count
+calls at the collection and run anywhere. With BENCH_MONGODB_URI set,
+the same budgets are checked on the wire with a CommandListener, and an
+update is timed through perf.latency_proxy, so a second round trip
+shows up as extra wall-clock time.
+"""
+import os
+import time
+
+import mongomock
+import pytest
+from pymongo import monitoring
+
+import app as app_module
+from indexes import counters_for, ensure_member_indexes, reports_for, tombstones_for
+from perf.generate_members import MemberGenerator, load_into_mongo
+from perf.latency_proxy import LatencyProxy, NetworkProfile, proxied_mongodb_uri
+from repository import MongoMemberRepository, local_today
+from resilience import CircuitBreaker
+
+BENCH_MONGODB_URI = os.getenv('BENCH_MONGODB_URI')
+
+# Collection methods that each cost one round trip
+SERVER_CALLS = (
+    'find', 'find_one', 'insert_one', 'update_one', 'find_one_and_update', 'delete_one',
+    'replace_one', 'count_documents', 'bulk_write',
+)
+
+# Maximum round trips per request, by route
+ROUND_TRIP_BUDGETS = {
+    'list': 1,
+    'list_by_status': 1,
+    # Precomputed by the member-reports job: one read of the report document
+    'stats': 1,
+    'expiring': 1,
+    'get': 1,
+    'create': 1,
+    'update': 1,
+    'patch': 1,
+    # One unordered bulk_write for the whole file
+    'import': 1,
+    'by_mobile': 1,
+    'by_mid': 1,
+    # The live collection, then the archive when the ID is free there
+    'mid_exists': 2,
+    # Increment the counter, then make sure no live or archived member has that ID
+    'reserve_id': 3,
+    # Read every targeted member, then one bulk_write, however many members match
+    'bulk_update': 2,
+    # The delete plus its tombstone for delta sync
+    'delete': 2,
+    'changes': 2,
+}
+
+
+class CountingCollection:
+    """Wraps a collection and counts the calls that would go to the server"""
+
+    def __init__(self, collection, parent=None):
+        self._collection = collection
+        self._parent = parent
+        self.calls = []
+
+    def with_options(self, **options):
+        # Secondary-read handles count towards the collection they were made from
+        return CountingCollection(self._collection.with_options(**options), parent=self._parent or self)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name not in SERVER_CALLS:
+            return attribute
+
+        def counted(*args, **kwargs):
+            (self._parent or self).calls.append(name)
+            return attribute(*args, **kwargs)
+        return counted
+
+
+def _seed(collection, count=20):
+    ensure_member_indexes(collection)
+    load_into_mongo(collection, MemberGenerator(seed=5).members(count))
+
+
+def _requests(client, member_id, changes=True):
+    """Issue one request per budgeted route; yields (route, response)"""
+    new_member = MemberGenerator(seed=6, mid_prefix='RT').member(1)
+    yield 'list', client.get('/api/members?page=1&per_page=10')
+    yield 'list_by_status', client.get('/api/members?status=active&page=1&per_page=10')
+    yield 'stats', client.get('/api/members/stats')
+    yield 'expiring', client.get('/api/members/expiring')
+    yield 'get', client.get(f"/api/members/{member_id}")
+    yield 'reserve_id', client.post('/api/member-ids/next')
+    created = client.post('/api/members', json=new_member)
+    yield 'create', created
+    yield 'by_mobile', client.get(f"/api/members/by-mobile/{new_member['mobile']}")
+    yield 'by_mid', client.get(f"/api/members/by-mid/{new_member['mId']}")
+    yield 'mid_exists', client.head(f"/api/members/by-mid/{new_member['mId']}")
+    new_member['amountPaid'] = new_member['totalAmount']
+    yield 'update', client.put(f"/api/members/{created.get_json()['_id']}", json=new_member)
+    yield 'patch', client.patch(f"/api/members/{created.get_json()['_id']}", json={'batch': 'Evening(5PM-10PM)'})
+    yield 'import', client.post('/api/members/import',
+                                json=list(MemberGenerator(seed=7, mid_prefix='IM').members(5)))
+    yield 'delete', client.delete(f"/api/members/{created.get_json()['_id']}")
+    yield 'bulk_update', client.post('/api/members/renew', json={'filter': {'planType': '1 month'}})
+    if changes:
+        yield 'changes', client.get('/api/members/changes?since=0&limit=10')
+
+
+def test_route_round_trips_within_budget(monkeypatch):
+    collection = mongomock.MongoClient().db.members
+    _seed(collection)
+    counting = CountingCollection(collection)
+    tombstones = CountingCollection(tombstones_for(collection))
+    counters = CountingCollection(counters_for(collection))
+    reports = CountingCollection(reports_for(collection))
+    repository = MongoMemberRepository(counting, CircuitBreaker(5, 10), tombstones=tombstones, counters=counters,
+                                       reports=reports)
+    monkeypatch.setattr(app_module, 'members_repository', repository)
+    client = app_module.app.test_client()
+    member_id = str(collection.find_one()['_id'])
+    # The first reservation also seeds the counter, and the report comes from a
+    # background job; only the requests themselves are budgeted
+    repository.next_member_id()
+    repository.save_report(repository.build_report(local_today()))
+    counting.calls, counters.calls, reports.calls = [], [], []
+
+    # mongomock cannot compare the BSON Timestamps that delta sync queries on
+    for route, response in _requests(client, member_id, changes=False):
+        calls = counting.calls + tombstones.calls + counters.calls + reports.calls
+        counting.calls, tombstones.calls, counters.calls, reports.calls = [], [], [], []
+        assert response.status_code < 300, (route, response.get_json())
+        assert len(calls) <= ROUND_TRIP_BUDGETS[route], f"{route} made {len(calls)} round trips: {calls}"
+
+
+class CommandCounter(monitoring.CommandListener):
+    IGNORED = {'hello', 'isMaster', 'ismaster', 'ping', 'endSessions', 'buildInfo', 'saslStart', 'saslContinue'}
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name not in self.IGNORED:
+            self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+@pytest.fixture
+def mongod_collection():
+    if not BENCH_MONGODB_URI:
+        pytest.skip('BENCH_MONGODB_URI not set')
+    from pymongo import MongoClient
+    from pymongo.uri_parser import parse_uri
+    # A fixed 25ms each way, no jitter, so one round trip is at least 50ms
+    proxy = LatencyProxy(parse_uri(BENCH_MONGODB_URI)['nodelist'][0], NetworkProfile(latency_ms=25))
+    counter = CommandCounter()
+    client = MongoClient(proxied_mongodb_uri(proxy.start()), event_listeners=[counter])
+    collection = client['gym_round_trips']['members']
+    collection.drop()
+    _seed(collection)
+    counter.commands.clear()
+    yield collection, counter
+    collection.drop()
+    tombstones_for(collection).drop()
+    counters_for(collection).drop()
+    reports_for(collection).drop()
+    client.close()
+    proxy.stop()
+
+
+def test_route_commands_within_budget(mongod_collection, monkeypatch):
+    collection, counter = mongod_collection
+    repository = MongoMemberRepository(collection, CircuitBreaker(5, 10), tombstones=tombstones_for(collection))
+    monkeypatch.setattr(app_module, 'members_repository', repository)
+    client = app_module.app.test_client()
+    # Also warms the connection pool outside the measured requests
+    member_id = str(collection.find_one()['_id'])
+    repository.next_member_id()
+    repository.save_report(repository.build_report(local_today()))
+    counter.commands.clear()
+
+    for route, response in _requests(client, member_id):
+        commands, counter.commands = counter.commands, []
+        assert response.status_code < 300, (route, response.get_json())
+        assert len(commands) <= ROUND_TRIP_BUDGETS[route], f"{route} sent {commands}"
+
+
+def test_update_costs_one_round_trip_of_latency(mongod_collection):
+    collection, _ = mongod_collection
+    repository = MongoMemberRepository(collection, CircuitBreaker(5, 10))
+    member = collection.find_one()
+    member_id = str(member.pop('_id'))
+
+    started = time.perf_counter()
+    repository.update_member(member_id, dict(member, amountPaid=0.0))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    # One 50ms round trip plus local overhead; a second round trip would exceed 100ms
+    assert elapsed_ms < 95, f"update took {elapsed_ms:.0f}ms through a 50ms RTT link"
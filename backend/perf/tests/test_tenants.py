@@ -0,0 +1,43 @@
+"""Branches: one client, per-branch collections, indexes, counters and caches"""
+import mongomock
+import pytest
+
+from indexes import counters_for, ensure_member_indexes
+from member_schema import member_validator
+from perf.generate_members import MemberGenerator
+from repository import MongoMemberRepository
+from resilience import CircuitBreaker
+from tenants import tenant_names, tenant_namespace
+
+
+def test_namespaces():
+    databases = {'south': 'gym_south'}
+    assert tenant_namespace('main', 'gym', 'Members', databases, default='main') == ('gym', 'Members')
+    assert tenant_namespace('north', 'gym', 'Members', databases, default='main') == ('gym', 'Members.north')
+    assert tenant_namespace('south', 'gym', 'Members', databases, default='main') == ('gym_south', 'Members')
+    assert tenant_names(['north', 'main'], default='main') == ['main', 'north']
+    with pytest.raises(ValueError):
+        tenant_names(['North Branch'])
+
+
+def test_branches_share_a_client_but_not_their_data():
+    client = mongomock.MongoClient()
+    breaker = CircuitBreaker(5, 10)
+    repositories = {}
+    for name in ('main', 'north', 'south'):
+        database, collection_name = tenant_namespace(name, 'gym', 'Members', {'south': 'gym_south'}, default='main')
+        collection = client[database][collection_name]
+        ensure_member_indexes(collection)
+        repositories[name] = MongoMemberRepository(collection, breaker)
+
+    member = member_validator.validate(MemberGenerator(seed=3).member(1))
+    for repository in repositories.values():
+        # The same member ID is free in every branch
+        repository.insert_member(dict(member))
+    assert repositories['north'].next_member_id() == repositories['south'].next_member_id()
+    assert counters_for(repositories['north'].collection).name == 'Members.north_counters'
+
+    repositories['north'].delete_member(str(repositories['north'].get_member_by_mid(member['mId'])['_id']))
+    assert repositories['north'].get_member_by_mid(member['mId']) is None
+    assert repositories['main'].get_member_by_mid(member['mId']) is not None
+    assert repositories['south'].collection.database.name == 'gym_south'
@@ -0,0 +1,206 @@
+import collections
+import os
+import threading
+import time
+
+from pymongo import monitoring
+
+# The worker model this process runs under, with the defaults of gunicorn.conf.py
+WORKER_CLASS = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+WORKER_THREADS = int(os.getenv('GUNICORN_THREADS', 32))
+WORKER_CONNECTIONS = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Connections used outside requests: job scheduler, search sync, check-in writer,
+# change stream relay and health prober
+MONGO_POOL_BACKGROUND = int(os.getenv('MONGO_POOL_BACKGROUND', 4))
+# Upper bound for async workers, whose request concurrency is only capped by worker_connections
+MONGO_POOL_ASYNC_CAP = int(os.getenv('MONGO_POOL_ASYNC_CAP', 100))
+# Idle connections are closed after this long instead of staying pinned open against the tier's limit
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 60000))
+
+ASYNC_WORKER_CLASSES = {'gevent', 'eventlet', 'tornado'}
+# Connection creations remembered for the recent creation rate
+CREATION_WINDOW_SECONDS = 60
+
+
+def request_concurrency(worker_class=WORKER_CLASS, threads=WORKER_THREADS, connections=WORKER_CONNECTIONS):
+    """Requests one worker can have talking to MongoDB at the same time"""
+    worker_class = worker_class.lower()
+    if worker_class in ASYNC_WORKER_CLASSES:
+        return min(connections, MONGO_POOL_ASYNC_CAP)
+    # gunicorn runs a sync worker with threads > 1 as gthread
+    if worker_class == 'gthread' or threads > 1:
+        return threads
+    # A sync worker serves one request at a time
+    return 1
+
+
+def pool_settings(worker_class=WORKER_CLASS, threads=WORKER_THREADS, connections=WORKER_CONNECTIONS):
+    """MongoClient pool options for this worker model; MONGO_MAX_POOL_SIZE/MONGO_MIN_POOL_SIZE override them.
+
+    The pool only needs as many connections as the worker can use at once:
+    its request concurrency plus the background threads. minPoolSize is 0 so
+    idle workers hold no connections.
+    """
+    max_pool = request_concurrency(worker_class, threads, connections) + MONGO_POOL_BACKGROUND
+    return {
+        'maxPoolSize': int(os.getenv('MONGO_MAX_POOL_SIZE', max_pool)),
+        'minPoolSize': int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+        'maxIdleTimeMS': MONGO_MAX_IDLE_TIME_MS,
+    }
+
+
+class _PoolState:
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.created = 0
+        self.closed = 0
+        self.cleared = 0
+        self.checkout_failures = 0
+        self.wait_seconds = 0.0
+        self.checkouts = 0
+        self.recent_creations = collections.deque()
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """CMAP listener: per-server connection counts, wait queue and creation rate.
+
+    Pass it to MongoClient(event_listeners=[...]). The counters are also
+    exported to the metrics registry for /metrics.
+    """
+
+    def __init__(self, metrics):
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._waits = threading.local()
+        self._open = metrics.gauge('mongo_pool_connections', 'Open connections in the pool')
+        self._checked_out = metrics.gauge('mongo_pool_checked_out', 'Connections checked out by a request or job')
+        self._waiting = metrics.gauge('mongo_pool_wait_queue', 'Threads waiting for a connection')
+        self._created = metrics.counter('mongo_pool_connections_created_total', 'Connections created')
+        self._closed = metrics.counter('mongo_pool_connections_closed_total', 'Connections closed, by reason')
+        self._failures = metrics.counter('mongo_pool_checkout_failures_total', 'Failed checkouts, by reason')
+        self._wait_total = metrics.counter('mongo_pool_checkout_wait_seconds_total', 'Time spent waiting for checkouts')
+        self._cleared = metrics.counter('mongo_pool_cleared_total', 'Times the pool was cleared after an error')
+
+    def _state(self, address):
+        state = self._pools.get(address)
+        if state is None:
+            state = self._pools[address] = _PoolState()
+        return state
+
+    @staticmethod
+    def _server(address):
+        return f"{address[0]}:{address[1]}"
+
+    def pool_created(self, event):
+        with self._lock:
+            self._state(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._state(event.address).cleared += 1
+        self._cleared.inc(server=self._server(event.address))
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(event.address)
+            state.open += 1
+            state.created += 1
+            state.recent_creations.append(now)
+            while state.recent_creations[0] < now - CREATION_WINDOW_SECONDS:
+                state.recent_creations.popleft()
+            open_connections = state.open
+        server = self._server(event.address)
+        self._created.inc(server=server)
+        self._open.set(open_connections, server=server)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            state = self._state(event.address)
+            state.open -= 1
+            state.closed += 1
+            open_connections = state.open
+        server = self._server(event.address)
+        self._closed.inc(server=server, reason=event.reason)
+        self._open.set(open_connections, server=server)
+
+    def connection_check_out_started(self, event):
+        self._waits.started = time.monotonic()
+        with self._lock:
+            state = self._state(event.address)
+            state.waiting += 1
+            state.peak_waiting = max(state.peak_waiting, state.waiting)
+            waiting = state.waiting
+        self._waiting.set(waiting, server=self._server(event.address))
+
+    def _check_out_finished(self, address):
+        waited = time.monotonic() - getattr(self._waits, 'started', time.monotonic())
+        state = self._state(address)
+        state.waiting -= 1
+        state.wait_seconds += waited
+        return state, waited
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            state, waited = self._check_out_finished(event.address)
+            state.checkouts += 1
+            state.checked_out += 1
+            state.peak_checked_out = max(state.peak_checked_out, state.checked_out)
+            waiting, checked_out = state.waiting, state.checked_out
+        server = self._server(event.address)
+        self._wait_total.inc(waited, server=server)
+        self._waiting.set(waiting, server=server)
+        self._checked_out.set(checked_out, server=server)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            state, waited = self._check_out_finished(event.address)
+            state.checkout_failures += 1
+            waiting = state.waiting
+        server = self._server(event.address)
+        self._wait_total.inc(waited, server=server)
+        self._failures.inc(server=server, reason=event.reason)
+        self._waiting.set(waiting, server=server)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            state = self._state(event.address)
+            state.checked_out -= 1
+            checked_out = state.checked_out
+        self._checked_out.set(checked_out, server=self._server(event.address))
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                self._server(address): {
+                    'open': state.open,
+                    'checked_out': state.checked_out,
+                    'peak_checked_out': state.peak_checked_out,
+                    'wait_queue': state.waiting,
+                    'peak_wait_queue': state.peak_waiting,
+                    'created': state.created,
+                    'closed': state.closed,
+                    'created_last_minute': sum(1 for at in state.recent_creations
+                                               if at >= now - CREATION_WINDOW_SECONDS),
+                    'checkouts': state.checkouts,
+                    'checkout_failures': state.checkout_failures,
+                    'mean_checkout_wait_ms': round(state.wait_seconds * 1000 / state.checkouts, 3)
+                    if state.checkouts else 0.0,
+                    'cleared': state.cleared,
+                } for address, state in self._pools.items()
+            }
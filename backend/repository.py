@@ -0,0 +1,855 @@
+import copy
+import datetime
+import itertools
+import logging
+import os
+import re
+import threading
+import uuid
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from resilience import (
+    CircuitOpenError, StaleReadCache, guarded_call, is_transient_failure, mark_stale,
+)
+from checkins import LOCAL_TZ
+from consistency import SECONDARY_READS, has_causal_token, reads_from_secondary, request_session
+from indexes import archive_for, counters_for, reports_for
+from sync import VersionClock, merge_changes, tombstone_expiry
+
+logger = logging.getLogger(__name__)
+
+# Assigned by the store on every write; never taken from the client
+SERVER_FIELDS = ('_id', 'updatedAt', 'mobileNormalized', 'status')
+
+# Digits in a national mobile number; longer inputs carry a country code or trunk prefix
+MOBILE_NUMBER_DIGITS = int(os.getenv('MOBILE_NUMBER_DIGITS', 10))
+# Members returned for one mobile number (families often share a phone)
+MOBILE_LOOKUP_LIMIT = int(os.getenv('MOBILE_LOOKUP_LIMIT', 10))
+
+_NON_DIGIT = re.compile(r'\D+')
+
+# Member IDs handed out by /api/member-ids/next are zero-padded to this many digits
+MEMBER_ID_WIDTH = int(os.getenv('MEMBER_ID_WIDTH', 3))
+# Allocated IDs that were already typed in by hand are skipped, up to this many in a row
+MEMBER_ID_MAX_SKIPS = int(os.getenv('MEMBER_ID_MAX_SKIPS', 100))
+MEMBER_ID_COUNTER = 'mId'
+
+
+# Members whose plan ends within this many days are "expiring" (the frontend's threshold too)
+EXPIRING_SOON_DAYS = int(os.getenv('EXPIRING_SOON_DAYS', 10))
+# Most members kept in the precomputed expiring-soon list
+EXPIRING_LIST_LIMIT = int(os.getenv('EXPIRING_LIST_LIMIT', 500))
+MEMBER_STATUSES = ('active', 'expiring', 'expired')
+# _id of the report document the background jobs maintain
+MEMBER_REPORT_ID = 'members'
+
+# Members whose plan ended more than this many days ago move to the archive collection
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 365))
+# Members moved per batch by the archive job
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 500))
+
+
+class MemberIdsExhausted(Exception):
+    """Every allocated member ID in a row was already taken"""
+
+# Compact projection for lookups that only need to identify a member
+MEMBER_SUMMARY_FIELDS = ('name', 'mId', 'mobile', 'batch', 'planType', 'expiryDate', 'dueAmount')
+
+
+def member_summary(member):
+    summary = {field: member[field] for field in MEMBER_SUMMARY_FIELDS if field in member}
+    summary['_id'] = str(member['_id'])
+    return summary
+
+
+def normalize_mobile(mobile):
+    """Canonical form of a phone number: '+91 98765-43210' and '098765 43210' both become '9876543210'"""
+    digits = _NON_DIGIT.sub('', str(mobile or ''))
+    return digits[-MOBILE_NUMBER_DIGITS:]
+
+
+def format_member_id(sequence):
+    return f"{sequence:0{MEMBER_ID_WIDTH}d}"
+
+
+def highest_numeric_mid(mids):
+    """Largest all-digit member ID, where counting starts on first use"""
+    return max((int(mid) for mid in mids if isinstance(mid, str) and mid.isdigit()), default=0)
+
+
+def local_today():
+    return datetime.datetime.now(LOCAL_TZ).date()
+
+
+def member_status(expiry_date, today):
+    """'expired', 'expiring' or 'active' on `today`; None when the expiry date cannot be read"""
+    try:
+        expiry = datetime.date.fromisoformat(str(expiry_date)[:10])
+    except ValueError:
+        return None
+    days_left = (expiry - today).days
+    if days_left < 0:
+        return 'expired'
+    if days_left <= EXPIRING_SOON_DAYS:
+        return 'expiring'
+    return 'active'
+
+
+def status_ranges(today):
+    """The expiryDate range (YYYY-MM-DD strings sort as dates) of each status on `today`"""
+    soon = (today + datetime.timedelta(days=EXPIRING_SOON_DAYS)).isoformat()
+    return {
+        'expired': {'$lt': today.isoformat()},
+        'expiring': {'$gte': today.isoformat(), '$lte': soon},
+        'active': {'$gt': soon},
+    }
+
+
+def member_report(today, status_totals, expiring, expiring_total, archived=0):
+    """The precomputed document behind /api/members/stats and /api/members/expiring.
+
+    status_totals maps each status to (members, amount paid); the stats use
+    the frontend's DashboardStats field names. Archived members are only
+    counted in archivedMembers.
+    """
+    stats = {'totalMembers': 0, 'activeMembers': 0, 'expiringMembers': 0, 'expiredMembers': 0, 'totalIncome': 0,
+             'archivedMembers': archived}
+    for status, (count, income) in status_totals.items():
+        stats['totalMembers'] += count
+        stats['totalIncome'] += income
+        if status in MEMBER_STATUSES:
+            stats[f"{status}Members"] += count
+    return {
+        '_id': MEMBER_REPORT_ID,
+        'asOf': today.isoformat(),
+        'generatedAt': datetime.datetime.now(datetime.timezone.utc),
+        'stats': stats,
+        'expiring': expiring,
+        'expiringTotal': expiring_total,
+    }
+
+
+def _matches(member, query):
+    """Evaluate a find() filter of equalities and $gte/$lt ranges against a stored member"""
+    for field, condition in query.items():
+        value = member.get(field)
+        if isinstance(condition, dict):
+            value = str(value)
+            if '$gte' in condition and not value >= condition['$gte']:
+                return False
+            if '$lt' in condition and not value < condition['$lt']:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def archive_horizon(today):
+    """Members whose expiryDate is before this date are archived"""
+    return (today - datetime.timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+
+
+def _derive_fields(member_data, partial=False):
+    """Set the server-derived fields; a partial update only derives from the fields it changes"""
+    if not partial or 'mobile' in member_data:
+        member_data['mobileNormalized'] = normalize_mobile(member_data.get('mobile'))
+    if not partial or 'expiryDate' in member_data:
+        # Kept current by the nightly expiry sweep as days pass
+        member_data['status'] = member_status(member_data.get('expiryDate'), local_today())
+
+
+def backfill_normalized_mobiles(collection, batch_size=500):
+    """Set mobileNormalized on members written before it existed; returns the number updated"""
+    updated = 0
+    batch = []
+    for member in collection.find({'mobileNormalized': {'$exists': False}}, {'mobile': 1}):
+        batch.append(UpdateOne({'_id': member['_id']},
+                               {'$set': {'mobileNormalized': normalize_mobile(member.get('mobile'))}}))
+        if len(batch) == batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    return updated
+
+
+class InMemoryMemberRepository:
+    """Member storage used when MongoDB is not configured or not reachable at startup"""
+
+    storage_type = 'in-memory'
+
+    def __init__(self, storage, events=None):
+        self.storage = storage
+        # MemberEventBus notified of every successful write, if any
+        self.events = events
+        self.tombstones = []
+        self.clock = VersionClock()
+        self._mid_sequence = None
+        self._mid_lock = threading.Lock()
+        self.report = None
+        # Members moved out of storage by the archive job
+        self.archived = []
+
+    def _publish(self, event_type, member_id, member=None):
+        if self.events is not None:
+            self.events.publish(event_type, member_id, member)
+
+    def validate_id(self, member_id):
+        # Any string is a valid in-memory ID
+        return member_id
+
+    def _index_of(self, member_id):
+        for i, m in enumerate(self.storage):
+            if str(m.get('_id', m.get('id', ''))) == member_id:
+                return i
+        return None
+
+    def list_members(self, skip, limit, status=None):
+        if status is not None:
+            return [m for m in self.storage if m.get('status') == status][skip:skip + limit]
+        return self.storage[skip:skip + limit]
+
+    def iter_members(self):
+        return list(self.storage)
+
+    def get_member(self, member_id):
+        index = self._index_of(member_id)
+        return None if index is None else self.storage[index]
+
+    def get_member_by_mid(self, mid):
+        return next((m for m in self.storage if m.get('mId') == mid), None)
+
+    def next_member_id(self):
+        with self._mid_lock:
+            if self._mid_sequence is None:
+                self._mid_sequence = highest_numeric_mid(m.get('mId') for m in self.storage + self.archived)
+            for _ in range(MEMBER_ID_MAX_SKIPS):
+                self._mid_sequence += 1
+                mid = format_member_id(self._mid_sequence)
+                if not self.mid_exists(mid):
+                    return mid
+        raise MemberIdsExhausted(mid)
+
+    def mid_exists(self, mid):
+        # An archived member keeps their ID, so restoring them never collides
+        return self.get_member_by_mid(mid) is not None or self.get_archived_member_by_mid(mid) is not None
+
+    def find_by_mobile(self, mobile):
+        return [member_summary(m) for m in self.storage
+                if m.get('mobileNormalized') == mobile][:MOBILE_LOOKUP_LIMIT]
+
+    def insert_member(self, member_data):
+        member_id = str(uuid.uuid4())
+        member_data['_id'] = member_id
+        member_data['id'] = member_id  # For consistency with frontend
+        member_data['updatedAt'] = self.clock.next()
+        _derive_fields(member_data)
+        self.storage.append(member_data)
+        self._publish('created', member_id, member_data)
+        return member_data
+
+    def update_member(self, member_id, member_data):
+        index = self._index_of(member_id)
+        if index is None:
+            return None
+        member_data['_id'] = member_id
+        member_data['id'] = member_id  # For consistency with frontend
+        member_data['updatedAt'] = self.clock.next()
+        _derive_fields(member_data)
+        self.storage[index] = member_data
+        self._publish('updated', member_id, member_data)
+        return member_data
+
+    def patch_member(self, member_id, fields):
+        index = self._index_of(member_id)
+        if index is None:
+            return None
+        fields = {field: value for field, value in fields.items() if field not in SERVER_FIELDS + ('id',)}
+        _derive_fields(fields, partial=True)
+        member = self.storage[index]
+        member.update(fields)
+        member['updatedAt'] = self.clock.next()
+        self._publish('updated', member_id, member)
+        return member
+
+    def insert_members(self, members):
+        """Insert many members; returns each one's new _id, or None where its mId is already taken"""
+        taken = {m.get('mId') for m in self.storage}
+        ids = []
+        for member_data in members:
+            if member_data.get('mId') in taken:
+                ids.append(None)
+                continue
+            taken.add(member_data.get('mId'))
+            ids.append(self.insert_member(member_data)['_id'])
+        return ids
+
+    def delete_member(self, member_id):
+        index = self._index_of(member_id)
+        if index is None:
+            return False
+        self.storage.pop(index)
+        self.tombstones.append({'_id': member_id, 'deletedAt': self.clock.next()})
+        self._publish('deleted', member_id)
+        return True
+
+    def changes_since(self, since, limit):
+        members = sorted((m for m in self.storage if m['updatedAt'] > since), key=lambda m: m['updatedAt'])
+        tombstones = [t for t in self.tombstones if t['deletedAt'] > since]
+        return merge_changes(members[:limit + 1], tombstones[:limit + 1], limit)
+
+    def find_members(self, ids, query, fields, limit):
+        """Members by ID list or by filter, at most `limit` of them"""
+        if ids is not None:
+            wanted = set(ids)
+            members = [m for m in self.storage if str(m['_id']) in wanted]
+        else:
+            members = [m for m in self.storage if _matches(m, query)]
+        return [{field: m.get(field) for field in ('_id',) + tuple(fields)} for m in members[:limit]]
+
+    def apply_member_updates(self, updates):
+        """Set fields on many members; returns the IDs of those changed since they were read"""
+        conflicts = set()
+        for read, fields in updates:
+            member_id = str(read['_id'])
+            index = self._index_of(member_id)
+            if index is None or self.storage[index]['updatedAt'] != read['updatedAt']:
+                conflicts.add(member_id)
+                continue
+            member = self.storage[index]
+            member.update(fields)
+            member['updatedAt'] = self.clock.next()
+            self._publish('updated', member_id, member)
+        return conflicts
+
+    def sweep_statuses(self, today, timeout=None):
+        changed = 0
+        for member in self.storage:
+            status = member_status(member.get('expiryDate'), today)
+            if status is not None and member.get('status') != status:
+                member['status'] = status
+                member['updatedAt'] = self.clock.next()
+                changed += 1
+        return changed
+
+    def build_report(self, today, timeout=None):
+        totals = {}
+        for member in self.storage:
+            count, income = totals.get(member.get('status'), (0, 0))
+            totals[member.get('status')] = (count + 1, income + (member.get('amountPaid') or 0))
+        ranges = status_ranges(today)['expiring']
+        expiring = sorted((m for m in self.storage if ranges['$gte'] <= str(m.get('expiryDate')) <= ranges['$lte']),
+                          key=lambda m: m['expiryDate'])
+        return member_report(today, totals, [member_summary(m) for m in expiring[:EXPIRING_LIST_LIMIT]],
+                             len(expiring), len(self.archived))
+
+    def save_report(self, report, timeout=None):
+        self.report = report
+
+    def _archive(self, members):
+        for member in members:
+            member_id = str(member['_id'])
+            self.storage.pop(self._index_of(member_id))
+            self.archived.append(dict(member, archivedAt=datetime.datetime.now(datetime.timezone.utc)))
+            self.tombstones.append({'_id': member_id, 'deletedAt': self.clock.next()})
+            self._publish('deleted', member_id)
+
+    def archive_expired(self, today, timeout=None):
+        horizon = archive_horizon(today)
+        expired = [m for m in self.storage if str(m.get('expiryDate')) < horizon]
+        self._archive(expired)
+        return len(expired)
+
+    def archive_member(self, member_id):
+        member = self.get_member(member_id)
+        if member is None:
+            return False
+        self._archive([member])
+        return True
+
+    def get_archived_member(self, member_id):
+        return next((m for m in self.archived if str(m['_id']) == member_id), None)
+
+    def get_archived_member_by_mid(self, mid):
+        return next((m for m in self.archived if m.get('mId') == mid), None)
+
+    def find_archived_by_mobile(self, mobile):
+        return [member_summary(m) for m in self.archived
+                if m.get('mobileNormalized') == mobile][:MOBILE_LOOKUP_LIMIT]
+
+    def list_archived(self, skip, limit):
+        return self.archived[skip:skip + limit]
+
+    def iter_archived(self):
+        return list(self.archived)
+
+    def restore_member(self, member_id):
+        """Move an archived member back; returns it, or None if it is not archived"""
+        member = self.get_archived_member(member_id)
+        if member is None:
+            return None
+        self.archived.remove(member)
+        member = {field: value for field, value in member.items() if field != 'archivedAt'}
+        member['updatedAt'] = self.clock.next()
+        _derive_fields(member)
+        self.storage.append(member)
+        self.tombstones = [t for t in self.tombstones if t['_id'] != member_id]
+        self._publish('created', member_id, member)
+        return member
+
+    def get_report(self):
+        return self.report
+
+
+class MongoMemberRepository:
+    """Member storage in MongoDB, guarded by a request deadline and a circuit breaker.
+
+    Every call runs inside ``pymongo.timeout()`` with the time left in the
+    request's budget, so the driver sends it to the server as ``maxTimeMS``;
+    once the budget is spent, calls fail before reaching the driver.
+    Timeouts and connection failures feed the circuit breaker; while it is
+    open, reads are answered from the last-known-good cache when possible
+    and everything else fails fast with ``CircuitOpenError``.
+    """
+
+    storage_type = 'mongodb'
+
+    def __init__(self, collection, breaker, stale_cache_entries=512, events=None, tombstones=None, counters=None,
+                 reports=None, archive=None):
+        self.collection = collection
+        # Long-expired members, moved out so the hot collection and its indexes track current members
+        self.archive = archive if archive is not None else archive_for(collection)
+        self.client = collection.database.client
+        self.counters = counters if counters is not None else counters_for(collection)
+        self.reports = reports if reports is not None else reports_for(collection)
+        # Handles for the reads a route or job may send to a secondary (see consistency.py)
+        self._secondaries = {name: getattr(self, name).with_options(read_preference=SECONDARY_READS)
+                             for name in ('collection', 'reports', 'archive')}
+        # Deleted member IDs with their deletion version, for /api/members/changes
+        self.tombstones = tombstones
+        self.breaker = breaker
+        self.stale_cache = StaleReadCache(stale_cache_entries)
+        # Left unset when a change stream already reports every write
+        self.events = events
+
+    def _publish(self, event_type, member_id, member=None):
+        if self.events is not None:
+            self.events.publish(event_type, member_id, member)
+
+    def validate_id(self, member_id):
+        # Raises bson.errors.InvalidId for malformed IDs
+        return ObjectId(member_id)
+
+    def _call(self, operation, timeout=None):
+        return guarded_call(self.breaker, operation, timeout)
+
+    def _reader(self, name='collection', background=False):
+        """(collection, session) for a read the current route or job may send to a secondary.
+
+        A client that sent a causal token reads through its session, so a
+        lagging secondary waits until it has the client's own writes.
+        """
+        if not reads_from_secondary(background):
+            return getattr(self, name), None
+        return self._secondaries[name], request_session(self.client) if has_causal_token() else None
+
+    def _stream_reader(self, name='collection'):
+        # A stream outlives its request's session, so a client with a causal token streams from the primary
+        if reads_from_secondary() and not has_causal_token():
+            return self._secondaries[name]
+        return getattr(self, name)
+
+    def _write_session(self):
+        """The request's causal session; the response then carries a token for read-your-writes"""
+        return request_session(self.client)
+
+    def _read(self, cache_key, operation):
+        """Run a read, falling back to the stale-read cache when MongoDB is unreachable.
+
+        Successful results are cached as they are, without a copy on the hot
+        path; callers never modify the documents they get back (serializers
+        copy them). A stale entry is copied when it is served, which only
+        happens during an outage.
+        """
+        try:
+            result = self._call(operation)
+        except Exception as e:
+            if not (isinstance(e, CircuitOpenError) or is_transient_failure(e)):
+                raise
+            cached = self.stale_cache.get(cache_key)
+            if cached is None:
+                raise
+            mark_stale()
+            return copy.deepcopy(cached)
+        if result is not None:
+            self.stale_cache.put(cache_key, result)
+        return result
+
+    def list_members(self, skip, limit, status=None):
+        # Sort by _id for consistent pagination
+        query = {} if status is None else {'status': status}
+        collection, session = self._reader()
+        return self._read(
+            ('list', skip, limit, status),
+            lambda: list(collection.find(query, session=session).sort('_id', 1).skip(skip).limit(limit))
+        )
+
+    def _stream(self, collection):
+        """Every document of `collection` in _id order, fetched in batches.
+
+        The first batch goes through the breaker like any other call, so an
+        open breaker fails the request up front and a half-open probe reports
+        its outcome. Streams are long-lived, so later batches are bounded by
+        the socket timeout rather than the request budget.
+        """
+        cursor = collection.find().sort('_id', 1).batch_size(500)
+        first = self._call(lambda: next(cursor, None))
+        if first is None:
+            return iter(())
+        return itertools.chain((first,), cursor)
+
+    def iter_members(self):
+        return self._stream(self._stream_reader())
+
+    def get_member(self, member_id):
+        oid = self.validate_id(member_id)
+        return self._read(('member', member_id), lambda: self.collection.find_one({'_id': oid}))
+
+    def get_member_by_mid(self, mid):
+        return self._read(('mid', mid), lambda: self.collection.find_one({'mId': mid}))
+
+    def _seed_member_id_counter(self):
+        # First use: continue from the highest numeric ID already in the collection or
+        # its archive. The regex scans are covered by the mId indexes and run once per database.
+        numeric = {'mId': {'$regex': '^[0-9]+$'}}
+        mids = self._call(lambda: [member['mId'] for collection in (self.collection, self.archive)
+                                   for member in collection.find(numeric, {'_id': 0, 'mId': 1})])
+        try:
+            # $setOnInsert: a worker that seeded first wins
+            self._call(lambda: self.counters.update_one(
+                {'_id': MEMBER_ID_COUNTER}, {'$setOnInsert': {'seq': highest_numeric_mid(mids)}}, upsert=True
+            ))
+        except DuplicateKeyError:
+            pass
+
+    def next_member_id(self):
+        """Reserve the next free numeric member ID; two callers never get the same one"""
+        mid = None
+        for _ in range(MEMBER_ID_MAX_SKIPS):
+            counter = self._call(lambda: self.counters.find_one_and_update(
+                {'_id': MEMBER_ID_COUNTER}, {'$inc': {'seq': 1}}, return_document=ReturnDocument.AFTER
+            ))
+            if counter is None:
+                self._seed_member_id_counter()
+                continue
+            mid = format_member_id(counter['seq'])
+            if not self._call(lambda: self._mid_holder(mid)):
+                return mid
+        raise MemberIdsExhausted(mid)
+
+    def _mid_holder(self, mid):
+        # Covered by the mId indexes: the server never fetches the document. An archived
+        # member keeps their ID, so restoring them never collides with a newer member.
+        projection = {'_id': 0, 'mId': 1}
+        return self.collection.find_one({'mId': mid}, projection) or self.archive.find_one({'mId': mid}, projection)
+
+    def mid_exists(self, mid):
+        return self._read(('mid-exists', mid), lambda: self._mid_holder(mid)) is not None
+
+    def find_by_mobile(self, mobile):
+        # One point read on the mobileNormalized index, returning only the summary fields
+        projection = dict.fromkeys(MEMBER_SUMMARY_FIELDS, 1)
+        members = self._read(('mobile', mobile), lambda: list(
+            self.collection.find({'mobileNormalized': mobile}, projection).limit(MOBILE_LOOKUP_LIMIT)
+        ))
+        return [member_summary(member) for member in members]
+
+    def insert_member(self, member_data):
+        for field in SERVER_FIELDS:
+            member_data.pop(field, None)
+        _derive_fields(member_data)
+        # An upsert on a fresh _id is an insert that can also stamp the server-side version
+        member = self._call(lambda: self.collection.find_one_and_update(
+            {'_id': ObjectId()},
+            {'$set': member_data, '$currentDate': {'updatedAt': {'$type': 'timestamp'}}},
+            upsert=True, return_document=ReturnDocument.AFTER, session=self._write_session()
+        ))
+        self._publish('created', member['_id'], member)
+        return member
+
+    def update_member(self, member_id, member_data):
+        oid = self.validate_id(member_id)
+        # Remove _id and the version from the update data if present
+        for field in SERVER_FIELDS:
+            member_data.pop(field, None)
+        _derive_fields(member_data)
+        # One round trip: the server applies the update and returns the new document
+        updated_member = self._call(lambda: self.collection.find_one_and_update(
+            {'_id': oid},
+            {'$set': member_data, '$currentDate': {'updatedAt': {'$type': 'timestamp'}}},
+            return_document=ReturnDocument.AFTER, session=self._write_session()
+        ))
+        if updated_member is not None:
+            self.stale_cache.put(('member', member_id), updated_member)
+            self._publish('updated', member_id, updated_member)
+        return updated_member
+
+    def patch_member(self, member_id, fields):
+        """Set only the given fields; returns the updated member or None if it does not exist"""
+        oid = self.validate_id(member_id)
+        fields = {field: value for field, value in fields.items() if field not in SERVER_FIELDS + ('id',)}
+        _derive_fields(fields, partial=True)
+        member = self._call(lambda: self.collection.find_one_and_update(
+            {'_id': oid},
+            {'$set': fields, '$currentDate': {'updatedAt': {'$type': 'timestamp'}}},
+            return_document=ReturnDocument.AFTER, session=self._write_session()
+        ))
+        if member is not None:
+            self.stale_cache.put(('member', member_id), member)
+            self._publish('updated', member_id, member)
+        return member
+
+    def insert_members(self, members):
+        """Insert many members in one unordered bulk_write.
+
+        Returns each one's new _id, or None where its mId is already taken
+        (by an existing member or an earlier row of the same batch).
+        """
+        ids = [ObjectId() for _ in members]
+        for member_data in members:
+            for field in SERVER_FIELDS:
+                member_data.pop(field, None)
+            _derive_fields(member_data)
+        duplicates = set()
+        try:
+            # Upserts on fresh _ids, like insert_member, so the server stamps each version
+            self._call(lambda: self.collection.bulk_write([
+                UpdateOne({'_id': oid}, {'$set': member_data, '$currentDate': {'updatedAt': {'$type': 'timestamp'}}},
+                          upsert=True)
+                for oid, member_data in zip(ids, members)
+            ], ordered=False, session=self._write_session()))
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != 11000 for error in errors):
+                raise
+            duplicates = {error['index'] for error in errors}
+        ids = [None if index in duplicates else oid for index, oid in enumerate(ids)]
+        inserted = [oid for oid in ids if oid is not None]
+        if inserted and self.events is not None:
+            for member in self._call(lambda: list(self.collection.find({'_id': {'$in': inserted}}))):
+                self._publish('created', member['_id'], member)
+        return ids
+
+    def delete_member(self, member_id):
+        oid = self.validate_id(member_id)
+        result = self._call(lambda: self.collection.delete_one({'_id': oid}, session=self._write_session()))
+        self.stale_cache.discard(('member', member_id))
+        if not result.deleted_count:
+            return False
+        if self.tombstones is not None:
+            try:
+                self._call(lambda: self.tombstones.update_one(
+                    {'_id': oid},
+                    {'$currentDate': {'deletedAt': {'$type': 'timestamp'}}, '$set': {'expireAt': tombstone_expiry()}},
+                    upsert=True
+                ))
+            except Exception as e:
+                # The member is gone either way; syncing clients will only drop it on their next full sync
+                logger.error(f"Failed to record tombstone for member {member_id}: {e}")
+        self._publish('deleted', member_id)
+        return True
+
+    def changes_since(self, since, limit):
+        members = self._call(lambda: list(
+            self.collection.find({'updatedAt': {'$gt': since}}).sort('updatedAt', 1).limit(limit + 1)
+        ))
+        tombstones = []
+        if self.tombstones is not None:
+            tombstones = self._call(lambda: list(
+                self.tombstones.find({'deletedAt': {'$gt': since}}, {'deletedAt': 1})
+                .sort('deletedAt', 1).limit(limit + 1)
+            ))
+        return merge_changes(members, tombstones, limit)
+
+    def find_members(self, ids, query, fields, limit):
+        """Members by ID list or by filter, at most `limit` of them, in one round trip"""
+        if ids is not None:
+            oids = []
+            for member_id in ids:
+                try:
+                    oids.append(ObjectId(member_id))
+                except InvalidId:
+                    pass  # Reported as not found
+            query = {'_id': {'$in': oids}}
+        projection = dict.fromkeys(fields, 1)
+        return self._call(lambda: list(self.collection.find(query, projection).limit(limit)))
+
+    def apply_member_updates(self, updates):
+        """Set fields on many members with one bulk_write; returns the IDs changed since they were read.
+
+        Each update only applies if the member still has the version that was
+        read, so a concurrent edit is never overwritten with stale values.
+        """
+        result = self._call(lambda: self.collection.bulk_write([
+            UpdateOne({'_id': read['_id'], 'updatedAt': read.get('updatedAt')},
+                      {'$set': fields, '$currentDate': {'updatedAt': {'$type': 'timestamp'}}})
+            for read, fields in updates
+        ], ordered=False, session=self._write_session()))
+        for read, _ in updates:
+            self.stale_cache.discard(('member', str(read['_id'])))
+        conflicts = set()
+        ids = [read['_id'] for read, _ in updates]
+        if result.matched_count < len(updates) or self.events is not None:
+            # Tell the lost updates from the applied ones, and publish the new documents
+            current = {member['_id']: member for member in self._call(lambda: list(
+                self.collection.find({'_id': {'$in': ids}})
+            ))}
+            for read, fields in updates:
+                member = current.get(read['_id'])
+                if member is None or any(member.get(field) != value for field, value in fields.items()):
+                    conflicts.add(str(read['_id']))
+                else:
+                    self._publish('updated', read['_id'], member)
+        return conflicts
+
+    def sweep_statuses(self, today, timeout=None):
+        """Bring every member's status up to date for `today`; returns the number changed.
+
+        One indexed update per status, touching only members whose status
+        actually changes, so a nightly run costs as much as the day's transitions.
+        """
+        changed = 0
+        for status, expiry_range in status_ranges(today).items():
+            result = self._call(lambda: self.collection.update_many(
+                {'expiryDate': expiry_range, 'status': {'$ne': status}},
+                {'$set': {'status': status}, '$currentDate': {'updatedAt': {'$type': 'timestamp'}}}
+            ), timeout)
+            changed += result.modified_count
+        return changed
+
+    def build_report(self, today, timeout=None):
+        # Analytics over every member: a secondary takes them off the primary
+        collection, _ = self._reader(background=True)
+        archive, _ = self._reader('archive', background=True)
+        groups = self._call(lambda: list(collection.aggregate([
+            {'$group': {'_id': '$status', 'count': {'$sum': 1}, 'income': {'$sum': '$amountPaid'}}}
+        ])), timeout)
+        expiring_query = {'expiryDate': status_ranges(today)['expiring']}
+        projection = dict.fromkeys(MEMBER_SUMMARY_FIELDS, 1)
+        expiring = self._call(lambda: list(
+            collection.find(expiring_query, projection).sort('expiryDate', 1).limit(EXPIRING_LIST_LIMIT)
+        ), timeout)
+        expiring_total = len(expiring)
+        if expiring_total == EXPIRING_LIST_LIMIT:
+            expiring_total = self._call(lambda: collection.count_documents(expiring_query), timeout)
+        archived = self._call(lambda: archive.estimated_document_count(), timeout)
+        return member_report(today, {group['_id']: (group['count'], group['income']) for group in groups},
+                             [member_summary(member) for member in expiring], expiring_total, archived)
+
+    def save_report(self, report, timeout=None):
+        self._call(lambda: self.reports.replace_one({'_id': report['_id']}, report, upsert=True), timeout)
+        self.stale_cache.put(('report',), report)
+
+    def get_report(self):
+        reports, session = self._reader('reports')
+        return self._read(('report',), lambda: reports.find_one({'_id': MEMBER_REPORT_ID}, session=session))
+
+    def _archive(self, members, timeout=None):
+        """Copy members to the archive, then remove those unchanged since they were read; returns the number moved"""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        ids = [member['_id'] for member in members]
+        # Upserts by _id, so a batch interrupted after this step is simply copied again
+        self._call(lambda: self.archive.bulk_write(
+            [ReplaceOne({'_id': member['_id']}, dict(member, archivedAt=now), upsert=True) for member in members],
+            ordered=False
+        ), timeout)
+        deleted = self._call(lambda: self.collection.delete_many({'$or': [
+            {'_id': member['_id'], 'updatedAt': member.get('updatedAt')} for member in members
+        ]}), timeout).deleted_count
+        moved = ids
+        if deleted < len(members):
+            # Renewed or edited in the meantime: those stay in the hot collection only
+            kept = {member['_id'] for member in self._call(lambda: list(
+                self.collection.find({'_id': {'$in': ids}}, {'_id': 1})
+            ), timeout)}
+            self._call(lambda: self.archive.delete_many({'_id': {'$in': list(kept)}}), timeout)
+            moved = [member_id for member_id in ids if member_id not in kept]
+        if moved and self.tombstones is not None:
+            # Syncing clients drop archived members like deleted ones
+            self._call(lambda: self.tombstones.bulk_write([
+                UpdateOne({'_id': member_id},
+                          {'$currentDate': {'deletedAt': {'$type': 'timestamp'}}, '$set': {'expireAt': tombstone_expiry()}},
+                          upsert=True)
+                for member_id in moved
+            ], ordered=False), timeout)
+        for member_id in moved:
+            self.stale_cache.discard(('member', str(member_id)))
+            self._publish('deleted', member_id)
+        return len(moved)
+
+    def archive_expired(self, today, timeout=None):
+        """Move members expired before archive_horizon(today) in batches; returns the number moved"""
+        query = {'expiryDate': {'$lt': archive_horizon(today)}}
+        archived = 0
+        while True:
+            members = self._call(lambda: list(
+                self.collection.find(query).sort('expiryDate', 1).limit(ARCHIVE_BATCH_SIZE)
+            ), timeout)
+            moved = self._archive(members, timeout) if members else 0
+            archived += moved
+            # Stop when done, or when a whole batch was edited concurrently
+            if len(members) < ARCHIVE_BATCH_SIZE or not moved:
+                return archived
+
+    def archive_member(self, member_id):
+        oid = self.validate_id(member_id)
+        member = self._call(lambda: self.collection.find_one({'_id': oid}))
+        return member is not None and self._archive([member]) == 1
+
+    def get_archived_member(self, member_id):
+        oid = self.validate_id(member_id)
+        return self._call(lambda: self.archive.find_one({'_id': oid}))
+
+    def get_archived_member_by_mid(self, mid):
+        return self._call(lambda: self.archive.find_one({'mId': mid}))
+
+    def find_archived_by_mobile(self, mobile):
+        projection = dict.fromkeys(MEMBER_SUMMARY_FIELDS, 1)
+        members = self._call(lambda: list(
+            self.archive.find({'mobileNormalized': mobile}, projection).limit(MOBILE_LOOKUP_LIMIT)
+        ))
+        return [member_summary(member) for member in members]
+
+    def list_archived(self, skip, limit):
+        archive, session = self._reader('archive')
+        return self._call(lambda: list(archive.find(session=session).sort('_id', 1).skip(skip).limit(limit)))
+
+    def iter_archived(self):
+        return self._stream(self._stream_reader('archive'))
+
+    def restore_member(self, member_id):
+        """Move an archived member back; returns it, or None if it is not archived.
+
+        Raises DuplicateKeyError if its mId was given to someone else meanwhile.
+        """
+        oid = self.validate_id(member_id)
+        archived = self._call(lambda: self.archive.find_one({'_id': oid}))
+        if archived is None:
+            return None
+        member_data = {field: value for field, value in archived.items()
+                       if field not in SERVER_FIELDS and field != 'archivedAt'}
+        _derive_fields(member_data)
+        member = self._call(lambda: self.collection.find_one_and_update(
+            {'_id': oid},
+            {'$set': member_data, '$currentDate': {'updatedAt': {'$type': 'timestamp'}}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        ))
+        self._call(lambda: self.archive.delete_one({'_id': oid}))
+        if self.tombstones is not None:
+            self._call(lambda: self.tombstones.delete_one({'_id': oid}))
+        self._publish('created', oid, member)
+        return member
@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pymongo
+from flask import g, has_request_context, jsonify, request
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, PyMongoError, WTimeoutError
+
+# Total time a request may spend waiting on MongoDB. Every query runs inside
+# pymongo.timeout() with whatever is left of this budget, which the driver
+# sends to the server as maxTimeMS.
+REQUEST_DEADLINE_MS = int(os.getenv('REQUEST_DEADLINE_MS', 3000))
+# Imports and bulk updates write thousands of members in one request and get a larger budget
+BULK_REQUEST_DEADLINE_MS = int(os.getenv('BULK_REQUEST_DEADLINE_MS', 15000))
+BULK_DEADLINE_ENDPOINTS = {'import_members', 'bulk_update_members', 'renew_members'}
+
+# Consecutive timeouts/connection failures before the breaker opens, and how
+# long it stays open before letting a single probe request through
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', 10))
+
+# Last-known-good reads served while the breaker is open
+STALE_CACHE_ENTRIES = int(os.getenv('STALE_CACHE_ENTRIES', 512))
+
+# Errors that mean "the database did not answer", as opposed to "the database said no"
+DATABASE_UNAVAILABLE_ERRORS = (ConnectionFailure, ExecutionTimeout, WTimeoutError)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_after):
+        super().__init__('Database circuit breaker is open')
+        self.retry_after = retry_after
+
+
+def start_deadline():
+    """before_request hook: give the request its database time budget"""
+    budget_ms = BULK_REQUEST_DEADLINE_MS if request.endpoint in BULK_DEADLINE_ENDPOINTS else REQUEST_DEADLINE_MS
+    g.deadline = time.monotonic() + budget_ms / 1000.0
+
+
+def remaining_seconds():
+    """Time left in the current request's budget (the full budget outside a request)"""
+    if has_request_context() and 'deadline' in g:
+        return max(0.0, g.deadline - time.monotonic())
+    return REQUEST_DEADLINE_MS / 1000.0
+
+
+def guarded_call(breaker, operation, timeout=None):
+    """Run a database operation behind the breaker, within the request budget.
+
+    Background jobs pass their own timeout; requests use what is left of
+    theirs. pymongo.timeout(0) would mean no deadline at all, so a spent
+    budget raises ExecutionTimeout without reaching the driver, and counts
+    as a failure like any other timeout.
+    """
+    breaker.allow()
+    try:
+        seconds = remaining_seconds() if timeout is None else timeout
+        if seconds <= 0:
+            raise ExecutionTimeout('Request deadline exceeded', code=50)
+        with pymongo.timeout(seconds):
+            result = operation()
+    except Exception as e:
+        if is_transient_failure(e):
+            breaker.record_failure()
+        else:
+            # The server answered (e.g. a duplicate key); it is healthy
+            breaker.record_success()
+        raise
+    breaker.record_success()
+    return result
+
+
+def is_transient_failure(exc):
+    if isinstance(exc, DATABASE_UNAVAILABLE_ERRORS):
+        return True
+    return isinstance(exc, PyMongoError) and exc.timeout
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open single probe -> closed"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go to the database now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            waited = time.monotonic() - self.opened_at
+            if self.state == self.OPEN and waited >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            raise CircuitOpenError(max(1, int(self.reset_seconds - waited + 0.999)))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._probe_in_flight = False
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'trips': self.trips,
+        }
+
+
+class StaleReadCache:
+    """Bounded LRU of recent successful reads, used only when MongoDB is unreachable"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def mark_stale():
+    if has_request_context():
+        g.served_stale = True
+
+
+def add_stale_headers(response):
+    """after_request hook: flag responses that came from the stale-read cache"""
+    if g.get('served_stale'):
+        response.headers['Warning'] = '110 - "Response is Stale"'
+        response.headers['X-Served-From'] = 'stale-cache'
+    return response
+
+
+def database_unavailable(e):
+    """JSON 503 for an open breaker, a timeout or a lost connection"""
+    if isinstance(e, CircuitOpenError):
+        response = jsonify({'error': 'Database is temporarily unavailable. Please retry shortly.'})
+        response.headers['Retry-After'] = str(e.retry_after)
+    else:
+        response = jsonify({'error': f'Database did not respond in time: {str(e)}'})
+        response.headers['Retry-After'] = '1'
+    response.status_code = 503
+    return response
+
+
+def init_resilience(app):
+    app.before_request(start_deadline)
+    app.after_request(add_stale_headers)
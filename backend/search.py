@@ -0,0 +1,260 @@
+import bisect
+import heapq
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+from repository import normalize_mobile
+from sync import INITIAL_TOKEN, ExpiredSyncToken, decode_token, next_token
+
+logger = logging.getLogger(__name__)
+
+# Default and largest number of results returned by /api/members/search
+SEARCH_RESULTS = int(os.getenv('SEARCH_RESULTS', 10))
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 50))
+# Smallest trigram (Dice) similarity for a misspelled word to count as a match
+SEARCH_MIN_SIMILARITY = float(os.getenv('SEARCH_MIN_SIMILARITY', 0.4))
+# How often each worker pulls writes made elsewhere (other workers, scripts) into its index
+SEARCH_REFRESH_SECONDS = float(os.getenv('SEARCH_REFRESH_SECONDS', 30))
+# Most indexed words a single query word may expand to as a prefix
+SEARCH_MAX_EXPANSIONS = int(os.getenv('SEARCH_MAX_EXPANSIONS', 500))
+
+# Shorter query words only match whole words; one letter would expand to most of the roster
+MIN_PREFIX_LENGTH = 2
+
+# Searched fields and their weight in the ranking
+SEARCH_FIELDS = {'name': 3.0, 'mId': 3.0, 'mobile': 2.0, 'address': 1.0}
+
+# How well a query word matched an indexed word
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.8
+FUZZY_MATCH = 0.6
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+_NON_DIGIT = re.compile(r'\D+')
+
+
+def words(text):
+    """Lower-case, accent-free alphanumeric words"""
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode().lower()
+    return _NON_WORD.sub(' ', text).split()
+
+
+def field_words(field, value):
+    if value in (None, ''):
+        return []
+    if field == 'mobile':
+        # "+91 98765 43210" should be found by "9198..." as well as "98765..."
+        digits = _NON_DIGIT.sub('', str(value))
+        normalized = normalize_mobile(digits)
+        return [digits, normalized] if digits != normalized else [digits]
+    if field == 'mId':
+        return [''.join(words(value))]
+    return words(value)
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MemberSearchIndex:
+    """In-process inverted index over member names, IDs, mobiles and addresses.
+
+    Each indexed word maps to the members containing it (with the weight of
+    the best field it came from). A sorted vocabulary answers prefix
+    (typeahead) lookups with bisect, and a trigram index over alphabetic
+    words finds misspellings. Updates are applied one member at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # member ID -> (summary, words it was indexed under)
+        self._members = {}
+        # word -> {member ID: field weight}
+        self._postings = {}
+        self._vocabulary = []
+        # trigram -> alphabetic words containing it
+        self._trigrams = {}
+        self.ready = False
+
+    def __len__(self):
+        return len(self._members)
+
+    def _add_trigrams(self, word):
+        if word.isalpha() and len(word) >= 3:
+            for gram in trigrams(word):
+                self._trigrams.setdefault(gram, set()).add(word)
+
+    def _drop_word(self, word):
+        del self._postings[word]
+        del self._vocabulary[bisect.bisect_left(self._vocabulary, word)]
+        if word.isalpha() and len(word) >= 3:
+            for gram in trigrams(word):
+                self._trigrams[gram].discard(word)
+                if not self._trigrams[gram]:
+                    del self._trigrams[gram]
+
+    def upsert(self, member, summary):
+        self.upsert_many([(member, summary)])
+
+    def upsert_many(self, entries):
+        """Index (member, summary) pairs, replacing earlier versions of the same members"""
+        with self._lock:
+            new_words = []
+            for member, summary in entries:
+                member_id = str(member['_id'])
+                self.remove(member_id)
+                weights = {}
+                for field, weight in SEARCH_FIELDS.items():
+                    for word in field_words(field, member.get(field)):
+                        if word:
+                            weights[word] = max(weight, weights.get(word, 0))
+                for word, weight in weights.items():
+                    if word not in self._postings:
+                        self._postings[word] = {}
+                        new_words.append(word)
+                        self._add_trigrams(word)
+                    self._postings[word][member_id] = weight
+                self._members[member_id] = (summary, tuple(weights))
+            if len(new_words) > 64:
+                # One sort beats an insort per word during a full load
+                self._vocabulary.extend(new_words)
+                self._vocabulary.sort()
+            else:
+                for word in new_words:
+                    bisect.insort(self._vocabulary, word)
+
+    def remove(self, member_id):
+        with self._lock:
+            entry = self._members.pop(str(member_id), None)
+            if entry is None:
+                return
+            for word in entry[1]:
+                postings = self._postings[word]
+                postings.pop(str(member_id), None)
+                if not postings:
+                    self._drop_word(word)
+
+    def _expand(self, term):
+        """Indexed words matching one query word, with the match quality"""
+        matches = {}
+        if len(term) < MIN_PREFIX_LENGTH:
+            return {term: EXACT_MATCH} if term in self._postings else matches
+        start = bisect.bisect_left(self._vocabulary, term)
+        for word in self._vocabulary[start:start + SEARCH_MAX_EXPANSIONS]:
+            if not word.startswith(term):
+                break
+            matches[word] = EXACT_MATCH if word == term else PREFIX_MATCH
+        if term.isalpha() and len(term) >= 3:
+            grams = trigrams(term)
+            shared = Counter(word for gram in grams for word in self._trigrams.get(gram, ()))
+            for word, common in shared.items():
+                similarity = 2 * common / (len(grams) + len(word) + 1)
+                if similarity >= SEARCH_MIN_SIMILARITY and word not in matches:
+                    matches[word] = FUZZY_MATCH * similarity
+        return matches
+
+    def search(self, query, limit=SEARCH_RESULTS):
+        """Top `limit` (summary, score) pairs; every query word must match a field"""
+        query = str(query)
+        if any(char.isalpha() for char in query):
+            terms = [''.join(words(term)) for term in query.split()]
+        else:
+            # Phone numbers are typed with spaces and dashes in them
+            terms = [normalize_mobile(query)]
+        terms = [term for term in terms if term]
+        if not terms:
+            return []
+        with self._lock:
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for word, quality in self._expand(term).items():
+                    for member_id, weight in self._postings[word].items():
+                        score = quality * weight
+                        if score > term_scores.get(member_id, 0):
+                            term_scores[member_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {member_id: scores[member_id] + score
+                              for member_id, score in term_scores.items() if member_id in scores}
+                if not scores:
+                    return []
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [(self._members[member_id][0], round(score, 3)) for member_id, score in best]
+
+
+class SearchIndexSync:
+    """Keeps a MemberSearchIndex current.
+
+    Writes seen by this worker's event bus are applied immediately. A
+    background thread builds the index through the repository's delta sync
+    and then pulls changes every SEARCH_REFRESH_SECONDS, which picks up
+    writes made by other workers and scripts.
+    """
+
+    def __init__(self, index, repository, summarize, bus=None, interval=SEARCH_REFRESH_SECONDS):
+        self.index = index
+        self.repository = repository
+        self.summarize = summarize
+        self.interval = interval
+        self.token = INITIAL_TOKEN
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+        if bus is not None:
+            bus.add_listener(self.apply_event)
+
+    def apply_event(self, event):
+        if event['type'] == 'deleted':
+            self.index.remove(event['member_id'])
+        elif event['member'] is not None:
+            self.index.upsert(event['member'], self.summarize(event['member']))
+
+    def refresh(self):
+        """Apply every change since the last refresh; returns the number applied"""
+        applied = 0
+        while True:
+            try:
+                since = decode_token(self.token)
+            except ExpiredSyncToken:
+                since = decode_token(INITIAL_TOKEN)
+            members, deleted, last_version, has_more = self.repository.changes_since(since, 1000)
+            self.index.upsert_many([(member, self.summarize(member)) for member in members])
+            for member_id in deleted:
+                self.index.remove(member_id)
+            applied += len(members) + len(deleted)
+            self.token = next_token(since, last_version, has_more)
+            if not has_more:
+                self.index.ready = True
+                return applied
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='search-index', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Search index refresh failed: {e}")
+            self._stop.wait(self.interval)
+
+    def stats(self):
+        return {
+            'ready': self.index.ready,
+            'members': len(self.index),
+            'last_error': self.last_error,
+        }
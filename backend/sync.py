@@ -0,0 +1,102 @@
+import datetime
+import os
+import threading
+import time
+
+from bson import Timestamp
+
+# Default and largest number of changes returned by one /api/members/changes call
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', 500))
+SYNC_MAX_PAGE_SIZE = int(os.getenv('SYNC_MAX_PAGE_SIZE', 1000))
+# A write is stamped before it commits, so a concurrent write can become
+# visible with a slightly older version than one already synced. Once a
+# client is caught up, its next token is moved back by this many seconds
+# so such late commits are picked up; clients must apply changes idempotently.
+SYNC_OVERLAP_SECONDS = int(os.getenv('SYNC_OVERLAP_SECONDS', 2))
+# Deleted members are remembered this long; older tokens must resync from scratch
+TOMBSTONE_TTL_DAYS = int(os.getenv('TOMBSTONE_TTL_DAYS', 30))
+
+# The token that starts a full sync
+INITIAL_TOKEN = '0'
+
+
+class ExpiredSyncToken(Exception):
+    """The token predates the oldest tombstone still kept, so deletes may have been missed"""
+
+
+def encode_version(version):
+    """Opaque client-facing form of a member's updatedAt Timestamp"""
+    return f"{version.time}-{version.inc}"
+
+
+def decode_token(token):
+    """Parse a ?since= token; raises ValueError when malformed and ExpiredSyncToken when too old"""
+    if token in (None, '', INITIAL_TOKEN):
+        return Timestamp(0, 0)
+    seconds, _, increment = token.partition('-')
+    version = Timestamp(int(seconds), int(increment or 0))
+    if version.time < time.time() - TOMBSTONE_TTL_DAYS * 86400:
+        raise ExpiredSyncToken(token)
+    return version
+
+
+def next_token(since, last_version, has_more):
+    """Token for the client's next call.
+
+    While more pages remain it is exactly the last version returned. Once
+    the client is caught up it is held back by SYNC_OVERLAP_SECONDS so
+    writes that commit late are not skipped.
+    """
+    version = last_version or since
+    if has_more:
+        return encode_version(version)
+    overlap = Timestamp(max(0, int(time.time()) - SYNC_OVERLAP_SECONDS), 0)
+    return encode_version(min(version, overlap))
+
+
+def tombstone_expiry():
+    return datetime.datetime.utcnow() + datetime.timedelta(days=TOMBSTONE_TTL_DAYS)
+
+
+def merge_changes(members, tombstones, limit):
+    """Interleave changed members and tombstones by version, keeping the first `limit`.
+
+    Both inputs must be sorted by version. Returns (members, deleted_ids,
+    last_version, has_more).
+    """
+    entries = sorted(
+        [(member['updatedAt'], 'member', member) for member in members]
+        + [(tombstone['deletedAt'], 'deleted', str(tombstone['_id'])) for tombstone in tombstones],
+        key=lambda entry: entry[0]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    changed = [value for _, kind, value in entries if kind == 'member']
+    deleted = [value for _, kind, value in entries if kind == 'deleted']
+    return changed, deleted, (entries[-1][0] if entries else None), has_more
+
+
+class VersionClock:
+    """Monotonic Timestamp versions for the in-memory store, where no server assigns them"""
+
+    def __init__(self):
+        self._last = Timestamp(0, 0)
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            now = int(time.time())
+            if now > self._last.time:
+                self._last = Timestamp(now, 1)
+            else:
+                self._last = Timestamp(self._last.time, self._last.inc + 1)
+            return self._last
+
+
+def backfill_versions(collection):
+    """Stamp updatedAt on members written before versions existed; returns the number updated"""
+    result = collection.update_many(
+        {'updatedAt': {'$exists': False}},
+        {'$currentDate': {'updatedAt': {'$type': 'timestamp'}}}
+    )
+    return result.modified_count
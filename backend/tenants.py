@@ -0,0 +1,124 @@
+import os
+import re
+
+from flask import g, jsonify, request
+from werkzeug.local import LocalProxy
+
+# Branch served when a request names none. Its members stay in DB_NAME/COLLECTION_NAME,
+# so a single-branch deployment is unchanged.
+DEFAULT_TENANT = os.getenv('DEFAULT_TENANT', 'main')
+# Every branch this deployment serves, comma-separated (the default branch is always served)
+TENANTS = [name.strip().lower() for name in os.getenv('TENANTS', '').split(',') if name.strip()]
+# Request header naming the branch; ?branch= works too, for EventSource and links
+TENANT_HEADER = os.getenv('TENANT_HEADER', 'X-Branch')
+# Branches big enough for a database of their own on the shared client, e.g. "south:gym_south,east:gym_east"
+TENANT_DATABASES = dict(
+    (part.strip() for part in entry.split(':', 1))
+    for entry in os.getenv('TENANT_DATABASES', '').split(',') if ':' in entry
+)
+
+# Branch names end up in collection names, file names and metric labels
+TENANT_NAME = re.compile(r'[a-z0-9][a-z0-9_-]{0,31}')
+
+
+class UnknownTenant(LookupError):
+    """The request names a branch this deployment does not serve"""
+
+
+def tenant_names(names=None, default=DEFAULT_TENANT):
+    """The default branch followed by the configured ones, validated and without repeats"""
+    names = [default] + list(TENANTS if names is None else names)
+    for name in names:
+        if not TENANT_NAME.fullmatch(name):
+            raise ValueError(f"Invalid branch name {name!r}: use up to 32 lowercase letters, digits, - and _")
+    return list(dict.fromkeys(names))
+
+
+def tenant_namespace(name, db_name, collection_name, databases=None, default=DEFAULT_TENANT):
+    """(database name, members collection name) of a branch.
+
+    Branches listed in TENANT_DATABASES get COLLECTION_NAME in their own
+    database. The others share DB_NAME with a collection of their own, whose
+    derived collections (tombstones, counters, reports, archive, check-ins)
+    follow its name, so every index and fixed-_id document is per branch.
+    """
+    databases = TENANT_DATABASES if databases is None else databases
+    if name in databases:
+        return databases[name], collection_name
+    if name == default:
+        return db_name, collection_name
+    return db_name, f"{collection_name}.{name}"
+
+
+class Tenant:
+    """One branch: the repository, event bus, search index and check-in recorder its requests use"""
+
+    def __init__(self, name, collection, repository, events, search, search_sync, checkins):
+        self.name = name
+        self.collection = collection
+        self.repository = repository
+        self.events = events
+        self.search = search
+        self.search_sync = search_sync
+        self.checkins = checkins
+
+    @property
+    def namespace(self):
+        """database.collection of the branch's members, or None with in-memory storage"""
+        if self.collection is None:
+            return None
+        return f"{self.collection.database.name}.{self.collection.name}"
+
+
+class TenantRegistry:
+    """The branches this process serves, each set up once at startup"""
+
+    def __init__(self, default=DEFAULT_TENANT):
+        self.default = default
+        self._tenants = {}
+
+    def add(self, tenant):
+        self._tenants[tenant.name] = tenant
+        return tenant
+
+    def get(self, name):
+        tenant = self._tenants.get(name)
+        if tenant is None:
+            raise UnknownTenant(name)
+        return tenant
+
+    def __iter__(self):
+        return iter(self._tenants.values())
+
+    def names(self):
+        return list(self._tenants)
+
+    def resolve(self):
+        """The branch the current request is for"""
+        name = request.headers.get(TENANT_HEADER) or request.args.get('branch') or self.default
+        return self.get(name.strip().lower())
+
+
+def current(attribute):
+    """A stand-in for the request's branch's `attribute`, so handlers keep using one module-level name"""
+    return LocalProxy(lambda: getattr(g.tenant, attribute))
+
+
+def init_tenants(app, registry, metrics):
+    requests_total = metrics.counter('tenant_requests_total', 'Requests handled, by branch and status class')
+
+    @app.before_request
+    def select_tenant():
+        try:
+            g.tenant = registry.resolve()
+        except UnknownTenant as e:
+            return jsonify({'error': f"Unknown branch: {e}"}), 404
+
+    @app.after_request
+    def count_tenant_request(response):
+        tenant = g.get('tenant')
+        if tenant is not None:
+            requests_total.inc(tenant=tenant.name, status=f"{response.status_code // 100}xx")
+        return response
+
+    return registry
@@ -89,6 +89,27 @@ function App() {
     loadMembers();
   }, [loadMembers]);
 
+  // Apply changes made at other desks as they happen
+  useEffect(() => {
+    if (!isAuthenticated) return;
+
+    const unsubscribe = storageUtils.subscribeToMemberEvents((change) => {
+      if (change.type === 'reset') {
+        loadMembers();
+        return;
+      }
+      setMembers((current) => {
+        if (change.type === 'deleted') return current.filter((m) => m.id !== change.memberId);
+        const index = current.findIndex((m) => m.id === change.memberId);
+        if (index === -1) return [...current, change.member];
+        const next = [...current];
+        next[index] = change.member;
+        return next;
+      });
+    });
+    return unsubscribe;
+  }, [isAuthenticated, loadMembers]);
+
   useEffect(() => {
     const filtered = memberUtils.filterMembers(members, searchTerm, statusFilter);
     setFilteredMembers(filtered);
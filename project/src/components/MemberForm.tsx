@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { X, Upload, Save } from 'lucide-react';
 import { Member, PaymentRecord } from '../types/member';
-import { memberUtils } from '../utils/memberUtils';
+import { memberUtils, isMemberIdAvailable } from '../utils/memberUtils';
 
 interface MemberFormProps {
   member?: Member;
@@ -29,6 +29,7 @@ export default function MemberForm({ member, onSave, onCancel }: MemberFormProps
 
   const [imagePreview, setImagePreview] = useState<string>('');
   const [errors, setErrors] = useState<Record<string, string>>({});
+  const [mIdTaken, setMIdTaken] = useState(false);
 
   useEffect(() => {
     if (member) {
@@ -58,6 +59,24 @@ export default function MemberForm({ member, onSave, onCancel }: MemberFormProps
     }
   }, [member]);
 
+  // Check the member ID as it is typed; each check is one HEAD request on the mId index
+  useEffect(() => {
+    const mId = formData.mId.trim();
+    if (!mId || mId === member?.mId) {
+      setMIdTaken(false);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      const available = await isMemberIdAvailable(mId, controller.signal);
+      if (!controller.signal.aborted) setMIdTaken(!available);
+    }, 300);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [formData.mId, member?.mId]);
+
   const handleImageChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0];
     if (file) {
@@ -76,6 +95,7 @@ export default function MemberForm({ member, onSave, onCancel }: MemberFormProps
 
     if (!formData.name.trim()) newErrors.name = 'Name is required';
     if (!formData.mId.trim()) newErrors.mId = 'Member ID is required';
+    else if (mIdTaken) newErrors.mId = 'Member ID is already taken';
     if (!formData.mobile.trim()) newErrors.mobile = 'Mobile number is required';
     if (!/^\d{10}$/.test(formData.mobile)) newErrors.mobile = 'Mobile number must be 10 digits';
     if (!formData.trainingType) newErrors.trainingType = 'Training type is required';
@@ -195,6 +215,7 @@ export default function MemberForm({ member, onSave, onCancel }: MemberFormProps
                     className={`w-full px-3 py-2 border rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500 text-base ${errors.mId ? 'border-red-500' : 'border-gray-300'}`}
                   />
                   {errors.mId && <p className="text-red-500 text-sm mt-1">{errors.mId}</p>}
+                  {!errors.mId && mIdTaken && <p className="text-red-500 text-sm mt-1">Member ID is already taken</p>}
                 </div>
 
                 <div>
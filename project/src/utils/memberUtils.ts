@@ -148,15 +148,15 @@ export const memberUtils = {
 };
 
 // Function to validate if a member ID is available
-export const isMemberIdAvailable = async (memberId: string): Promise<boolean> => {
+// A HEAD request answered from the unique mId index, cheap enough to run as the user types
+export const isMemberIdAvailable = async (memberId: string, signal?: AbortSignal): Promise<boolean> => {
   try {
-    const response = await fetch(`${import.meta.env.VITE_BACKEND_URL || 'http://localhost:5000'}/api/members`);
-    if (response.ok) {
-      const members = await response.json();
-      const existingMember = members.find((member: any) => member.mId === memberId);
-      return !existingMember;
-    }
-    return true; // If we can't fetch members, assume ID is available
+    const response = await fetch(
+      `${import.meta.env.VITE_BACKEND_URL || 'http://localhost:5000'}/api/members/by-mid/${encodeURIComponent(memberId.trim())}`,
+      { method: 'HEAD', signal }
+    );
+    if (response.status === 200) return false;
+    return true; // 404 means free; on other errors assume ID is available
   } catch (error) {
     console.error('Error checking member ID availability:', error);
     return true; // If there's an error, assume ID is available
@@ -164,30 +164,20 @@ export const isMemberIdAvailable = async (memberId: string): Promise<boolean> =>
 };
 
 // Function to suggest the next available member ID
+// Reserve the next member ID from the server's allocator; concurrent callers never get the same one
 export const suggestNextMemberId = async (): Promise<string> => {
   try {
-    const response = await fetch(`${import.meta.env.VITE_BACKEND_URL || 'http://localhost:5000'}/api/members`);
+    const response = await fetch(`${import.meta.env.VITE_BACKEND_URL || 'http://localhost:5000'}/api/member-ids/next`, {
+      method: 'POST',
+      credentials: 'include' // Include credentials for CORS
+    });
     if (response.ok) {
-      const members = await response.json();
-      
-      // Extract existing numeric IDs
-      const existingIds = members
-        .map((member: any) => member.mId)
-        .filter((id: string) => id && /^\d+$/.test(id))
-        .map((id: string) => parseInt(id, 10))
-        .sort((a: number, b: number) => a - b);
-      
-      // Find the next available ID
-      if (existingIds.length > 0) {
-        const nextId = Math.max(...existingIds) + 1;
-        return nextId.toString().padStart(3, '0'); // Format as 3-digit number with leading zeros
-      } else {
-        return '001';
-      }
+      const data = await response.json();
+      return data.mId;
     }
-    return '001'; // Default if we can't fetch members
+    return ''; // Leave the field for the clerk to fill in
   } catch (error) {
     console.error('Error suggesting next member ID:', error);
-    return '001'; // Default if there's an error
+    return ''; // Leave the field for the clerk to fill in
   }
 };
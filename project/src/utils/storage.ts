@@ -32,6 +32,35 @@ const invalidateCache = (): void => {
   membersCache = null;
 };
 
+// The backend may answer member lists from a replica that lags behind the primary.
+// Each write response carries a causal token; sending the latest one back with reads
+// makes the backend include that write, so a list reloaded after a save shows it.
+const CAUSAL_TOKEN_HEADER = 'X-Causal-Token';
+let causalToken: string | null = null;
+
+const rememberCausalToken = (response: Response): void => {
+  const token = response.headers.get(CAUSAL_TOKEN_HEADER);
+  if (token) {
+    causalToken = token;
+  }
+};
+
+const causalHeaders = (): Record<string, string> =>
+  causalToken ? { [CAUSAL_TOKEN_HEADER]: causalToken } : {};
+
+// A change made at any desk, pushed by the backend's /api/members/events stream.
+// 'reset' means changes were missed and the member list must be reloaded.
+export type MemberChange =
+  | { type: 'created' | 'updated'; memberId: string; member: Member }
+  | { type: 'deleted'; memberId: string; member: null }
+  | { type: 'reset' };
+
+// Ranked result from /api/members/search: the member's summary fields and a relevance score
+export type MemberSearchResult = Pick<Member, 'name' | 'mId' | 'mobile' | 'batch' | 'planType' | 'expiryDate' | 'dueAmount'> & {
+  _id: string;
+  score: number;
+};
+
 export const storageUtils = {
   getMembers: async (): Promise<Member[]> => {
     // Check if we have valid cached data
@@ -55,12 +84,14 @@ export const storageUtils = {
       // Use smaller page size to improve performance
       const fetchPromise = fetch(`${BACKEND_URL}/api/members?page=1&per_page=25`, {
         signal: controller.signal,
+        headers: causalHeaders(), // Read our own latest write
         credentials: 'include' // Include credentials for CORS
       });
       
       // Store the promise to prevent duplicate requests
       ongoingRequest = fetchPromise.then(async (response) => {
         clearTimeout(timeoutId);
+        rememberCausalToken(response);
         
         console.log('Response status:', response.status); // Debug log
         console.log('Response headers:', [...response.headers.entries()]); // Debug log
@@ -156,6 +187,7 @@ export const storageUtils = {
         body: JSON.stringify(member),
         credentials: 'include' // Include credentials for CORS
       });
+      rememberCausalToken(response);
       
       // Check if response is HTML (error page) instead of JSON
       const contentType = response.headers.get('content-type');
@@ -233,6 +265,7 @@ export const storageUtils = {
         body: JSON.stringify(memberData),
         credentials: 'include' // Include credentials for CORS
       });
+      rememberCausalToken(response);
       
       // Check if response is HTML (error page) instead of JSON
       const contentType = response.headers.get('content-type');
@@ -266,6 +299,7 @@ export const storageUtils = {
         method: 'DELETE',
         credentials: 'include' // Include credentials for CORS
       });
+      rememberCausalToken(response);
       
       // Check if response is HTML (error page) instead of JSON
       const contentType = response.headers.get('content-type');
@@ -291,6 +325,47 @@ export const storageUtils = {
     }
   },
 
+  // Typeahead over name, member ID, mobile and address; tolerates misspellings
+  searchMembers: async (query: string, limit = 10, signal?: AbortSignal): Promise<MemberSearchResult[]> => {
+    const params = new URLSearchParams({ q: query, limit: String(limit) });
+    const response = await fetch(`${BACKEND_URL}/api/members/search?${params}`, {
+      credentials: 'include', // Include credentials for CORS
+      signal
+    });
+    if (!response.ok) {
+      throw new Error(`Backend returned status ${response.status}: ${await response.text()}`);
+    }
+    const data = await response.json();
+    return data.results;
+  },
+
+  // Hold one idle connection for member changes instead of polling /api/members.
+  // EventSource reconnects on its own and resumes from the last event it saw.
+  // Returns a function that closes the stream.
+  subscribeToMemberEvents: (onChange: (change: MemberChange) => void): (() => void) => {
+    const source = new EventSource(`${BACKEND_URL}/api/members/events`, { withCredentials: true });
+
+    const handleDelta = (event: MessageEvent) => {
+      const data = JSON.parse(event.data);
+      invalidateCache();
+      if (data.type === 'deleted') {
+        onChange({ type: 'deleted', memberId: data.member_id, member: null });
+      } else {
+        // Same id/_id normalization as getMembers
+        onChange({ type: data.type, memberId: data.member_id, member: { ...data.member, id: data.member_id } });
+      }
+    };
+    source.addEventListener('created', handleDelta as EventListener);
+    source.addEventListener('updated', handleDelta as EventListener);
+    source.addEventListener('deleted', handleDelta as EventListener);
+    source.addEventListener('reset', () => {
+      invalidateCache();
+      onChange({ type: 'reset' });
+    });
+
+    return () => source.close();
+  },
+
   // Authentication functions - still using localStorage for authentication state
   // but this is separate from member data storage
   isAuthenticated: (): boolean => {